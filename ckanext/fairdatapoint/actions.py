@@ -0,0 +1,106 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import json
+import logging
+import uuid
+
+import ckan.plugins as plugins
+import ckan.plugins.toolkit as toolkit
+from ckan.lib.redis import connect_to_redis
+
+from ckanext.fairdatapoint.harvesters.domain.harvest_diff import DEFAULT_DIFF_CACHE_TTL
+from ckanext.harvest.model import HarvestSource
+
+log = logging.getLogger(__name__)
+
+# Seconds a dry run job may take, the crawl of a large source takes far longer than a web request
+DIFF_JOB_TIMEOUT = 60 * 60
+DIFF_STATUS_PENDING = "pending"
+DIFF_STATUS_COMPLETE = "complete"
+
+
+def _diff_key(source_id, compare_content):
+    # Redis key of the result of a dry run, shared by the web processes and the job workers
+    return f"ckanext.fairdatapoint.harvest_diff.{source_id}.{int(compare_content)}"
+
+
+def fairdatapoint_harvest_diff(context, data_dict):
+    """
+    Dry run of a harvest of a harvest source, reporting the number of new, changed, unchanged and deleted records and
+    the estimated import time, without creating harvest objects.
+
+    Crawling a source takes too long for a web request, so the dry run runs as a background job. The first call
+    enqueues the job and returns its id with the status ``pending``. Once the job is done, calls return its result
+    with the status ``complete`` for 10 minutes.
+
+    :param id: the id of the harvest source
+    :param compare_content: compare the content of records with the content harvested before, to count unchanged
+        records (optional, default: False)
+    :param refresh: crawl the source again instead of returning a recent result (optional, default: False)
+    :returns: the status of the dry run, with the id of the job while it runs and the counts once it is done
+    :rtype: dictionary
+    """
+    source_id = toolkit.get_or_bust(data_dict, "id")
+    toolkit.check_access("fairdatapoint_harvest_diff", context, data_dict)
+
+    harvest_source = HarvestSource.get(source_id)
+    if harvest_source is None:
+        raise toolkit.ObjectNotFound(f"Harvest source {source_id} not found")
+    compare_content = toolkit.asbool(data_dict.get("compare_content", False))
+    key = _diff_key(harvest_source.id, compare_content)
+    redis = connect_to_redis()
+
+    if toolkit.asbool(data_dict.get("refresh", False)):
+        redis.delete(key)
+    else:
+        result = redis.get(key)
+        if result is not None:
+            return {"status": DIFF_STATUS_COMPLETE, "diff": json.loads(result)}
+
+    # Claim the dry run first, so concurrent calls do not crawl the same source twice
+    job_id = str(uuid.uuid4())
+    if not redis.set(f"{key}.job", job_id, nx=True, ex=DIFF_JOB_TIMEOUT):
+        pending_job_id = redis.get(f"{key}.job")
+        return {"status": DIFF_STATUS_PENDING, "job_id": pending_job_id.decode() if pending_job_id else None}
+    toolkit.enqueue_job(
+        run_harvest_diff,
+        [harvest_source.id, compare_content],
+        title=f"Dry run of harvest source {harvest_source.id}",
+        rq_kwargs={"job_id": job_id, "timeout": DIFF_JOB_TIMEOUT},
+    )
+    return {"status": DIFF_STATUS_PENDING, "job_id": job_id}
+
+
+def run_harvest_diff(source_id, compare_content):
+    """Background job of fairdatapoint_harvest_diff, storing the result of the dry run for the action to return"""
+    key = _diff_key(source_id, compare_content)
+    redis = connect_to_redis()
+    try:
+        harvest_source = HarvestSource.get(source_id)
+        if harvest_source is None:
+            log.warning("Harvest source %s of a dry run not found", source_id)
+            return
+        harvester = plugins.get_plugin("fairdatapointharvester")
+        diff = harvester.diff_stage(harvest_source, compare_content=compare_content, refresh=True)
+        redis.set(key, json.dumps(diff._asdict()), ex=DEFAULT_DIFF_CACHE_TTL)
+    finally:
+        redis.delete(f"{key}.job")
+
+
+def fairdatapoint_harvest_diff_auth(context, data_dict):
+    # Crawling a source is expensive, so only users who may harvest the source may do a dry run
+    try:
+        toolkit.check_access("harvest_source_update", context, {"id": data_dict.get("id")})
+    except toolkit.NotAuthorized:
+        return {"success": False, "msg": "User not authorized to do a dry run of this harvest source"}
+    return {"success": True}
+
+
+def get_actions():
+    return {"fairdatapoint_harvest_diff": fairdatapoint_harvest_diff}
+
+
+def get_auth_functions():
+    return {"fairdatapoint_harvest_diff": fairdatapoint_harvest_diff_auth}
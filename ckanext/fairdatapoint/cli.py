@@ -0,0 +1,222 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import datetime
+import logging
+from typing import Optional, Tuple
+
+import click
+from ckan import model
+from ckan import plugins
+
+from ckanext.fairdatapoint.crawl import crawl_command
+from ckanext.fairdatapoint.harvesters.config import get_blob_store_path
+from ckanext.fairdatapoint.harvesters.domain.blob_store import (
+    HEADER_PREFIX as BLOB_HEADER_PREFIX,
+    ContentBlobStore,
+    digest_from_reference,
+)
+from ckanext.fairdatapoint.harvesters.domain.content_compression import (
+    COMPRESSION_ZLIB,
+    COMPRESSION_ZSTD,
+    HEADER_PREFIX as COMPRESSED_HEADER_PREFIX,
+    compress_content,
+    validate_compression,
+)
+from ckanext.fairdatapoint.harvesters.fair_data_point_civity_harvester import HARVESTER_TYPE
+from ckanext.harvest.model import HarvestObject, HarvestSource
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_PRUNE_MIN_AGE = 24 * 60 * 60  # seconds
+# Report status of an imported harvest object by its status extra
+REPORT_STATUSES = {"new": "added", "change": "updated", "delete": "deleted"}
+
+
+def compress_harvest_objects(
+    compression: str, source_id: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Tuple[int, int, int]:
+    """
+    Compresses the content of harvest objects of FAIR data point harvest sources which is stored uncompressed. Other
+    harvesters cannot read compressed content, so their harvest objects are left alone. Objects are committed per
+    batch, so the migration can be interrupted and restarted at any moment.
+
+    Returns the number of compressed objects and the total content size before and after compression
+    """
+    validate_compression(compression)
+
+    query = (
+        model.Session.query(HarvestObject.id)
+        .join(HarvestSource, HarvestObject.harvest_source_id == HarvestSource.id)
+        .filter(HarvestSource.type == HARVESTER_TYPE)
+        .filter(HarvestObject.content.isnot(None))
+        .filter(~HarvestObject.content.startswith(COMPRESSED_HEADER_PREFIX))
+        .filter(~HarvestObject.content.startswith(BLOB_HEADER_PREFIX))
+    )
+    if source_id:
+        query = query.filter(HarvestObject.harvest_source_id == source_id)
+    harvest_object_ids = [row[0] for row in query]
+
+    count = size_before = size_after = 0
+    for start in range(0, len(harvest_object_ids), batch_size):
+        batch_ids = harvest_object_ids[start:start + batch_size]
+        for harvest_object in model.Session.query(HarvestObject).filter(
+            HarvestObject.id.in_(batch_ids)
+        ):
+            compressed = compress_content(harvest_object.content, compression)
+            size_before += len(harvest_object.content)
+            size_after += len(compressed)
+            harvest_object.content = compressed
+            count += 1
+        model.Session.commit()
+        log.info("Compressed %s of %s harvest objects", count, len(harvest_object_ids))
+
+    return count, size_before, size_after
+
+
+def prune_content_blobs(blob_store_path: str, min_age: int = DEFAULT_PRUNE_MIN_AGE) -> int:
+    """Removes blobs from the blob store which no harvest object refers to anymore"""
+    query = model.Session.query(HarvestObject.content).filter(
+        HarvestObject.content.startswith(BLOB_HEADER_PREFIX)
+    )
+    referenced_digests = {digest_from_reference(content) for (content,) in query}
+    return ContentBlobStore(blob_store_path).prune(referenced_digests, min_age=min_age)
+
+
+def import_pending_harvest_objects(
+    source_id: str, max_workers: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Tuple[int, int]:
+    """
+    Imports the harvest objects of a harvest source whose import the harvest left to the import command, see the
+    batch_import setting, converting the records in a pool of worker processes. Objects are claimed per batch, so
+    several imports of the same source can run at once without importing an object twice.
+
+    Returns the number of successful and failed imports
+    """
+    harvester = plugins.get_plugin("fairdatapointharvester")
+    succeeded = failed = 0
+    while True:
+        harvest_objects = harvester.claim_pending_imports(source_id, batch_size)
+        if not harvest_objects:
+            break
+        log.info("Importing %s pending harvest objects of source %s", len(harvest_objects), source_id)
+
+        results = harvester.import_stage_batch(harvest_objects, max_workers=max_workers)
+
+        import_finished = datetime.datetime.utcnow()
+        for harvest_object in harvest_objects:
+            harvest_object.import_finished = import_finished
+            if results.get(harvest_object.id):
+                harvest_object.state = "COMPLETE"
+                status = harvester._get_object_extra(harvest_object, "status")
+                harvest_object.report_status = REPORT_STATUSES.get(status, "added")
+                succeeded += 1
+            else:
+                harvest_object.state = "ERROR"
+                harvest_object.report_status = "errored"
+                failed += 1
+        model.Session.commit()
+
+    return succeeded, failed
+
+
+@click.group(short_help="FAIR data point harvester commands")
+def fairdatapoint():
+    pass
+
+
+@fairdatapoint.command("compress-content")
+@click.option(
+    "--compression",
+    type=click.Choice([COMPRESSION_ZLIB, COMPRESSION_ZSTD]),
+    default=COMPRESSION_ZLIB,
+    show_default=True,
+)
+@click.option("--source", "source_id", default=None, help="Only compress harvest objects of this harvest source")
+@click.option("--batch-size", default=DEFAULT_BATCH_SIZE, show_default=True, help="Harvest objects per commit")
+def compress_content_command(compression: str, source_id: Optional[str], batch_size: int):
+    """Compress the stored content of existing harvest objects"""
+    if source_id:
+        harvest_source = HarvestSource.get(source_id)
+        if harvest_source is None:
+            raise click.UsageError(f"Harvest source {source_id} not found")
+        if harvest_source.type != HARVESTER_TYPE:
+            raise click.UsageError(f"Harvest source {source_id} is not a {HARVESTER_TYPE} source")
+    count, size_before, size_after = compress_harvest_objects(
+        compression, source_id=source_id, batch_size=batch_size
+    )
+    click.secho(
+        f"Compressed {count} harvest objects from {size_before} to {size_after} characters",
+        fg="green",
+    )
+
+
+@fairdatapoint.command("prune-blobs")
+@click.option(
+    "--min-age",
+    default=DEFAULT_PRUNE_MIN_AGE,
+    show_default=True,
+    help="Keep unreferenced blobs modified less than this number of seconds ago",
+)
+def prune_blobs_command(min_age: int):
+    """Remove blobs which are not referenced by any harvest object"""
+    blob_store_path = get_blob_store_path()
+    if not blob_store_path:
+        raise click.UsageError("ckanext.fairdatapoint.blob_store_path is not configured")
+
+    removed = prune_content_blobs(blob_store_path, min_age=min_age)
+    click.secho(f"Removed {removed} unreferenced blobs", fg="green")
+
+
+@fairdatapoint.command("import")
+@click.option("--source", "source_id", required=True, help="Harvest source to import the pending harvest objects of")
+@click.option(
+    "--workers", "max_workers", type=int, default=None, help="Conversion processes, defaults to the number of CPUs"
+)
+@click.option("--batch-size", default=DEFAULT_BATCH_SIZE, show_default=True, help="Harvest objects claimed at once")
+def import_command(source_id: str, max_workers: Optional[int], batch_size: int):
+    """Import the harvest objects a batch_import harvest left pending, converting records in parallel"""
+    succeeded, failed = import_pending_harvest_objects(source_id, max_workers=max_workers, batch_size=batch_size)
+    click.secho(f"Imported {succeeded} harvest objects, {failed} failed", fg="green" if not failed else "yellow")
+
+
+@fairdatapoint.command("diff")
+@click.option("--source", "source_id", required=True, help="Harvest source to do a dry run of")
+@click.option("--compare-content", is_flag=True, help="Fetch every record to count unchanged records")
+@click.option("--concurrency", type=int, default=None, help="Concurrent requests, defaults to the harvester setting")
+@click.option("--refresh", is_flag=True, help="Crawl again instead of reporting a recent result")
+def diff_command(source_id: str, compare_content: bool, concurrency: Optional[int], refresh: bool):
+    """Report what a harvest of a source would do, without creating harvest objects"""
+    harvest_source = HarvestSource.get(source_id)
+    if harvest_source is None:
+        raise click.UsageError(f"Harvest source {source_id} not found")
+
+    harvester = plugins.get_plugin("fairdatapointharvester")
+    diff = harvester.diff_stage(
+        harvest_source, compare_content=compare_content, fetch_concurrency=concurrency, refresh=refresh
+    )
+    unchanged = diff.unchanged if diff.unchanged is not None else "unknown"
+    click.echo(
+        f"New: {diff.new}, changed: {diff.changed}, unchanged: {unchanged}, deleted: {diff.deleted}, "
+        f"failed: {diff.failed}"
+    )
+    click.echo(f"Crawled in {diff.crawl_seconds:.1f} seconds")
+    if not diff.complete:
+        click.secho(
+            f"The crawl was incomplete ({diff.crawl_errors} documents could not be crawled or the gather deadline "
+            f"passed), a harvest would delete nothing and the counts may be too low",
+            fg="yellow",
+        )
+    if diff.estimated_import_seconds is None:
+        click.echo("Import time unknown, the source has not been imported before")
+    else:
+        click.echo(f"Estimated import time: {diff.estimated_import_seconds:.0f} seconds")
+
+
+fairdatapoint.add_command(crawl_command)
+
+
+def get_commands():
+    return [fairdatapoint]
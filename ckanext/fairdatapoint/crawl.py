@@ -0,0 +1,104 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Crawl command, shared by `ckan fairdatapoint crawl` and fair_data_point_main. This module and what it imports do
+not import CKAN, so the standalone command runs without a CKAN installation.
+"""
+
+from contextlib import ExitStack
+from typing import Optional
+
+import click
+
+from ckanext.fairdatapoint.harvesters.domain.document_limits import DEFAULT_MAX_BODY_SIZE
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point import (
+    CONNECT_TIMEOUT,
+    REQUEST_RETRIES,
+    REQUEST_TIMEOUT,
+)
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider import FETCH_CONCURRENCY
+from ckanext.fairdatapoint.harvesters.domain.http_archive import RecordingTransport, ReplayTransport
+from ckanext.fairdatapoint.harvesters.domain.snapshot import (
+    DEFAULT_DOCUMENT_CACHE_SIZE,
+    crawl_snapshot,
+)
+from ckanext.fairdatapoint.harvesters.domain.transport import use_transport
+
+
+@click.command("crawl")
+@click.argument("fdp_end_point")
+@click.option(
+    "--output", "-o", required=True, type=click.Path(dir_okay=False), help="Snapshot to write, gzip compressed N-Quads"
+)
+@click.option("--harvest-catalogs", is_flag=True, help="Complete catalogs as records too")
+@click.option("--concurrency", default=FETCH_CONCURRENCY, show_default=True, help="Concurrent requests")
+@click.option(
+    "--cache-size", default=DEFAULT_DOCUMENT_CACHE_SIZE, show_default=True, help="Documents kept during the crawl"
+)
+@click.option("--request-timeout", default=REQUEST_TIMEOUT, show_default=True, help="Read timeout in seconds")
+@click.option("--connect-timeout", default=CONNECT_TIMEOUT, show_default=True, help="Connect timeout in seconds")
+@click.option("--retries", default=REQUEST_RETRIES, show_default=True, help="Retries of failed requests")
+@click.option(
+    "--max-body-size", default=DEFAULT_MAX_BODY_SIZE, show_default=True, help="Maximum size of a document in bytes"
+)
+@click.option(
+    "--record", type=click.Path(dir_okay=False), default=None, help="Record every request to this HTTP archive"
+)
+@click.option(
+    "--replay",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Answer requests from this HTTP archive instead of the FDP",
+)
+@click.option("--replay-timings", is_flag=True, help="Delay replayed responses as long as they took when recorded")
+def crawl_command(
+    fdp_end_point: str,
+    output: str,
+    harvest_catalogs: bool,
+    concurrency: int,
+    cache_size: int,
+    request_timeout: int,
+    connect_timeout: int,
+    retries: int,
+    max_body_size: int,
+    record: Optional[str],
+    replay: Optional[str],
+    replay_timings: bool,
+):
+    """Crawl a FAIR data point and write a snapshot of it, to harvest from a file:// harvest source"""
+    if record and replay:
+        raise click.UsageError("--record and --replay cannot be combined")
+    replay_transport = None
+    with ExitStack() as stack:
+        if record:
+            stack.enter_context(use_transport(stack.enter_context(RecordingTransport(record, max_body_size=max_body_size))))
+        elif replay:
+            replay_transport = stack.enter_context(use_transport(ReplayTransport(replay, timings=replay_timings)))
+        statistics = crawl_snapshot(
+            fdp_end_point,
+            output,
+            harvest_catalogs=harvest_catalogs,
+            fetch_concurrency=concurrency,
+            cache_size=cache_size,
+            request_timeout=request_timeout,
+            connect_timeout=connect_timeout,
+            request_retries=retries,
+            max_body_size=max_body_size,
+        )
+    click.echo(
+        f"Crawled {statistics.records} records and {statistics.documents} documents "
+        f"({statistics.triples} triples) in {statistics.seconds:.1f} seconds"
+    )
+    click.echo(
+        f"{statistics.records_per_second:.1f} records/s, {statistics.documents_per_second:.1f} documents/s, "
+        f"{statistics.size} bytes written to {output}"
+    )
+    failures = statistics.failed_records + statistics.skipped_documents
+    click.secho(
+        f"{statistics.failed_records} records failed, {statistics.skipped_documents} documents were skipped",
+        fg="green" if not failures else "yellow",
+    )
+    if replay_transport is not None and replay_transport.misses:
+        click.secho(f"{len(replay_transport.misses)} requests were not in the HTTP archive", fg="yellow")
@@ -3,4 +3,12 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-only
 
-from ckanext.fairdatapoint.harvesters.fair_data_point_civity_harvester import FairDataPointCivityHarvester
+# The harvester is imported on first use, so the domain package can be used without CKAN
+
+
+def __getattr__(name):
+    if name == "FairDataPointCivityHarvester":
+        from ckanext.fairdatapoint.harvesters.fair_data_point_civity_harvester import FairDataPointCivityHarvester
+
+        return FairDataPointCivityHarvester
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
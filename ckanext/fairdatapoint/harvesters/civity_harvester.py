@@ -4,17 +4,43 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 
 import cgitb
+import datetime
 import json
 import logging
 import sys
+import time
 import uuid
 import warnings
 from abc import abstractmethod
+from collections import deque
 
 import ckan.plugins.toolkit as toolkit
 from ckan import model
 
+from ckanext.fairdatapoint.harvesters.domain.blob_store import is_blob_reference
+from ckanext.fairdatapoint.harvesters.domain.content_compression import (
+    DEFAULT_COMPRESSION,
+    compress_content,
+    decompress_content,
+)
+from ckanext.fairdatapoint.harvesters.domain.harvest_diff import (
+    HarvestDiff,
+    diff_cache,
+    diff_records,
+    estimate_import_seconds,
+    graph_digest,
+)
 from ckanext.fairdatapoint.harvesters.domain.identifier import Identifier
+from ckanext.fairdatapoint.harvesters.domain.import_scheduler import ImportScheduler
+from ckanext.fairdatapoint.harvesters.domain.record_content import parse_content
+from ckanext.fairdatapoint.harvesters.domain.record_to_package_pool import (
+    ConversionRequest,
+    RecordToPackagePool,
+)
+from ckanext.fairdatapoint.harvesters.domain.time_budget import (
+    time_budget,
+    time_budget_exceeded,
+)
 from ckanext.harvest.harvesters import HarvesterBase
 from ckanext.harvest.model import HarvestObject
 from ckanext.harvest.model import HarvestObjectExtra as HOExtra
@@ -25,6 +51,21 @@ log = logging.getLogger(__name__)
 
 RESOLVE_LABELS = "resolve_labels"
 
+# Harvest object extra with the identifier values of the records a record depends on, as a JSON list
+DEPENDS_ON = "depends_on"
+
+# Harvest object extra marking an object whose import is left to import_stage_batch
+IMPORT_PENDING = "import_pending"
+
+# Seconds between checks whether the harvest objects a harvest object depends on are imported
+DEPENDENCY_POLL_INTERVAL = 1
+
+# Number of recent imports of a source the import time of a dry run is estimated from
+IMPORT_DURATION_SAMPLE_SIZE = 1000
+
+# Number of GUIDs a dry run looks up the harvested content of at once
+GUID_QUERY_BATCH_SIZE = 1000
+
 def text_traceback():
     with warnings.catch_warnings():
         warnings.simplefilter("ignore")
@@ -49,6 +90,43 @@ class CivityHarvester(HarvesterBase):
 
     record_to_package_converter = None
 
+    # Compression of the record content stored in harvest objects, content is decompressed transparently
+    content_compression = DEFAULT_COMPRESSION
+
+    # Optional ContentBlobStore which record content is offloaded to instead of storing it in the database
+    content_blob_store = None
+
+    # Optional GraphCache passing the graphs of fetched records to the import stage. The record provider must
+    # implement get_record_with_graph_by_id and the converter must accept a graph when a cache is set.
+    graph_cache = None
+
+    # Number of harvest objects fetch_stage fetches together, claiming waiting harvest objects of the same job. The
+    # default of 1 fetches every harvest object on its own.
+    fetch_batch_size = 1
+
+    # Whether the gather stage stores the content of the records it finds, so the fetch stage has nothing left to
+    # do. The record provider must implement get_records.
+    fetch_in_gather = False
+
+    # Number of harvest objects the gather stage commits together when fetch_in_gather is enabled
+    gather_commit_size = 100
+
+    # Seconds the gather stage may spend on requests to the harvest source, 0 is unlimited. When the deadline passes,
+    # the records found so far are harvested, but no packages are deleted since the crawl is incomplete.
+    gather_deadline = 0
+
+    # Whether the import stage leaves the conversion of records to import_stage_batch, which the import command
+    # runs. The queue only marks the harvest objects as pending, the packages are created when the command runs.
+    batch_import = False
+
+    # Seconds the import stage of the queue waits for the harvest objects of the same job a harvest object depends
+    # on, so a dataset is imported after its series. 0 does not wait. import_stage_batch orders imports itself.
+    dependency_timeout = 60
+
+    # Identifier type of the records other records depend on, whose GUIDs are built from the identifier values
+    # returned by _get_record_dependencies
+    dependency_id_type = "dataseries"
+
     @abstractmethod
     def setup_record_provider(self, harvest_url, harvest_config_dict):
         pass
@@ -57,6 +135,17 @@ class CivityHarvester(HarvesterBase):
     def setup_record_to_package_converter(self, harvest_url, harvest_config_dict):
         pass
 
+    @abstractmethod
+    def create_record_provider(self, harvest_url, harvest_config_dict):
+        """
+        Creates a record provider for a harvest source without setting it on the harvester. The plugin is a single
+        instance, so a dry run uses its own provider instead of replacing the one of a running harvest.
+        """
+
+    def get_gather_deadline(self, harvest_config_dict):
+        """Gather deadline of a harvest source in seconds, 0 is unlimited"""
+        return self.gather_deadline
+
     def gather_stage(self, harvest_job):
         """
         The gather stage will receive a HarvestJob object and will be
@@ -93,7 +182,15 @@ class CivityHarvester(HarvesterBase):
 
         guids_in_db = set(guids_to_package_ids.keys())
 
-        guids_in_harvest = self._get_guids_in_harvest(harvest_job)
+        if self.fetch_in_gather:
+            result = self._gather_and_fetch(harvest_job, guids_to_package_ids)
+            logger.debug("Finished gather_stage for job: [%r]", harvest_job)
+            return result
+
+        with time_budget(self.gather_deadline):
+            guids_in_harvest = self._get_guids_in_harvest(harvest_job)
+            deadline_exceeded = time_budget_exceeded()
+        crawl_complete = self._save_crawl_errors(harvest_job) and not deadline_exceeded
         if guids_in_harvest:
             # Sort so that dataseries are processed before datasets
             guids_in_harvest = sorted(
@@ -106,6 +203,10 @@ class CivityHarvester(HarvesterBase):
             new = guids_in_harvest_set - guids_in_db
             delete = guids_in_db - guids_in_harvest_set
             change = guids_in_db & guids_in_harvest_set
+            if deadline_exceeded:
+                self._save_gather_deadline_error(harvest_job, len(guids_in_harvest_set))
+            if not crawl_complete:
+                delete = set()
 
             for guid in new:
                 existing = (
@@ -135,20 +236,7 @@ class CivityHarvester(HarvesterBase):
                 obj.save()
                 result.append(obj.id)
             for guid in delete:
-                obj = HarvestObject(
-                    guid=guid,
-                    job=harvest_job,
-                    package_id=guids_to_package_ids[guid],
-                    extras=[HOExtra(key="status", value="delete")],
-                )
-                # TODO
-                #  Deleted object is marked as not being current here already. When the actual deletion of the package
-                #  fails in the import stage, an orphan package will remain in existence and never be deleted.
-                model.Session.query(HarvestObject).filter_by(guid=guid).update(
-                    {"current": False}, False
-                )
-                obj.save()
-                result.append(obj.id)
+                result.append(self._create_delete_object(harvest_job, guid, guids_to_package_ids[guid]))
 
         # Why is this needed? An empty list seems a valid result of this stage. There is simply nothing to do
         # if len(result) == 0:
@@ -158,6 +246,235 @@ class CivityHarvester(HarvesterBase):
 
         return result
 
+    @staticmethod
+    def _create_delete_object(harvest_job, guid, package_id):
+        obj = HarvestObject(
+            guid=guid,
+            job=harvest_job,
+            package_id=package_id,
+            extras=[HOExtra(key="status", value="delete")],
+        )
+        # TODO
+        #  Deleted object is marked as not being current here already. When the actual deletion of the package
+        #  fails in the import stage, an orphan package will remain in existence and never be deleted.
+        model.Session.query(HarvestObject).filter_by(guid=guid).update(
+            {"current": False}, False
+        )
+        obj.save()
+        return obj.id
+
+    def _save_gather_deadline_error(self, harvest_job, count):
+        self._save_gather_error(
+            "Gather deadline of %s seconds exceeded after finding %s records, the remaining records are not "
+            "harvested and no packages are deleted" % (self.gather_deadline, count),
+            harvest_job,
+        )
+
+    def _save_crawl_errors(self, harvest_job):
+        """
+        Saves a gather error for every document the crawl of the record provider skipped. Returns whether the crawl
+        was complete, if not the records below the skipped documents are missing and no packages may be deleted.
+        """
+        crawl_errors = list(getattr(self.record_provider, "crawl_errors", None) or [])
+        for url, error in crawl_errors:
+            self._save_gather_error(
+                "Document [%s] was skipped, the records it refers to are not harvested and no packages are "
+                "deleted: [%s]" % (url, error),
+                harvest_job,
+            )
+        return not crawl_errors
+
+    def _gather_and_fetch(self, harvest_job, guids_to_package_ids):
+        """
+        Gather stage which stores the content of the records while crawling the harvest source. Harvest objects are
+        committed in groups as the records come in, deletions are determined once the crawl is complete. A record
+        which could not be fetched gets a harvest object without content, which the fetch stage fetches again.
+        When the crawl fails, the harvest is aborted. When the gather deadline passes or the crawl skipped documents
+        which are too large, the records found so far are harvested and no deletions are created. A crawl which
+        finds no records at all creates no deletions either.
+        """
+        logger = logging.getLogger(__name__ + ".gather_stage")
+
+        created = []
+        uncommitted = []
+        guids_in_harvest = set()
+
+        try:
+            with time_budget(self.gather_deadline):
+                for guid, fetched in self.record_provider.get_records():
+                    if guid in guids_in_harvest:
+                        continue
+                    guids_in_harvest.add(guid)
+
+                    if guid in guids_to_package_ids:
+                        obj = HarvestObject(
+                            guid=guid,
+                            job=harvest_job,
+                            package_id=guids_to_package_ids[guid],
+                            extras=[HOExtra(key="status", value="change")],
+                        )
+                    else:
+                        obj = HarvestObject(
+                            guid=guid,
+                            job=harvest_job,
+                            extras=[HOExtra(key="status", value="new")],
+                        )
+
+                    if isinstance(fetched, Exception):
+                        logger.warning("Record [%s] is left to the fetch stage: [%r]", guid, fetched)
+                    else:
+                        record, graph = fetched
+                        if record:
+                            obj.content = self._store_content(record)
+                            dependencies = self._get_record_dependencies(guid, graph)
+                            if dependencies:
+                                obj.extras.append(HOExtra(key=DEPENDS_ON, value=json.dumps(dependencies)))
+
+                    obj.add()
+                    uncommitted.append(obj)
+                    if len(uncommitted) >= self.gather_commit_size:
+                        model.Session.commit()
+                        created.extend((o.guid, o.id) for o in uncommitted)
+                        uncommitted = []
+                deadline_exceeded = time_budget_exceeded()
+
+            model.Session.commit()
+            created.extend((o.guid, o.id) for o in uncommitted)
+        except Exception as e:
+            logger.exception("Error gathering the records from the RecordProvider")
+            model.Session.rollback()
+            self._save_gather_error(
+                "Error gathering the records from the RecordProvider: [%s]" % str(e),
+                harvest_job,
+            )
+            # The crawl is incomplete, so abort the harvest: the harvest objects created so far are deleted
+            raise
+
+        # Dataseries first, so the harvest queue tends to import them before their datasets
+        result = [object_id for guid, object_id in sorted(created, key=lambda c: 0 if "dataseries=" in c[0] else 1)]
+
+        if deadline_exceeded:
+            self._save_gather_deadline_error(harvest_job, len(guids_in_harvest))
+        crawl_complete = self._save_crawl_errors(harvest_job) and not deadline_exceeded
+        if not guids_in_harvest and guids_to_package_ids:
+            # An unreachable root document looks like an empty source, like gather_stage keep the packages
+            self._save_gather_error(
+                "No records were found, no packages are deleted",
+                harvest_job,
+            )
+            crawl_complete = False
+        if crawl_complete:
+            for guid in set(guids_to_package_ids) - guids_in_harvest:
+                result.append(self._create_delete_object(harvest_job, guid, guids_to_package_ids[guid]))
+
+        logger.info(
+            "Gathered and fetched %s records, %s to delete", len(created), len(result) - len(created)
+        )
+        return result
+
+    def diff_stage(self, harvest_source, compare_content=False, fetch_concurrency=None, refresh=False):
+        """
+        Dry run of a harvest of the harvest source: crawls the source and compares the records found with the
+        records harvested before, without creating harvest objects. When compare_content is set, the content of
+        every record is fetched and compared with the content harvested before. Results are cached for a while,
+        unless refresh is set.
+
+        The crawl stops at the gather deadline. When it does, or when documents could not be crawled, the diff is
+        incomplete: like a harvest, it deletes nothing, and it is not cached.
+
+        :param harvest_source: HarvestSource object
+        :returns: HarvestDiff
+        """
+        key = (harvest_source.id, harvest_source.url, harvest_source.config, bool(compare_content))
+        if not refresh:
+            diff = diff_cache.get(key)
+            if diff is not None:
+                return diff
+
+        harvest_config_dict = self._get_harvest_config(harvest_source.config)
+        record_provider = self.create_record_provider(harvest_source.url, harvest_config_dict)
+        if fetch_concurrency:
+            record_provider.fetch_concurrency = max(1, fetch_concurrency)
+        guids_to_package_ids = self._get_guids_to_package_ids_of_source(harvest_source.id)
+
+        start = time.monotonic()
+        failed = 0
+        with time_budget(self.get_gather_deadline(harvest_config_dict)):
+            if compare_content:
+                crawled = {}
+                for guid, fetched in record_provider.get_records():
+                    if isinstance(fetched, Exception):
+                        failed += 1
+                        crawled[guid] = None
+                    else:
+                        crawled[guid] = graph_digest(fetched[1])
+            else:
+                crawled = dict.fromkeys(record_provider.get_record_ids())
+            deadline_exceeded = time_budget_exceeded()
+        crawl_seconds = time.monotonic() - start
+        crawl_errors = len(getattr(record_provider, "crawl_errors", None) or [])
+        # Like the gather stage, a harvest deletes nothing when it did not see the whole source
+        complete = not crawl_errors and not deadline_exceeded and bool(crawled or not guids_to_package_ids)
+
+        if compare_content:
+            current = self._get_content_digests_of_source(harvest_source.id, set(crawled) & set(guids_to_package_ids))
+            current.update((guid, None) for guid in guids_to_package_ids if guid not in current)
+        else:
+            current = dict.fromkeys(guids_to_package_ids)
+        new, changed, unchanged, deleted = diff_records(crawled, current)
+        if not complete:
+            deleted = set()
+
+        diff = HarvestDiff(
+            new=len(new),
+            changed=len(changed),
+            unchanged=len(unchanged) if compare_content else None,
+            deleted=len(deleted),
+            failed=failed,
+            crawl_seconds=crawl_seconds,
+            # A harvest creates a harvest object for every record, also for unchanged ones
+            estimated_import_seconds=estimate_import_seconds(
+                len(crawled) + len(deleted), self._get_import_durations_of_source(harvest_source.id)
+            ),
+            complete=complete,
+            crawl_errors=crawl_errors,
+        )
+        if complete:
+            diff_cache.put(key, diff)
+        return diff
+
+    def _get_content_digests_of_source(self, source_id, guids):
+        """Digests of the content of the current harvest objects of the source with the given GUIDs"""
+        guids = list(guids)
+        digests = {}
+        for start in range(0, len(guids), GUID_QUERY_BATCH_SIZE):
+            query = (
+                model.Session.query(HarvestObject.guid, HarvestObject.content)
+                .filter(HarvestObject.current == True)
+                .filter(HarvestObject.harvest_source_id == source_id)
+                .filter(HarvestObject.content.isnot(None))
+                .filter(HarvestObject.guid.in_(guids[start:start + GUID_QUERY_BATCH_SIZE]))
+            )
+            for guid, content in query:
+                try:
+                    digests[guid] = graph_digest(parse_content(self._load_content(content)))
+                except Exception as e:
+                    log.warning("Content of record [%s] could not be read: [%r]", guid, e)
+                    digests[guid] = None
+        return digests
+
+    @staticmethod
+    def _get_import_durations_of_source(source_id):
+        query = (
+            model.Session.query(HarvestObject.import_started, HarvestObject.import_finished)
+            .filter(HarvestObject.harvest_source_id == source_id)
+            .filter(HarvestObject.import_started.isnot(None))
+            .filter(HarvestObject.import_finished.isnot(None))
+            .order_by(HarvestObject.import_finished.desc())
+            .limit(IMPORT_DURATION_SAMPLE_SIZE)
+        )
+        return [(finished - started).total_seconds() for started, finished in query]
+
     def fetch_stage(self, harvest_object):
         """
         The fetch stage will receive a HarvestObject object and will be
@@ -193,15 +510,30 @@ class CivityHarvester(HarvesterBase):
             # No need to fetch anything, just pass to the import stage
             result = True
 
+        elif harvest_object.content is not None:
+            # Fetched already, together with another harvest object of this job
+            result = True
+
+        elif self.fetch_batch_size > 1:
+            batch = [harvest_object] + self._claim_harvest_objects(harvest_object, self.fetch_batch_size - 1)
+            result = self.fetch_stage_batch(batch)[harvest_object.id]
+
         else:
             identifier = harvest_object.guid
             try:
-                record = self.record_provider.get_record_by_id(identifier)
+                record, graph = self._get_record(identifier)
 
                 if record:
                     try:
                         # Save the fetch contents in the HarvestObject
-                        harvest_object.content = record  # TODO move JSON stuff to record provider for Gisweb harvester
+                        harvest_object.content = self._store_content(
+                            record
+                        )  # TODO move JSON stuff to record provider for Gisweb harvester
+                        dependencies = self._get_record_dependencies(identifier, graph)
+                        if dependencies:
+                            harvest_object.extras.append(
+                                HOExtra(key=DEPENDS_ON, value=json.dumps(dependencies))
+                            )
                         harvest_object.save()
                     except Exception as e:
                         self._save_object_error(
@@ -213,6 +545,9 @@ class CivityHarvester(HarvesterBase):
 
                     model.Session.commit()
 
+                    if graph is not None and self.graph_cache is not None:
+                        self.graph_cache.put(harvest_object.id, harvest_object.content, graph)
+
                     logger.debug(
                         "Record content saved for ID [%s], harvest object ID [%s]",
                         harvest_object.guid,
@@ -240,7 +575,125 @@ class CivityHarvester(HarvesterBase):
 
         return result
 
-    def import_stage(self, harvest_object):
+    def fetch_stage_batch(self, harvest_objects):
+        """
+        Fetches the records of a batch of harvest objects concurrently and saves them with a single commit.
+
+        :param harvest_objects: HarvestObjects of a single harvest source
+        :returns: A dictionary with the result of fetch_stage for each harvest object id
+        """
+        logger = logging.getLogger(__name__ + ".fetch_stage")
+
+        harvest_objects = list(harvest_objects)
+        results = {}
+        to_fetch = {}
+        for harvest_object in harvest_objects:
+            if self._get_object_extra(harvest_object, "status") == "delete":
+                results[harvest_object.id] = True
+            else:
+                to_fetch[harvest_object.guid] = harvest_object
+        if not to_fetch:
+            return results
+
+        logger.debug("Fetching %s harvest objects", len(to_fetch))
+
+        graphs = {}
+        for identifier, fetched in self._get_records(list(to_fetch)):
+            harvest_object = to_fetch[identifier]
+            if isinstance(fetched, Exception):
+                self._save_object_error(
+                    "Error getting the record with identifier [%s] from record provider [%r]"
+                    % (identifier, fetched),
+                    harvest_object,
+                )
+                results[harvest_object.id] = False
+                continue
+
+            record, graph = fetched
+            if not record:
+                self._save_object_error("Empty record for identifier %s" % identifier, harvest_object)
+                results[harvest_object.id] = False
+                continue
+
+            try:
+                harvest_object.content = self._store_content(record)
+                dependencies = self._get_record_dependencies(identifier, graph)
+                if dependencies:
+                    harvest_object.extras.append(HOExtra(key=DEPENDS_ON, value=json.dumps(dependencies)))
+                harvest_object.add()
+            except Exception as e:
+                self._save_object_error(
+                    "Error saving harvest object for identifier [%s] [%r]" % (identifier, e),
+                    harvest_object,
+                )
+                results[harvest_object.id] = False
+                continue
+
+            graphs[harvest_object.id] = graph
+            results[harvest_object.id] = True
+
+        # One commit for the whole batch instead of one per harvest object
+        model.Session.commit()
+
+        if self.graph_cache is not None:
+            for harvest_object in harvest_objects:
+                if graphs.get(harvest_object.id) is not None:
+                    self.graph_cache.put(harvest_object.id, harvest_object.content, graphs[harvest_object.id])
+
+        logger.debug("Fetched %s of %s harvest objects", sum(results.values()), len(harvest_objects))
+        return results
+
+    @staticmethod
+    def _claim_harvest_objects(harvest_object, limit):
+        """
+        Claims up to limit harvest objects of the job of the given harvest object which are still waiting to be
+        fetched, so they can be fetched together with it. Claimed objects are skipped by other workers, their
+        queued fetch only passes them on to the import stage.
+        """
+        claimed = (
+            model.Session.query(HarvestObject)
+            .filter(HarvestObject.harvest_job_id == harvest_object.harvest_job_id)
+            .filter(HarvestObject.id != harvest_object.id)
+            .filter(HarvestObject.state == "WAITING")
+            .filter(HarvestObject.content.is_(None))
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        fetch_started = datetime.datetime.utcnow()
+        for claimed_object in claimed:
+            claimed_object.state = "FETCH"
+            claimed_object.fetch_started = fetch_started
+        model.Session.commit()
+        return claimed
+
+    @staticmethod
+    def claim_pending_imports(source_id, limit):
+        """
+        Claims up to limit harvest objects of the source whose import was left to import_stage_batch, dataseries
+        first. The queue is done with them, and objects claimed by another import are skipped, so every pending
+        object is imported once.
+        """
+        claimed = (
+            model.Session.query(HarvestObject)
+            .join(HOExtra, HOExtra.harvest_object_id == HarvestObject.id)
+            .filter(HarvestObject.harvest_source_id == source_id)
+            .filter(HarvestObject.state == "COMPLETE")
+            .filter(HOExtra.key == IMPORT_PENDING)
+            .order_by(HarvestObject.guid.startswith("dataseries=").desc())
+            .limit(limit)
+            .with_for_update(of=HarvestObject, skip_locked=True)
+            .all()
+        )
+        import_started = datetime.datetime.utcnow()
+        for claimed_object in claimed:
+            claimed_object.extras = [extra for extra in claimed_object.extras if extra.key != IMPORT_PENDING]
+            claimed_object.state = "IMPORT"
+            claimed_object.import_started = import_started
+        model.Session.commit()
+        return claimed
+
+    def import_stage(self, harvest_object, package_dict=None):
         """
         The import stage will receive a HarvestObject object and will be
         responsible for:
@@ -263,6 +716,7 @@ class CivityHarvester(HarvesterBase):
         NB You can run this stage repeatedly using 'paster harvest import'.
 
         :param harvest_object: HarvestObject object
+        :param package_dict: Package dictionary converted from the harvest object beforehand, see import_stage_batch
         :returns: True if the action was done, "unchanged" if the object didn't
                   need harvesting after all or False if there were errors.
         """
@@ -305,26 +759,38 @@ class CivityHarvester(HarvesterBase):
             )
             return False
 
+        if package_dict is None and self.batch_import:
+            # The import command imports the object later, together with the other pending objects of the source
+            harvest_object.extras.append(HOExtra(key=IMPORT_PENDING, value="true"))
+            harvest_object.add()
+            model.Session.commit()
+            logger.debug("Left the import of harvest_object [%s] to the import command", harvest_object.id)
+            return "unchanged"
+
         try:
             # Determine datatype
             identifier_harvest_object = Identifier(harvest_object.guid)
             datatype = identifier_harvest_object.get_id_type()
 
-            if datatype == "dataset":
-                # Build mapping from dataseries GUID to package ID for all active dataset_series in the database
-                series_results = model.Session.query(model.PackageExtra.value, model.Package.id) \
-                    .join(model.Package) \
-                    .filter(model.PackageExtra.key == 'guid') \
-                    .filter(model.Package.type == 'dataset_series') \
-                    .filter(model.Package.state == 'active') \
-                    .all()
-                series_mapping = {guid: {"id": series_id} for guid, series_id in series_results}
-                package_dict = self.record_to_package_converter.record_to_package(
-                    harvest_object.guid, str(harvest_object.content), series_mapping=series_mapping
-                )
-            else:
+            if package_dict is None:
+                self._wait_for_dependencies(harvest_object)
+                kwargs = {}
+                if datatype == "dataset":
+                    kwargs["series_mapping"] = self._get_series_mapping()
+
+                graph = None
+                if self.graph_cache is not None:
+                    graph = self.graph_cache.pop(harvest_object.id, str(harvest_object.content))
+
+                if graph is not None:
+                    # The graph fetched in this process is still available, no need to load and parse the content
+                    content = None
+                    kwargs["graph"] = graph
+                else:
+                    content = self._load_content(str(harvest_object.content))
+
                 package_dict = self.record_to_package_converter.record_to_package(
-                    harvest_object.guid, str(harvest_object.content)
+                    harvest_object.guid, content, **kwargs
                 )
             package_dict.setdefault("extras", []).append({"key": "guid", "value": identifier_harvest_object.get_id_value()})
         except Exception as e:
@@ -456,6 +922,197 @@ class CivityHarvester(HarvesterBase):
         return True
 
 
+    def import_stage_batch(self, harvest_objects, max_workers=None):
+        """
+        Imports a batch of harvest objects of the same harvest source. Records are converted to packages in a pool
+        of worker processes, while the packages are created and updated in this process as the conversions
+        complete. Objects which do not depend on others are released to the pool as soon as it has room, datasets
+        which are members of a series of the same batch are held until the package of the series is committed.
+
+        :param harvest_objects: HarvestObjects of a single harvest source
+        :param max_workers: Number of worker processes, defaults to the number of CPUs
+        :returns: A dictionary with the result of import_stage for each harvest object id
+        """
+        harvest_objects = list(harvest_objects)
+        results = {}
+        if not harvest_objects:
+            return results
+
+        source = harvest_objects[0].source
+        self.setup_record_to_package_converter(source.url, self._get_harvest_config(source.config))
+
+        to_convert = {}
+        for harvest_object in harvest_objects:
+            if self._get_object_extra(harvest_object, "status") == "delete" or harvest_object.content is None:
+                # Nothing to convert, import_stage deletes the package or records the error
+                results[harvest_object.id] = self.import_stage(harvest_object)
+            else:
+                to_convert[harvest_object.id] = harvest_object
+
+        scheduler = ImportScheduler(self._get_batch_dependencies(to_convert.values()))
+        series_mapping = None
+        ready = deque()
+
+        with RecordToPackagePool(self.record_to_package_converter, max_workers=max_workers) as pool:
+            while not scheduler.finished:
+                ready.extend(scheduler.pop_ready())
+                # Only load the content of as many records as the pool holds, the rest waits until results come in
+                while ready and pool.pending < pool.max_pending:
+                    harvest_object = to_convert[ready.popleft()]
+                    is_dataset = Identifier(harvest_object.guid).get_id_type() == "dataset"
+                    if is_dataset and series_mapping is None:
+                        series_mapping = self._get_series_mapping()
+                    try:
+                        content = self._load_content(str(harvest_object.content))
+                    except Exception as e:
+                        self._save_object_error(
+                            "Error loading content for identifier [%s] [%r]" % (harvest_object.id, e),
+                            harvest_object,
+                            "Import",
+                        )
+                        results[harvest_object.id] = False
+                        scheduler.done(harvest_object.id)
+                        continue
+                    pool.submit(ConversionRequest(
+                        harvest_object.id, harvest_object.guid, content, series_mapping if is_dataset else None
+                    ))
+
+                for conversion_result in pool.collect():
+                    harvest_object = to_convert[conversion_result.key]
+                    results[harvest_object.id] = self._import_conversion_result(harvest_object, conversion_result)
+                    if Identifier(harvest_object.guid).get_id_type() == "dataseries":
+                        # The series package is committed now, datasets released from here on can link to it
+                        series_mapping = None
+                    scheduler.done(harvest_object.id)
+
+        return results
+
+    def _wait_for_dependencies(self, harvest_object):
+        """
+        Waits until the harvest objects of the same job which the harvest object depends on are no longer being
+        fetched or imported. Queue consumers take harvest objects in parallel, so a series may still be imported
+        by another consumer when its datasets come in. After dependency_timeout seconds the object is imported
+        anyway, without the link to what it depends on.
+        """
+        record_ids = json.loads(self._get_object_extra(harvest_object, DEPENDS_ON) or "[]")
+        if not record_ids or self.dependency_timeout <= 0:
+            return
+
+        query = (
+            model.Session.query(HarvestObject.guid)
+            .filter(HarvestObject.harvest_job_id == harvest_object.harvest_job_id)
+            .filter(HarvestObject.id != harvest_object.id)
+            .filter(HarvestObject.state.in_(["WAITING", "FETCH", "IMPORT"]))
+            .filter(HarvestObject.guid.in_([self._get_dependency_guid(record_id) for record_id in record_ids]))
+        )
+        deadline = time.monotonic() + self.dependency_timeout
+        while True:
+            pending = [guid for (guid,) in query]
+            if not pending:
+                return
+            if time.monotonic() >= deadline:
+                log.warning(
+                    "Importing [%s] before [%s] it depends on, which did not finish within %s seconds",
+                    harvest_object.guid, ", ".join(pending), self.dependency_timeout,
+                )
+                return
+            time.sleep(DEPENDENCY_POLL_INTERVAL)
+
+    def _get_dependency_guid(self, record_id):
+        identifier = Identifier("")
+        identifier.add(self.dependency_id_type, record_id)
+        return identifier.guid
+
+    def _import_conversion_result(self, harvest_object, conversion_result):
+        if conversion_result.error is not None:
+            self._save_object_error(
+                "Error converting record to package for identifier [%s] [%r]"
+                % (harvest_object.id, conversion_result.error),
+                harvest_object,
+            )
+            return False
+        if not conversion_result.package_dict:
+            return False
+        return self.import_stage(harvest_object, package_dict=conversion_result.package_dict)
+
+    def _get_batch_dependencies(self, harvest_objects):
+        """
+        Maps each harvest object id to the ids of the harvest objects in the batch it depends on, using the
+        dependencies recorded in the fetch stage
+        """
+        ids_by_record = {Identifier(o.guid).get_id_value(): o.id for o in harvest_objects}
+        return {
+            harvest_object.id: {
+                ids_by_record[record_id]
+                for record_id in json.loads(self._get_object_extra(harvest_object, DEPENDS_ON) or "[]")
+                if record_id in ids_by_record
+            }
+            for harvest_object in harvest_objects
+        }
+
+    @staticmethod
+    def _get_series_mapping():
+        """
+        Build mapping from dataseries GUID to package ID for all active dataset_series in the database
+        """
+        series_results = model.Session.query(model.PackageExtra.value, model.Package.id) \
+            .join(model.Package) \
+            .filter(model.PackageExtra.key == 'guid') \
+            .filter(model.Package.type == 'dataset_series') \
+            .filter(model.Package.state == 'active') \
+            .all()
+        return {guid: {"id": series_id} for guid, series_id in series_results}
+
+    def _get_record(self, identifier):
+        """
+        Gets a record from the record provider, together with its graph when the graph cache is enabled
+        """
+        if self.graph_cache is not None:
+            return self.record_provider.get_record_with_graph_by_id(identifier)
+        return self.record_provider.get_record_by_id(identifier), None
+
+    def _get_records(self, identifiers):
+        """
+        Gets records from the record provider concurrently, yielding (identifier, (record, graph)) or
+        (identifier, exception) pairs. The graph is only returned when the graph cache is enabled.
+        """
+        if self.graph_cache is not None:
+            return self.record_provider.get_records_with_graphs_by_ids(identifiers)
+        return (
+            (identifier, fetched if isinstance(fetched, Exception) else (fetched, None))
+            for identifier, fetched in self.record_provider.get_records_by_ids(identifiers)
+        )
+
+    def _get_record_dependencies(self, guid, graph):
+        """
+        Returns the identifier values of the records which must be imported before the record with the given guid.
+        The graph of the record is passed when the record provider returned it.
+        """
+        return []
+
+    def _store_content(self, record):
+        """
+        Converts a record into the content to save in a harvest object: the record is compressed and offloaded to
+        the blob store, if configured
+        """
+        content = compress_content(record, self.content_compression)
+        if self.content_blob_store is not None:
+            content = self.content_blob_store.offload(content)
+        return content
+
+    def _load_content(self, content):
+        """
+        Returns the record saved in a harvest object, reading it from the blob store and decompressing it if
+        necessary
+        """
+        if is_blob_reference(content):
+            if self.content_blob_store is None:
+                raise CivityHarvesterException(
+                    "Content refers to the blob store, but no blob store is configured"
+                )
+            content = self.content_blob_store.resolve(content)
+        return decompress_content(content)
+
     def _create_or_update_package(
         self, package_dict, create_or_update, context, harvest_object
     ):
@@ -518,10 +1175,14 @@ class CivityHarvester(HarvesterBase):
         :param harvest_job:
         :return:
         """
+        return CivityHarvester._get_guids_to_package_ids_of_source(harvest_job.source.id)
+
+    @staticmethod
+    def _get_guids_to_package_ids_of_source(source_id):
         query = (
             model.Session.query(HarvestObject.guid, HarvestObject.package_id)
             .filter(HarvestObject.current == True)
-            .filter(HarvestObject.harvest_source_id == harvest_job.source.id)
+            .filter(HarvestObject.harvest_source_id == source_id)
         )
 
         guid_to_package_id = {}
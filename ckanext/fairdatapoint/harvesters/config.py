@@ -2,10 +2,20 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-only
 from __future__ import annotations
-from typing import Optional
+from typing import Optional, Tuple
 
 from ckan.plugins import toolkit
 
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point import (
+    CONNECT_TIMEOUT,
+    REQUEST_TIMEOUT,
+)
+from ckanext.fairdatapoint.harvesters.domain.graph_cache import DEFAULT_GRAPH_CACHE_SIZE
+from ckanext.fairdatapoint.harvesters.domain.host_limiter import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_RATE_LIMIT,
+)
+
 
 def get_harvester_setting(harvest_config_dict: dict, config_name: str, default_value):
     """This function queries a harvester setting using a global setting with per-harvester override
@@ -43,6 +53,17 @@ def get_harvester_int_setting(harvest_config_dict: dict, config_name: str, defau
     return toolkit.asint(raw_value)
 
 
+def get_harvester_str_setting(harvest_config_dict: dict, config_name: str, default_value: str) -> str:
+    """Query a string harvester setting with per-harvester override first."""
+    if config_name in harvest_config_dict:
+        raw_value = harvest_config_dict[config_name]
+    else:
+        raw_value = toolkit.config.get(
+            f"ckanext.fairdatapoint.{config_name}", default_value
+        )
+    return str(raw_value).strip()
+
+
 def get_bioportal_api_key() -> Optional[str]:
     """Return the BioPortal API key configured for the FAIR Data Point extension.
  
@@ -56,3 +77,86 @@ def get_bioportal_api_key() -> Optional[str]:
  
     normalized_key = api_key.strip()
     return normalized_key or None
+
+
+def get_blob_store_path() -> Optional[str]:
+    """Return the directory of the harvest object content blob store, if configured.
+
+    The directory is read from the CKAN configuration option
+    ``ckanext.fairdatapoint.blob_store_path``. It is a server setting only and
+    cannot be set per harvester, since harvester configurations must not decide
+    where files are written.
+    """
+    path = toolkit.config.get("ckanext.fairdatapoint.blob_store_path")
+    if not path:
+        return None
+
+    normalized_path = path.strip()
+    return normalized_path or None
+
+
+def get_file_source_directory() -> Optional[str]:
+    """Return the directory file:// harvest sources must be in, if configured.
+
+    The directory is read from the CKAN configuration option
+    ``ckanext.fairdatapoint.file_source_directory``. Harvest sources reading
+    local RDF dumps are only enabled when it is set. It is a server setting
+    only, since harvester configurations must not decide which files are read.
+    """
+    directory = toolkit.config.get("ckanext.fairdatapoint.file_source_directory")
+    if not directory:
+        return None
+
+    normalized_directory = directory.strip()
+    return normalized_directory or None
+
+
+def get_graph_cache_size() -> int:
+    """Return the number of fetched record graphs kept for the import stage.
+
+    The size is read from the CKAN configuration option
+    ``ckanext.fairdatapoint.graph_cache_size``. The cache is shared by all
+    harvesters of a process, so it is a server setting only. ``0`` disables it.
+    """
+    return toolkit.asint(
+        toolkit.config.get("ckanext.fairdatapoint.graph_cache_size", DEFAULT_GRAPH_CACHE_SIZE)
+    )
+
+
+def get_host_rate_limit() -> float:
+    """Return the maximum number of requests per second to a single host.
+
+    The rate is read from the CKAN configuration option
+    ``ckanext.fairdatapoint.host_rate_limit``. Limits are shared by all
+    harvesters and the label resolver of a process, so it is a server setting
+    only. ``0`` means unlimited.
+    """
+    return float(
+        toolkit.config.get("ckanext.fairdatapoint.host_rate_limit", DEFAULT_RATE_LIMIT)
+    )
+
+
+def get_host_max_concurrency() -> int:
+    """Return the maximum number of concurrent requests to a single host.
+
+    The number is read from the CKAN configuration option
+    ``ckanext.fairdatapoint.host_max_concurrency``. The actual number adapts to
+    how the host responds and stays between one and this maximum.
+    """
+    return toolkit.asint(
+        toolkit.config.get("ckanext.fairdatapoint.host_max_concurrency", DEFAULT_MAX_CONCURRENCY)
+    )
+
+
+def get_request_timeout() -> Tuple[int, int]:
+    """Return the connect and read timeout in seconds of requests made outside a harvest source.
+
+    The timeouts are read from the CKAN configuration options
+    ``ckanext.fairdatapoint.connect_timeout`` and
+    ``ckanext.fairdatapoint.request_timeout``, the settings harvesters fall
+    back on, so the label resolver uses the same timeouts as the harvesters.
+    """
+    return (
+        get_harvester_int_setting({}, "connect_timeout", CONNECT_TIMEOUT),
+        get_harvester_int_setting({}, "request_timeout", REQUEST_TIMEOUT),
+    )
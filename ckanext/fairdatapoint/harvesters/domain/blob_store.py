@@ -0,0 +1,129 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Content addressed store for harvest object content.
+
+Content is written to a file named after its SHA-256 hash and the harvest object only stores a reference to that
+file. Identical content of different harvest objects and harvest jobs is therefore stored once.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Set, Union
+
+log = logging.getLogger(__name__)
+
+HEADER_PREFIX = "#fdp-blob: "
+HASH_ALGORITHM = "sha256"
+ENCODING = "utf-8"
+
+
+class BlobStoreException(Exception):
+    pass
+
+
+def is_blob_reference(content: str) -> bool:
+    return content.startswith(HEADER_PREFIX)
+
+
+def digest_from_reference(reference: str) -> str:
+    if not is_blob_reference(reference):
+        raise BlobStoreException(f"Not a blob reference: [{reference[:100]}]")
+
+    algorithm, _, digest = reference[len(HEADER_PREFIX):].strip().partition(":")
+    if algorithm != HASH_ALGORITHM or len(digest) != hashlib.sha256().digest_size * 2:
+        raise BlobStoreException(f"Malformed blob reference: [{reference}]")
+    return digest
+
+
+class ContentBlobStore:
+    """
+    Stores harvest object content in a directory. Content shorter than min_size characters is not offloaded and
+    kept in the harvest object itself.
+    """
+
+    def __init__(self, directory: Union[str, Path], min_size: int = 0):
+        self.directory = Path(directory)
+        self.min_size = min_size
+
+    def offload(self, content: str) -> str:
+        """Returns the content to store in the harvest object: either the content itself or a blob reference"""
+        if len(content) < self.min_size:
+            return content
+        return self.put(content)
+
+    def resolve(self, content: str) -> str:
+        """Returns the original content of content stored in a harvest object"""
+        if not is_blob_reference(content):
+            return content
+        return self.get(content)
+
+    def put(self, content: str) -> str:
+        data = content.encode(ENCODING)
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+
+        if path.exists():
+            # Refresh the modification time, so pruning considers the blob to be in use
+            os.utime(path)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first, so concurrent readers never see a partially written blob
+            temporary_file = tempfile.NamedTemporaryFile(dir=path.parent, delete=False)
+            try:
+                with temporary_file:
+                    temporary_file.write(data)
+                os.replace(temporary_file.name, path)
+            except BaseException:
+                # A failed write or rename, on a full disk for instance, would leave the temporary file behind
+                os.unlink(temporary_file.name)
+                raise
+
+        return f"{HEADER_PREFIX}{HASH_ALGORITHM}:{digest}"
+
+    def get(self, reference: str) -> str:
+        digest = digest_from_reference(reference)
+        try:
+            data = self.path(digest).read_bytes()
+        except OSError as e:
+            raise BlobStoreException(f"Blob {digest} could not be read: {e}") from e
+
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise BlobStoreException(f"Blob {digest} is corrupt")
+        return data.decode(ENCODING)
+
+    def path(self, digest: str) -> Path:
+        return Path(self.directory, digest[:2], digest[2:4], digest)
+
+    def digests(self) -> Iterator[str]:
+        for path in self.directory.glob("*/*/*"):
+            if path.is_file() and len(path.name) == hashlib.sha256().digest_size * 2:
+                yield path.name
+
+    def prune(self, referenced_digests: Iterable[str], min_age: int = 0) -> int:
+        """
+        Removes blobs which are not referenced anymore. Blobs modified less than min_age seconds ago are kept, since
+        they may belong to harvest objects which have not been committed yet.
+        """
+        referenced: Set[str] = set(referenced_digests)
+        threshold = time.time() - min_age
+        removed = 0
+
+        for digest in list(self.digests()):
+            if digest in referenced:
+                continue
+            path = self.path(digest)
+            try:
+                if path.stat().st_mtime <= threshold:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        log.info("Removed %s unreferenced blobs from %s", removed, self.directory)
+        return removed
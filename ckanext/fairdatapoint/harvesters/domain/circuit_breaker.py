@@ -0,0 +1,103 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Per host circuit breakers for outgoing HTTP requests.
+
+When a host is down, every request to it waits for the request timeout, and a crawl of a few thousand records takes
+hours before it fails. After a number of consecutive failures the circuit of the host opens and requests fail
+straight away. After a cool down a single trial request is let through: the circuit closes again if it succeeds and
+stays open for another cool down if it fails.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict
+from urllib.parse import urlparse
+
+log = logging.getLogger(__name__)
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 60  # seconds
+
+
+class CircuitOpenException(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Circuit breaker of a single host"""
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def before_request(self):
+        """Raises CircuitOpenException if requests to the host should fail fast"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if self._trial_in_progress or self._clock() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenException("Circuit is open after {} failures".format(self._failures))
+            # Half open: let a single request find out whether the host is back
+            self._trial_in_progress = True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                log.info("Circuit closed, host is available again")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def cancel(self):
+        """Ends a request which tells nothing about the availability of the host, like an invalid URL"""
+        with self._lock:
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_progress or (
+                self._opened_at is None and self._failures >= self.failure_threshold
+            ):
+                if self._opened_at is None:
+                    log.warning("Circuit opened after %s consecutive failures", self._failures)
+                self._opened_at = self._clock()
+            self._trial_in_progress = False
+
+
+class CircuitBreakers:
+    """Circuit breakers by host, shared by every component of a process making requests to the same hosts"""
+
+    def __init__(self, **breaker_settings):
+        self._settings = breaker_settings
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, url) -> CircuitBreaker:
+        host = urlparse(str(url)).netloc.lower()
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(**self._settings)
+            return breaker
+
+
+circuit_breakers = CircuitBreakers()
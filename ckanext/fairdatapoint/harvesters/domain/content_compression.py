@@ -0,0 +1,87 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Compression of harvest object content.
+
+``HarvestObject.content`` is a text column, so compressed content is stored base64 encoded behind a header line
+naming the compression. Content without the header is returned as is, which keeps uncompressed objects readable.
+zstd compression requires the optional ``zstandard`` package.
+"""
+
+import base64
+import binascii
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_NONE = "none"
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSIONS = (COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_ZSTD)
+DEFAULT_COMPRESSION = COMPRESSION_NONE
+
+HEADER_PREFIX = "#fdp-compressed: "
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 10
+
+DECOMPRESSION_ERRORS = (binascii.Error, zlib.error) + ((zstandard.ZstdError,) if zstandard else ())
+
+
+class ContentCompressionException(Exception):
+    pass
+
+
+def validate_compression(compression: str) -> str:
+    if compression not in COMPRESSIONS:
+        raise ContentCompressionException(
+            f"Unknown content compression [{compression}], expected one of {list(COMPRESSIONS)}"
+        )
+    if compression == COMPRESSION_ZSTD and zstandard is None:
+        raise ContentCompressionException(
+            "Content compression [zstd] requires the zstandard package to be installed"
+        )
+    return compression
+
+
+def is_compressed(content: str) -> bool:
+    return content.startswith(HEADER_PREFIX)
+
+
+def compress_content(content: str, compression: str = DEFAULT_COMPRESSION) -> str:
+    """Compresses harvest object content, content is returned unchanged if compression is 'none'"""
+    validate_compression(compression)
+    if compression == COMPRESSION_NONE:
+        return content
+
+    data = content.encode("utf-8")
+    if compression == COMPRESSION_ZLIB:
+        compressed = zlib.compress(data, ZLIB_LEVEL)
+    else:
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+    return f"{HEADER_PREFIX}{compression}\n" + base64.b64encode(compressed).decode("ascii")
+
+
+def decompress_content(content: str) -> str:
+    """Returns the original content of (possibly) compressed harvest object content"""
+    if not is_compressed(content):
+        return content
+
+    header, _, payload = content.partition("\n")
+    compression = validate_compression(header[len(HEADER_PREFIX):].strip())
+
+    try:
+        data = base64.b64decode(payload, validate=True)
+        if compression == COMPRESSION_ZLIB:
+            data = zlib.decompress(data)
+        elif compression == COMPRESSION_ZSTD:
+            data = zstandard.ZstdDecompressor().decompress(data)
+    except DECOMPRESSION_ERRORS as e:
+        raise ContentCompressionException(f"Content could not be decompressed: {e}") from e
+
+    return data.decode("utf-8")
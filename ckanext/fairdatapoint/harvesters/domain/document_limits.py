@@ -0,0 +1,113 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Limits on the size of documents fetched from a FAIR data point.
+
+A misconfigured FDP can serve a dump of hundreds of megabytes on a record URL, which would exhaust the memory of the
+worker parsing it. Documents are limited in the number of bytes read, after decompression, and the number of triples
+parsed. Both limits are enforced while the document is streamed into the parser, so an oversized document is aborted
+as soon as it passes a limit instead of after it is loaded.
+"""
+
+import io
+from typing import IO, Optional
+
+from rdflib import Graph
+from rdflib.plugins.stores.memory import Memory
+
+DEFAULT_MAX_BODY_SIZE = 100 * 1024 * 1024  # bytes
+DEFAULT_MAX_TRIPLES = 1000000
+
+
+class DocumentTooLargeException(Exception):
+    pass
+
+
+def check_content_length(content_length: Optional[str], max_body_size: int, url) -> None:
+    """Raises DocumentTooLargeException when the declared Content-Length already exceeds the maximum body size"""
+    if not max_body_size or not content_length:
+        return
+    try:
+        length = int(content_length)
+    except (TypeError, ValueError):
+        return
+    if length > max_body_size:
+        raise DocumentTooLargeException(
+            f"Document {url} of {length} bytes exceeds the maximum body size of {max_body_size} bytes"
+        )
+
+
+class _LimitedRawStream(io.RawIOBase):
+    def __init__(self, stream: IO[bytes], max_body_size: int, url):
+        self._stream = stream
+        self._max_body_size = max_body_size
+        self._url = url
+        self._size = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        # Read one byte more than allowed, to tell a document of exactly the maximum size from a larger one
+        allowed = self._max_body_size + 1 - self._size
+        view = memoryview(buffer)[:max(0, min(len(buffer), allowed))]
+        if not len(view):
+            count = 0
+        else:
+            data = self._stream.read(len(view))
+            count = len(data)
+            view[:count] = data
+        self._size += count
+        if self._size > self._max_body_size:
+            raise DocumentTooLargeException(
+                f"Document {self._url} exceeds the maximum body size of {self._max_body_size} bytes"
+            )
+        return count
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            super().close()
+
+
+def limit_stream(stream: IO[bytes], max_body_size: int, url) -> IO[bytes]:
+    """Wraps a stream to raise DocumentTooLargeException once more than max_body_size bytes are read from it"""
+    if not max_body_size:
+        return stream
+    return io.BufferedReader(_LimitedRawStream(stream, max_body_size, url))
+
+
+class _LimitedMemory(Memory):
+    # Triples are counted by the store, since some parsers add them through graphs of their own on the same store
+    def __init__(self, max_triples: int, url):
+        super().__init__()
+        self.max_triples = max_triples
+        self._url = url
+        self._added = 0
+
+    def add(self, triple, context, quoted=False):
+        if self.max_triples:
+            self._added += 1
+            if self._added > self.max_triples:
+                raise DocumentTooLargeException(
+                    f"Document {self._url} exceeds the maximum of {self.max_triples} triples"
+                )
+        super().add(triple, context, quoted)
+
+
+def limited_graph(max_triples: int, url) -> Graph:
+    """
+    Graph to parse a document into, raising DocumentTooLargeException when more than max_triples triples are added
+    to it. Call release_limit once the document is parsed, so the graph can be extended.
+    """
+    if not max_triples:
+        return Graph()
+    return Graph(store=_LimitedMemory(max_triples, url))
+
+
+def release_limit(graph: Graph) -> None:
+    if isinstance(graph.store, _LimitedMemory):
+        graph.store.max_triples = 0
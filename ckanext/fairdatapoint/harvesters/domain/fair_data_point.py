@@ -3,24 +3,96 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-only
 
-import encodings
 import logging
-from typing import Union
+import random
+import time
+from typing import IO, Callable, NamedTuple, Optional, Tuple, Union
 
-import requests
 from rdflib import Graph, URIRef
-from rdflib.exceptions import ParserError
 from requests.exceptions import ConnectionError, HTTPError, RequestException, Timeout
+from requests.utils import DEFAULT_ACCEPT_ENCODING
+
+from ckanext.fairdatapoint.harvesters.domain.circuit_breaker import (
+    CircuitOpenException,
+    circuit_breakers,
+)
+from ckanext.fairdatapoint.harvesters.domain.document_limits import (
+    DEFAULT_MAX_BODY_SIZE,
+    DEFAULT_MAX_TRIPLES,
+    DocumentTooLargeException,
+    check_content_length,
+    limit_stream,
+    limited_graph,
+    release_limit,
+)
+from ckanext.fairdatapoint.harvesters.domain import transport
+from ckanext.fairdatapoint.harvesters.domain.host_limiter import host_limiters
+from ckanext.fairdatapoint.harvesters.domain.rdf_formats import (
+    DEFAULT_RDF_FORMAT,
+    host_formats,
+    rdf_format_from_content_type,
+)
+from ckanext.fairdatapoint.harvesters.domain.single_flight import SingleFlight
+from ckanext.fairdatapoint.harvesters.domain.time_budget import (
+    TimeBudgetExceededException,
+    limit_timeout,
+    remaining_time,
+    time_budget_exceeded,
+)
 
 log = logging.getLogger(__name__)
-REQUEST_TIMEOUT = 100 # seconds
+CONNECT_TIMEOUT = 10  # seconds
+REQUEST_TIMEOUT = 100 # seconds, maximum time between bytes of the response
+REQUEST_RETRIES = 3
+RETRY_BACKOFF = 1  # seconds, doubled for every retry
+RETRY_BACKOFF_MAX = 30  # seconds
+# Responses which may be different when the same request is made again
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+# gzip and deflate, and br when the optional brotli package is installed
+ACCEPT_ENCODING = DEFAULT_ACCEPT_ENCODING
+
+# Concurrent requests for the same URL and settings, also of different FairDataPoint instances, share one request
+# and parse
+_graph_requests = SingleFlight()
+
+class DocumentUnavailableException(Exception):
+    """The document could not be requested, so what it refers to is unknown"""
+    pass
+
+
+class FdpDocument(NamedTuple):
+    # Decompressed body of the response, read while it is parsed
+    stream: IO[bytes]
+    content_type: Optional[str] = None
+    # Ends the request at the host limiter once the stream is read or closed
+    release: Optional[Callable[[], None]] = None
+
 
 class FairDataPoint:
     """Class to connect and get data from FDP"""
 
-    def __init__(self, fdp_end_point: str, request_timeout: int = REQUEST_TIMEOUT):
+    def __init__(
+        self,
+        fdp_end_point: str,
+        request_timeout: int = REQUEST_TIMEOUT,
+        request_retries: int = REQUEST_RETRIES,
+        connect_timeout: int = CONNECT_TIMEOUT,
+        max_body_size: int = DEFAULT_MAX_BODY_SIZE,
+        max_triples: int = DEFAULT_MAX_TRIPLES,
+    ):
         self.fdp_end_point = fdp_end_point
         self.request_timeout = request_timeout
+        self.request_retries = max(0, request_retries)
+        self.connect_timeout = connect_timeout
+        # Maximum number of bytes and triples of a single document, 0 is unlimited
+        self.max_body_size = max(0, max_body_size)
+        self.max_triples = max(0, max_triples)
+
+    @property
+    def timeout(self) -> Tuple[int, int]:
+        """Connect and read timeout of requests"""
+        return self.connect_timeout, self.request_timeout
 
     def get_graph(self, path: Union[str, URIRef]) -> Graph:
         """
@@ -28,28 +100,136 @@ class FairDataPoint:
         function fails because of a certificate error. The library it uses probably has no certificates which would
         have to be added to a trust store. But this is inconvenient in case of a new harvester which refers to an
         endpoint whose certificate is not in the trust store yet.
+
+        Concurrent calls for the same path share a single request, when they are made with the same document
+        limits, timeouts and retries. Callers change the graphs they get, so every caller of a shared request gets
+        its own copy.
+
+        An absent document, answered with an error status such as 404 which is not retried, gives an empty graph.
+        Raises DocumentTooLargeException when the document exceeds the maximum body size or number of triples, and
+        DocumentUnavailableException when it could not be requested.
         """
-        graph = Graph()
-        data = self._get_data(path)
-        if data is None:
+        graph, shared = _graph_requests.do(self._request_key(path), self._load_graph, path)
+        if shared:
+            copy = Graph()
+            copy += graph
+            return copy
+        return graph
+
+    def _request_key(self, path: Union[str, URIRef]) -> Tuple:
+        # A caller with lower limits must not get a graph requested under higher ones
+        return str(path), self.max_body_size, self.max_triples, self.timeout, self.request_retries
+
+    def _load_graph(self, path: Union[str, URIRef]) -> Graph:
+        document = self._get_data(path)
+        if document is None:
             log.warning(
                 f"No data was received from FDP {self.fdp_end_point} request {path}"
             )
-        else:
-            try:
-                graph.parse(data=data)
-            except ParserError as e:
-                log.error(f"Record {data} could not be parsed: {e}")
-        return graph
-
-    def _get_data(self, path: Union[str, URIRef]) -> Union[str, None]:
-        headers = {"Accept": "text/turtle"}
+            return Graph()
+        rdf_format = rdf_format_from_content_type(document.content_type)
+        if rdf_format is None:
+            log.debug(f"FDP query {path} returned {document.content_type}, parsing as {DEFAULT_RDF_FORMAT}")
+        graph = limited_graph(self.max_triples, path)
         try:
-            response = requests.request(
-                "GET", path, headers=headers, timeout=self.request_timeout
+            # The body is decompressed as it is read. The N-Triples and RDF/XML parsers parse it as it is read as
+            # well, the Turtle and JSON-LD parsers read the whole decompressed body first
+            graph.parse(
+                source=limit_stream(document.stream, self.max_body_size, path), format=rdf_format or DEFAULT_RDF_FORMAT
             )
-            response.encoding = encodings.utf_8.getregentry().name
-            response.raise_for_status()
-            return response.text
-        except (HTTPError, ConnectionError, Timeout, RequestException) as e:
-            log.error(f"FDP query {path} was not successful: {e}")
+            release_limit(graph)
+            if rdf_format is not None:
+                host_formats.record(path, rdf_format)
+        except DocumentTooLargeException as e:
+            log.error(f"Record {path} was aborted: {e}")
+            raise
+        except Exception as e:
+            # Parsers raise all kinds of errors on malformed or truncated documents
+            log.error(f"Record {path} could not be parsed: {e!r}")
+            # Do not return part of a document
+            graph = Graph()
+        finally:
+            document.stream.close()
+            if document.release is not None:
+                document.release()
+        return graph
+
+    @staticmethod
+    def _retry_delay(retry: int) -> float:
+        # Exponential backoff with jitter, so requests failing together are not retried together
+        delay = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** retry)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def _get_data(self, path: Union[str, URIRef]) -> Optional[FdpDocument]:
+        """
+        GETs the document at path. The body is not read yet, the caller reads and closes the returned stream and
+        then calls its release function, until then the request counts against the concurrency limit of the host.
+        Connection errors, timeouts and responses with a status in RETRY_STATUS_CODES are retried with backoff.
+        Requests to a host whose circuit is open fail without being sent. Returns None when the host answers with
+        another error status, such as 404 or 410, since the document is absent. Raises DocumentUnavailableException
+        when the retries run out, the circuit is open or the request fails in another way,
+        TimeBudgetExceededException when the current time budget runs out, and DocumentTooLargeException when the
+        declared length of the response exceeds the maximum body size.
+        """
+        headers = {"Accept": host_formats.accept_header(path), "Accept-Encoding": ACCEPT_ENCODING}
+        circuit_breaker = circuit_breakers.get(path)
+        for retry in range(self.request_retries + 1):
+            if retry:
+                delay = self._retry_delay(retry - 1)
+                remaining = remaining_time()
+                if remaining is not None and remaining <= delay:
+                    raise TimeBudgetExceededException(f"Time budget exceeded retrying FDP query {path}: {error}")
+                log.warning(f"Retrying FDP query {path} in {delay:.1f} seconds after: {error}")
+                time.sleep(delay)
+            try:
+                timeout = limit_timeout(self.timeout)
+                circuit_breaker.before_request()
+                response, release = host_limiters.get(path).call_streamed(
+                    transport.request, "GET", path, headers=headers, timeout=timeout, stream=True
+                )
+            except CircuitOpenException as e:
+                log.error(f"FDP query {path} was not sent: {e}")
+                raise DocumentUnavailableException(f"FDP query {path} was not sent: {e}") from e
+            except (ConnectionError, Timeout) as e:
+                if time_budget_exceeded():
+                    # The timeout was shortened to the time budget, which says nothing about the host
+                    circuit_breaker.cancel()
+                    raise TimeBudgetExceededException(f"Time budget exceeded by FDP query {path}: {e}")
+                circuit_breaker.record_failure()
+                error = e
+                continue
+            except RequestException as e:
+                circuit_breaker.cancel()
+                log.error(f"FDP query {path} was not successful: {e}")
+                raise DocumentUnavailableException(f"FDP query {path} was not successful: {e}") from e
+
+            if response.status_code in RETRY_STATUS_CODES:
+                circuit_breaker.record_failure()
+            else:
+                circuit_breaker.record_success()
+            try:
+                response.raise_for_status()
+            except HTTPError as e:
+                response.close()
+                release()
+                if response.status_code not in RETRY_STATUS_CODES:
+                    # The host answered, so the document is absent, like a dataset which was removed while a
+                    # catalog still contains it, and what it refers to is not harvested
+                    log.warning(f"FDP query {path} was not successful, the document is absent: {e}")
+                    return None
+                error = e
+                continue
+            try:
+                check_content_length(response.headers.get("Content-Length"), self.max_body_size, path)
+            except DocumentTooLargeException:
+                response.close()
+                release()
+                raise
+            # Let urllib3 undo the Content-Encoding while the stream is read
+            response.raw.decode_content = True
+            return FdpDocument(response.raw, response.headers.get("Content-Type"), release)
+
+        log.error(f"FDP query {path} was not successful after {self.request_retries} retries: {error}")
+        raise DocumentUnavailableException(
+            f"FDP query {path} was not successful after {self.request_retries} retries: {error}"
+        ) from error
@@ -6,26 +6,53 @@
 
 import logging
 import re
-from typing import Dict, Iterable, Union
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
 from collections import deque
 
-import requests
 from rdflib import DCAT, DCTERMS, RDF, BNode, Graph, Literal, Namespace, URIRef
 from rdflib.term import Node
 from requests import HTTPError, JSONDecodeError
 
-from ckanext.fairdatapoint.harvesters.domain.fair_data_point import FairDataPoint
+from ckanext.fairdatapoint.harvesters.domain import transport
+from ckanext.fairdatapoint.harvesters.domain.document_limits import (
+    DEFAULT_MAX_BODY_SIZE,
+    DEFAULT_MAX_TRIPLES,
+    DocumentTooLargeException,
+)
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point import (
+    CONNECT_TIMEOUT,
+    REQUEST_RETRIES,
+    DocumentUnavailableException,
+    FairDataPoint,
+)
+from ckanext.fairdatapoint.harvesters.domain.fdp_record import FdpRecord
 from ckanext.fairdatapoint.harvesters.domain.graph_to_fdp_record_mapper import (
     GraphToFdpRecordMapper,
 )
+from ckanext.fairdatapoint.harvesters.domain.host_limiter import host_limiters
 from ckanext.fairdatapoint.harvesters.domain.identifier import Identifier
+from ckanext.fairdatapoint.harvesters.domain.record_content import (
+    DEFAULT_CONTENT_FORMAT,
+    serialize_graph,
+    validate_content_format,
+)
+from ckanext.fairdatapoint.harvesters.domain.time_budget import (
+    TimeBudgetExceededException,
+    limit_timeout,
+    run_in_context,
+    time_budget,
+)
 
 LDP = Namespace("http://www.w3.org/ns/ldp#")
 VCARD = Namespace("http://www.w3.org/2006/vcard/ns#")
 REQUEST_TIMEOUT = 100 # seconds
+FETCH_CONCURRENCY = 8
 
 log = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 class FairDataPointRecordProvider:
 
@@ -34,12 +61,31 @@ class FairDataPointRecordProvider:
         fdp_end_point: str,
         harvest_catalogs: bool = False,
         request_timeout: int = REQUEST_TIMEOUT,
+        content_format: str = DEFAULT_CONTENT_FORMAT,
+        fetch_concurrency: int = FETCH_CONCURRENCY,
+        request_retries: int = REQUEST_RETRIES,
+        connect_timeout: int = CONNECT_TIMEOUT,
+        record_time_budget: Optional[float] = None,
+        max_body_size: int = DEFAULT_MAX_BODY_SIZE,
+        max_triples: int = DEFAULT_MAX_TRIPLES,
     ):
         self.fair_data_point = FairDataPoint(
-            fdp_end_point, request_timeout=request_timeout
+            fdp_end_point,
+            request_timeout=request_timeout,
+            request_retries=request_retries,
+            connect_timeout=connect_timeout,
+            max_body_size=max_body_size,
+            max_triples=max_triples,
         )
         self.harvest_catalogs = harvest_catalogs
         self.request_timeout = request_timeout
+        # Seconds all requests completing a single record may take together, None is unlimited
+        self.record_time_budget = record_time_budget
+        self.content_format = validate_content_format(content_format)
+        self.fetch_concurrency = max(1, fetch_concurrency)
+        # Documents the last crawl skipped because they were too large or could not be requested, the crawl is
+        # incomplete when there are any
+        self.crawl_errors: List[Tuple[str, Exception]] = []
 
     def get_record_ids(self) -> Dict.keys:
         log.debug(
@@ -51,24 +97,109 @@ class FairDataPointRecordProvider:
         for fdp_record in self._breath_first_search_records(
             self.fair_data_point.fdp_end_point
         ):
-            if self.harvest_catalogs and fdp_record.is_catalog():
-                identifier = Identifier("")
-                identifier.add("catalog", str(fdp_record.url))
-                result[identifier.guid] = fdp_record.url
-            elif fdp_record.is_dataset():
-                identifier = Identifier("")
-                identifier.add("dataset", str(fdp_record.url))
-                result[identifier.guid] = fdp_record.url
-            elif fdp_record.is_dataseries():
-                identifier = Identifier("")
-                identifier.add("dataseries", str(fdp_record.url))
-                result[identifier.guid] = fdp_record.url
+            guid = self._get_guid(fdp_record)
+            if guid is not None:
+                result[guid] = fdp_record.url
         return result.keys()
 
+    def get_records(self) -> Iterator[Tuple[str, Union[Tuple[str, Graph], Exception]]]:
+        """
+        Crawls the FDP and yields (guid, (record, graph)) for every record, or (guid, exception) when the record
+        could not be completed. The graph fetched by the crawl is used for the record itself, so this takes one
+        request less per record than get_record_ids followed by get_record_by_id.
+        """
+        log.debug(
+            "FAIR Data Point get_records with content from {}".format(
+                self.fair_data_point.fdp_end_point
+            )
+        )
+        for _, (guid, fetched) in self._crawl(self.fair_data_point.fdp_end_point, self._visit_record):
+            if guid is not None:
+                yield guid, fetched
+
+    def _get_guid(self, fdp_record: FdpRecord) -> Optional[str]:
+        if self.harvest_catalogs and fdp_record.is_catalog():
+            id_type = "catalog"
+        elif fdp_record.is_dataset():
+            id_type = "dataset"
+        elif fdp_record.is_dataseries():
+            id_type = "dataseries"
+        else:
+            return None
+        identifier = Identifier("")
+        identifier.add(id_type, str(fdp_record.url))
+        return identifier.guid
+
+    def _visit_record(self, url: str):
+        graph = self.fair_data_point.get_graph(url)
+        fdp_record = GraphToFdpRecordMapper(url).map(graph)
+        guid = self._get_guid(fdp_record)
+        if guid is None:
+            return fdp_record, (None, None)
+        try:
+            # Mapping is done, so the graph can be completed into the record
+            with time_budget(self.record_time_budget):
+                g = self._complete_record_graph(graph, url)
+            return fdp_record, (guid, (serialize_graph(g, self.content_format), g))
+        except Exception as e:
+            log.error("Error getting record [%s]: [%r]", guid, e)
+            return fdp_record, (guid, e)
+
     def get_record_by_id(self, guid: str) -> str:
         """
         Get additional information for FDP record.
         """
+        return serialize_graph(self.get_record_graph_by_id(guid), self.content_format)
+
+    def get_record_with_graph_by_id(self, guid: str) -> Tuple[str, Graph]:
+        """
+        Get the FDP record together with the graph it was serialized from.
+        """
+        g = self.get_record_graph_by_id(guid)
+        return serialize_graph(g, self.content_format), g
+
+    def get_records_by_ids(
+        self, guids: Iterable[str]
+    ) -> Iterator[Tuple[str, Union[str, Exception]]]:
+        """
+        Get many FDP records concurrently. Yields (guid, record) pairs in order of completion, or (guid, exception)
+        when getting a record failed.
+        """
+        return self._get_concurrently(self.get_record_by_id, guids)
+
+    def get_records_with_graphs_by_ids(
+        self, guids: Iterable[str]
+    ) -> Iterator[Tuple[str, Union[Tuple[str, Graph], Exception]]]:
+        """
+        Like get_records_by_ids, yielding each record together with the graph it was serialized from.
+        """
+        return self._get_concurrently(self.get_record_with_graph_by_id, guids)
+
+    def _get_concurrently(
+        self, get_function: Callable, guids: Iterable[str]
+    ) -> Iterator[Tuple[str, Union[object, Exception]]]:
+        with ThreadPoolExecutor(max_workers=self.fetch_concurrency) as executor:
+            pending: Dict[Future, str] = {}
+            for guid in guids:
+                pending[executor.submit(run_in_context(get_function), guid)] = guid
+                # Keep the number of records waiting to be consumed bounded
+                if len(pending) >= self.fetch_concurrency * 2:
+                    yield from self._collect(pending)
+            while pending:
+                yield from self._collect(pending)
+
+    @staticmethod
+    def _collect(pending: Dict[Future, str]) -> Iterator[Tuple[str, Union[object, Exception]]]:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            guid = pending.pop(future)
+            try:
+                yield guid, future.result()
+            except Exception as e:
+                log.error("Error getting record [%s]: [%r]", guid, e)
+                yield guid, e
+
+    def get_record_graph_by_id(self, guid: str) -> Graph:
         log.debug(
             "FAIR data point get_record_by_id from {} for {}".format(
                 self.fair_data_point.fdp_end_point, guid
@@ -79,8 +210,15 @@ class FairDataPointRecordProvider:
 
         subject_url = identifier.get_id_value()
 
-        g = self.fair_data_point.get_graph(subject_url)
+        with time_budget(self.record_time_budget):
+            g = self.fair_data_point.get_graph(subject_url)
+
+            return self._complete_record_graph(g, subject_url)
 
+    def _complete_record_graph(self, g: Graph, subject_url: str) -> Graph:
+        """
+        Completes the graph of a record with its distributions and contact information
+        """
         subject_uri = URIRef(subject_url)
 
         self._remove_fdp_defaults(g, subject_uri)
@@ -112,9 +250,7 @@ class FairDataPointRecordProvider:
                     g=g, subject_uri=subject_uri, contact_point_uri=contact_point_uri
                 )
 
-        result = g.serialize(format="ttl")
-
-        return result
+        return g
 
     def _parse_contact_point(
         self, g: Graph, subject_uri: URIRef, contact_point_uri: URIRef
@@ -129,16 +265,21 @@ class FairDataPointRecordProvider:
             g.add((subject_uri, DCAT.contactPoint, vcard_node))
             g.add((vcard_node, RDF.type, VCARD.Kind))
             g.add((vcard_node, VCARD.hasUID, contact_point_uri))
-            try:
-                orcid_response = requests.get(
-                    str(contact_point_uri).rstrip("/") + "/public-record.json",
-                    timeout=self.request_timeout,
-                )
-                json_orcid_response = orcid_response.json()
-                name = json_orcid_response["displayName"]
+            name = self._get_orcid_name(contact_point_uri)
+            if name is not None:
                 g.add((vcard_node, VCARD.fn, Literal(name)))
-            except (JSONDecodeError, HTTPError) as e:
-                log.error(f"Failed to get data from ORCID for {contact_point_uri}: {e}")
+
+    def _get_orcid_name(self, contact_point_uri: URIRef) -> Optional[str]:
+        try:
+            orcid_url = str(contact_point_uri).rstrip("/") + "/public-record.json"
+            orcid_response = host_limiters.get(orcid_url).call(
+                transport.get, orcid_url, timeout=limit_timeout(self.fair_data_point.timeout)
+            )
+            json_orcid_response = orcid_response.json()
+            return json_orcid_response["displayName"]
+        except (JSONDecodeError, HTTPError) as e:
+            log.error(f"Failed to get data from ORCID for {contact_point_uri}: {e}")
+            return None
 
     @staticmethod
     def get_values(
@@ -158,17 +299,50 @@ class FairDataPointRecordProvider:
         return mapper.map(graph)
 
     def _breath_first_search_records(self, start_url: str):
-        queue = deque([start_url])
-        visited = set()
-        while queue:
-            url = queue.popleft()
-            if url in visited:
-                continue
-            visited.add(url)
-            record = self._map_record(url)
-            if record:
-                yield record
-                queue.extend(record.children())
+        for record, _ in self._crawl(start_url, lambda url: (self._map_record(url), None)):
+            yield record
+
+    def _crawl(
+        self, start_url: str, visit: Callable[[str], Tuple[FdpRecord, T]]
+    ) -> Iterator[Tuple[FdpRecord, T]]:
+        """
+        Breadth first search visiting the URLs of a level concurrently. Results are yielded in the same order as a
+        sequential breadth first search would yield them. When the current time budget runs out, the search stops
+        after yielding the records visited so far. Documents which are too large or could not be requested, also
+        when the circuit of their host is open, are skipped together with the records below them, and added to
+        crawl_errors.
+        """
+        visited = {start_url}
+        level = [start_url]
+        chunk_size = self.fetch_concurrency * 4
+        self.crawl_errors = []
+
+        def visit_document(url: str):
+            try:
+                return visit(url)
+            except (DocumentTooLargeException, DocumentUnavailableException) as e:
+                self.crawl_errors.append((url, e))
+                return None, None
+
+        visit_in_context = run_in_context(visit_document)
+        with ThreadPoolExecutor(max_workers=self.fetch_concurrency) as executor:
+            while level:
+                next_level = []
+                # Visit a level in chunks, to bound the number of results held in memory
+                for start in range(0, len(level), chunk_size):
+                    try:
+                        for record, payload in executor.map(visit_in_context, level[start:start + chunk_size]):
+                            if not record:
+                                continue
+                            yield record, payload
+                            for child in record.children():
+                                if child not in visited:
+                                    visited.add(child)
+                                    next_level.append(child)
+                    except TimeBudgetExceededException as e:
+                        log.warning("Stopped crawling %s: %s", start_url, e)
+                        return
+                level = next_level
 
     @staticmethod
     def _copy_blank_node_recursively(
@@ -6,8 +6,17 @@
 import logging
 from typing import Any, Dict, Optional
 
+from rdflib import Graph
+
 from ckanext.dcat.processors import RDFParserException
 from ckanext.fairdatapoint.harvesters.domain.identifier import Identifier
+from ckanext.fairdatapoint.harvesters.domain.record_content import (
+    CONTENT_FORMAT_COMPACT,
+    RDFLIB_FORMATS,
+    RecordContentException,
+    decode_compact,
+    detect_content_format,
+)
 from ckanext.fairdatapoint.processors import FairDataPointRDFParser
 
 log = logging.getLogger(__name__)
@@ -16,14 +25,41 @@ log = logging.getLogger(__name__)
 class FairDataPointRecordToPackageConverter:
     def __init__(self, profile: str):
         self.profile = profile
+        self._parser = None
+
+    def __getstate__(self):
+        # The parser holds the graph of the last record, a copy of the converter creates its own parser
+        state = self.__dict__.copy()
+        state["_parser"] = None
+        return state
+
+    def get_parser(self, graph: Optional[Graph] = None) -> FairDataPointRDFParser:
+        """Returns the parser of this converter, with the given graph or an empty graph"""
+        if self._parser is None:
+            self._parser = FairDataPointRDFParser(profiles=[self.profile])
+            if graph is not None:
+                self._parser.reset(graph)
+        else:
+            self._parser.reset(graph)
+        return self._parser
 
     def record_to_package(
-        self, guid: str, record: str, series_mapping=None
+        self, guid: str, record: Optional[str], series_mapping=None, graph: Optional[Graph] = None
     ) -> Optional[Dict[str, Any]]:
-        parser = FairDataPointRDFParser(profiles=[self.profile])
+        """
+        Converts a record to a package dictionary. When the graph of the record is passed, the record is not parsed
+        again and may be None.
+        """
+        parser = self.get_parser(graph)
 
         try:
-            parser.parse(record, _format="ttl")
+            if graph is None:
+                # Content is stored as Turtle by default, but can be N-Triples or the compact encoding as well
+                content_format = detect_content_format(record)
+                if content_format == CONTENT_FORMAT_COMPACT:
+                    decode_compact(record, parser.g)
+                else:
+                    parser.parse(record, _format=RDFLIB_FORMATS[content_format])
 
             identifier = Identifier(guid)
             datatype = identifier.get_id_type()
@@ -39,5 +75,5 @@ class FairDataPointRecordToPackageConverter:
                 return None  # Returning None instead of False for clarity
 
             return items[0]  # Assuming single item per record
-        except RDFParserException as e:
+        except (RDFParserException, RecordContentException) as e:
             raise Exception(f"Error parsing the RDF content [{record}]: {e}") from e
@@ -3,14 +3,23 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-only
 
-from rdflib import DCAT, RDF, URIRef
+from typing import Iterable
+
+from rdflib import DCAT
 
 
 class FdpRecord:
-    def __init__(self, url, graph):
+    """
+    Compact result of classifying an FDP document. Only the RDF types of the record and the URLs of its
+    children are kept, so the parsed graph can be released as soon as the record has been mapped.
+    """
+
+    __slots__ = ("url", "_types", "_children")
+
+    def __init__(self, url, types: Iterable = (), children: Iterable[str] = ()):
         self.url = url
-        self._children = set()
-        self._graph = graph
+        self._types = frozenset(types)
+        self._children = set(children)
 
     def children(self):
         return self._children
@@ -18,11 +27,14 @@ class FdpRecord:
     def add_children(self, child_url):
         self._children.add(child_url)
 
+    def types(self):
+        return self._types
+
     def is_catalog(self):
-        return (URIRef(self.url), RDF.type, DCAT.Catalog) in self._graph
+        return DCAT.Catalog in self._types
 
     def is_dataset(self):
-        return (URIRef(self.url), RDF.type, DCAT.Dataset) in self._graph
+        return DCAT.Dataset in self._types
 
     def is_dataseries(self):
-        return (URIRef(self.url), RDF.type, DCAT.DatasetSeries) in self._graph
+        return DCAT.DatasetSeries in self._types
@@ -0,0 +1,215 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Record provider reading a local RDF dump instead of crawling a FAIR data point.
+
+A source is a single dump file, typically N-Quads or TriG, or a directory of RDF files, optionally gzip compressed.
+Named graphs whose name is the URL of a document are served as that document, like an FDP serves the document at
+that URL. A file of triples is served as the document of the typed resources it describes, so a directory with a
+file per FDP document works as well. The documents of other URLs are the concise bounded description of the URL in
+the union of all data.
+Records are the catalogs, datasets and dataseries in the data, and get the same GUIDs as the records of
+FairDataPointRecordProvider, so a portal bootstrapped from a snapshot can be harvested from the live FDP afterwards.
+No requests are made, so the gather, fetch and import stages run at the speed of the disk.
+"""
+
+import gzip
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple, Union
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+from rdflib import DCAT, RDF, Dataset, Graph, URIRef
+from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider import (
+    VCARD,
+    FairDataPointRecordProvider,
+)
+from ckanext.fairdatapoint.harvesters.domain.fdp_record import FdpRecord
+from ckanext.fairdatapoint.harvesters.domain.record_content import DEFAULT_CONTENT_FORMAT
+
+log = logging.getLogger(__name__)
+
+# File extensions and rdflib parsers, a .gz extension is removed first
+RDF_FILE_FORMATS = {
+    ".nq": "nquads",
+    ".trig": "trig",
+    ".nt": "nt",
+    ".ttl": "turtle",
+    ".jsonld": "json-ld",
+    ".rdf": "xml",
+    ".xml": "xml",
+}
+# Formats which contain named graphs
+QUAD_FORMATS = frozenset(["nquads", "trig"])
+RECORD_TYPES = (DCAT.Catalog, DCAT.DatasetSeries, DCAT.Dataset)
+
+
+class FileRecordProviderException(Exception):
+    pass
+
+
+def rdf_file_format(path: Path) -> Optional[str]:
+    suffixes = [suffix.lower() for suffix in path.suffixes]
+    if suffixes and suffixes[-1] == ".gz":
+        suffixes.pop()
+    return RDF_FILE_FORMATS.get(suffixes[-1]) if suffixes else None
+
+
+def resolve_file_source(url: str, directory: Optional[str]) -> Path:
+    """
+    Returns the path of a file:// harvest source URL. Harvest sources can be created by users who may not read files
+    of the server, so the path must be inside the configured directory.
+    """
+    if not directory:
+        raise FileRecordProviderException("File harvest sources are not enabled, no source directory is configured")
+    parsed = urlparse(url)
+    resolved = Path(url2pathname(parsed.path) if parsed.scheme == "file" else url).resolve()
+    directory = str(Path(directory).resolve())
+    if os.path.commonpath([str(resolved), directory]) != directory:
+        raise FileRecordProviderException(f"File harvest source [{url}] is not inside the source directory")
+    return resolved
+
+
+class FileSource:
+    """The data of a dump file or directory, with the documents and records in it"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.dataset = Dataset(default_union=True)
+        files = sorted(p for p in self.path.rglob("*") if p.is_file()) if self.path.is_dir() else [self.path]
+        # Graph of the document of each URL
+        self.documents: Dict[URIRef, URIRef] = {}
+        file_graphs = set()
+        for file in files:
+            file_graph = self._load(file)
+            if file_graph is not None:
+                file_graphs.add(file_graph)
+        for graph in self.dataset.graphs():
+            if graph.identifier == DATASET_DEFAULT_GRAPH_ID or graph.identifier in file_graphs:
+                continue
+            if isinstance(graph.identifier, URIRef):
+                self.documents[graph.identifier] = graph.identifier
+        for file_graph in sorted(file_graphs):
+            for subject in self.dataset.graph(file_graph).subjects(RDF.type):
+                if isinstance(subject, URIRef):
+                    self.documents.setdefault(subject, file_graph)
+
+    def _load(self, file: Path) -> Optional[URIRef]:
+        """Loads a file, returns the name of the graph of a file of triples"""
+        rdf_format = rdf_file_format(file)
+        if rdf_format is None:
+            log.debug("Skipping file [%s] of unknown format", file)
+            return None
+        with (gzip.open(file, "rb") if file.suffix.lower() == ".gz" else open(file, "rb")) as stream:
+            if rdf_format in QUAD_FORMATS:
+                self.dataset.parse(source=stream, format=rdf_format)
+                return None
+            # Triples of a file go in a graph named after the file, which is no document URL
+            file_graph = URIRef(file.resolve().as_uri())
+            self.dataset.graph(file_graph).parse(source=stream, format=rdf_format)
+            return file_graph
+
+    def get_graph(self, url: Union[str, URIRef]) -> Graph:
+        """A copy of the document at url, which the caller may change"""
+        graph = Graph()
+        uri = URIRef(url)
+        document = self.documents.get(uri)
+        if document is not None:
+            graph += self.dataset.graph(document)
+        else:
+            self.dataset.cbd(uri, target_graph=graph)
+        return graph
+
+    def records(self) -> Iterator[FdpRecord]:
+        """The catalogs, dataseries and datasets in the data, in a stable order"""
+        urls = set()
+        for rdf_type in RECORD_TYPES:
+            urls.update(str(s) for s in self.dataset.subjects(RDF.type, rdf_type) if isinstance(s, URIRef))
+        for url in sorted(urls):
+            yield FdpRecord(url, types=self.dataset.objects(URIRef(url), RDF.type))
+
+
+# The most recently loaded source, since the harvester sets up a record provider for every harvest object
+_sources: Dict[Tuple[str, int, int], FileSource] = {}
+_sources_lock = threading.Lock()
+
+
+def _source_key(path: Path) -> Tuple[str, int, int]:
+    if path.is_dir():
+        stats = [p.stat() for p in path.rglob("*") if p.is_file()]
+        return str(path), max((s.st_mtime_ns for s in stats), default=0), sum(s.st_size for s in stats)
+    stat = path.stat()
+    return str(path), stat.st_mtime_ns, stat.st_size
+
+
+def load_file_source(path: Union[str, Path]) -> FileSource:
+    """Loads a source, or returns the source loaded before when its files did not change"""
+    path = Path(path).resolve()
+    if not path.exists():
+        raise FileRecordProviderException(f"File source [{path}] does not exist")
+    key = _source_key(path)
+    with _sources_lock:
+        source = _sources.get(key)
+        if source is None:
+            source = FileSource(path)
+            _sources.clear()
+            _sources[key] = source
+        return source
+
+
+class _FileFairDataPoint:
+    # Stands in for FairDataPoint, serving documents from a file source
+    timeout = None
+
+    def __init__(self, source: FileSource):
+        self.fdp_end_point = str(source.path)
+        self.source = source
+
+    def get_graph(self, path: Union[str, URIRef]) -> Graph:
+        return self.source.get_graph(path)
+
+
+class FileRecordProvider(FairDataPointRecordProvider):
+    """Record provider with the records of a local dump file or directory"""
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        harvest_catalogs: bool = False,
+        content_format: str = DEFAULT_CONTENT_FORMAT,
+        fetch_concurrency: int = 1,
+    ):
+        # Parsing and completing records is bound by the CPU, so by default records are read one at a time
+        super().__init__(
+            str(path), harvest_catalogs, content_format=content_format, fetch_concurrency=fetch_concurrency
+        )
+        self.source = load_file_source(path)
+        self.fair_data_point = _FileFairDataPoint(self.source)
+
+    def get_record_ids(self):
+        result = dict()
+        for fdp_record in self.source.records():
+            guid = self._get_guid(fdp_record)
+            if guid is not None:
+                result[guid] = fdp_record.url
+        return result.keys()
+
+    def get_records(self) -> Iterator[Tuple[str, Union[Tuple[str, Graph], Exception]]]:
+        for guid in self.get_record_ids():
+            try:
+                yield guid, self.get_record_with_graph_by_id(guid)
+            except Exception as e:
+                log.error("Error getting record [%s]: [%r]", guid, e)
+                yield guid, e
+
+    def _get_orcid_name(self, contact_point_uri: URIRef) -> Optional[str]:
+        # ORCID is not available offline, snapshots of a crawl contain the names it looked up
+        name = self.source.dataset.value(contact_point_uri, VCARD.fn)
+        return str(name) if name is not None else None
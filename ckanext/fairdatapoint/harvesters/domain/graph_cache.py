@@ -0,0 +1,52 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Cache of the graphs built in the fetch stage, for the import stage running in the same process.
+
+The harvest queue fetches and imports a harvest object straight after each other in the same worker. Keeping the
+graph of the fetched record saves parsing the content which was serialized from that very graph a moment before.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from rdflib import Graph
+
+DEFAULT_GRAPH_CACHE_SIZE = 32
+
+
+class GraphCache:
+    """
+    Least recently used cache of record graphs, keyed by harvest object id and the hash of the content stored in the
+    harvest object. Content which was changed after the fetch stage therefore never matches a cached graph.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_GRAPH_CACHE_SIZE):
+        self.max_size = max_size
+        self._graphs: "OrderedDict[Tuple[str, str], Graph]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._graphs)
+
+    @staticmethod
+    def _key(harvest_object_id: str, content: str) -> Tuple[str, str]:
+        return harvest_object_id, hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def put(self, harvest_object_id: str, content: str, graph: Graph):
+        key = self._key(harvest_object_id, content)
+        with self._lock:
+            self._graphs[key] = graph
+            self._graphs.move_to_end(key)
+            while len(self._graphs) > self.max_size:
+                self._graphs.popitem(last=False)
+
+    def pop(self, harvest_object_id: str, content: str) -> Optional[Graph]:
+        """Removes and returns the graph of a harvest object, if it is cached for the given content"""
+        key = self._key(harvest_object_id, content)
+        with self._lock:
+            return self._graphs.pop(key, None)
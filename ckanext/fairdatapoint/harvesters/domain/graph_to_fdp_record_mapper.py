@@ -4,7 +4,7 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 
 from ckanext.fairdatapoint.harvesters.domain.fdp_record import FdpRecord
-from rdflib import Namespace
+from rdflib import RDF, Namespace, URIRef
 
 LDP = Namespace("http://www.w3.org/ns/ldp#")
 
@@ -17,10 +17,10 @@ class GraphToFdpRecordMapper:
         if rdf_graph is None:
             raise ValueError("rdf_graph cannot be None")
 
-        record = FdpRecord(self.url, rdf_graph)
-
-        for subject, predicate, obj in rdf_graph:
-            if predicate == LDP.contains:
-                record.add_children(str(obj))
-
-        return record
+        # Both lookups use the indexes of the store instead of scanning every triple. The record does not keep
+        # a reference to the graph, so the graph can be garbage collected once the record has been classified
+        return FdpRecord(
+            self.url,
+            types=rdf_graph.objects(subject=URIRef(self.url), predicate=RDF.type),
+            children=(str(child) for child in rdf_graph.objects(predicate=LDP.contains)),
+        )
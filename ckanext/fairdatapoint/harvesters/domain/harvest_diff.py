@@ -0,0 +1,105 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Dry runs of a harvest, comparing the records of a harvest source with the records harvested before.
+
+A harvest creates a harvest object for every record found, whether it changed or not, and imports all of them. A dry
+run only crawls the source and reports what a harvest would do, to plan the reharvest of a large source. When the
+content is compared, records whose graph is isomorphic to the graph harvested before count as unchanged. The import
+time is estimated from the import durations of the harvest objects of earlier jobs. Crawls are expensive, so results
+are kept for a while.
+"""
+
+import statistics
+import threading
+import time
+from typing import Dict, Hashable, Iterable, Mapping, NamedTuple, Optional, Set, Tuple
+
+from rdflib import Graph
+from rdflib.compare import to_isomorphic
+
+DEFAULT_DIFF_CACHE_TTL = 600  # seconds
+
+
+class HarvestDiff(NamedTuple):
+    new: int
+    # Records harvested before, all of them when the content is not compared
+    changed: int
+    # None when the content is not compared
+    unchanged: Optional[int]
+    deleted: int
+    # Records found whose content could not be fetched, counted as changed
+    failed: int
+    crawl_seconds: float
+    # Seconds to import every harvest object a harvest would create, None without earlier imports
+    estimated_import_seconds: Optional[float]
+    # Whether the whole source was crawled, a harvest deletes nothing when it was not
+    complete: bool = True
+    # Documents which could not be crawled, the records they refer to are missing from the counts
+    crawl_errors: int = 0
+
+
+def graph_digest(graph: Graph) -> str:
+    """Digest which is the same for isomorphic graphs, whatever the labels of their blank nodes"""
+    return format(to_isomorphic(graph).graph_digest(), "x")
+
+
+def diff_records(
+    crawled: Mapping[str, Optional[str]], current: Mapping[str, Optional[str]]
+) -> Tuple[Set[str], Set[str], Set[str], Set[str]]:
+    """
+    Compares the GUIDs found in the source with those harvested before, both mapped to the digest of their content or
+    None. Returns the new, changed, unchanged and deleted GUIDs. Records are only unchanged when both digests are known
+    and equal.
+    """
+    new = set(crawled) - set(current)
+    deleted = set(current) - set(crawled)
+    changed = set()
+    unchanged = set()
+    for guid in set(crawled) & set(current):
+        if crawled[guid] is not None and crawled[guid] == current[guid]:
+            unchanged.add(guid)
+        else:
+            changed.add(guid)
+    return new, changed, unchanged, deleted
+
+
+def estimate_import_seconds(count: int, durations: Iterable[float]) -> Optional[float]:
+    """Estimates the time to import count harvest objects from the durations of earlier imports"""
+    durations = list(durations)
+    if not durations:
+        return None
+    # The median is not skewed by the occasional import waiting for a lock or a vocabulary host
+    return count * statistics.median(durations)
+
+
+class DiffCache:
+    """Results of dry runs, kept for ttl seconds"""
+
+    def __init__(self, ttl: float = DEFAULT_DIFF_CACHE_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._diffs: Dict[Hashable, Tuple[float, HarvestDiff]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[HarvestDiff]:
+        with self._lock:
+            entry = self._diffs.get(key)
+            if entry is None:
+                return None
+            created, diff = entry
+            if self._clock() - created > self.ttl:
+                del self._diffs[key]
+                return None
+            return diff
+
+    def put(self, key: Hashable, diff: HarvestDiff):
+        with self._lock:
+            now = self._clock()
+            self._diffs = {k: v for k, v in self._diffs.items() if now - v[0] <= self.ttl}
+            self._diffs[key] = (now, diff)
+
+
+diff_cache = DiffCache()
@@ -0,0 +1,245 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Per host rate and concurrency limits for outgoing HTTP requests.
+
+FAIR data points range from small institutional servers which fail with a handful of concurrent requests to
+servers behind a CDN. Every host gets its own limiter: a token bucket bounds the request rate and an additive
+increase, multiplicative decrease (AIMD) limit bounds the number of concurrent requests. The concurrency limit grows
+while the host answers quickly and is halved when the host answers with 429 or 5xx, fails to answer, or answers much
+slower than it used to.
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Mapping, Optional, Tuple, TypeVar
+from urllib.parse import urlparse
+
+from requests.exceptions import ConnectionError, Timeout
+
+log = logging.getLogger(__name__)
+
+DEFAULT_RATE_LIMIT = 0.0  # requests per second, 0 is unlimited
+DEFAULT_INITIAL_CONCURRENCY = 4
+DEFAULT_MAX_CONCURRENCY = 16
+# A response this many times slower than the average response counts as a sign of overload
+DEFAULT_LATENCY_FACTOR = 3.0
+DECREASE_FACTOR = 0.5
+LATENCY_SMOOTHING = 0.1
+# Slow responses move the average less, so a burst of them barely changes it while a lasting slowdown becomes the
+# new normal after a few responses
+SLOW_LATENCY_SMOOTHING = 0.05
+MAX_RETRY_AFTER = 300  # seconds
+
+T = TypeVar("T")
+
+
+def _retry_after(response) -> Optional[float]:
+    """Returns the Retry-After header of a response in seconds, HTTP dates are not supported"""
+    headers = getattr(response, "headers", None)
+    if not isinstance(headers, Mapping):
+        return None
+    try:
+        return min(max(float(headers.get("Retry-After")), 0.0), MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        return None
+
+
+class HostLimiter:
+    """
+    Rate and concurrency limit of a single host. Requests are made through call or call_streamed, or between acquire
+    and release.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE_LIMIT,
+        burst: Optional[int] = None,
+        initial_concurrency: int = DEFAULT_INITIAL_CONCURRENCY,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        min_concurrency: int = 1,
+        latency_factor: float = DEFAULT_LATENCY_FACTOR,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = max(0.0, rate)
+        self.burst = max(1, burst or int(self.rate))
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.latency_factor = latency_factor
+        self._clock = clock
+        self._limit = float(min(max(initial_concurrency, self.min_concurrency), self.max_concurrency))
+        self._in_flight = 0
+        self._tokens = float(self.burst)
+        self._refilled_at = clock()
+        self._paused_until = 0.0
+        self._decreased_at = float("-inf")
+        # Moving average of the latency of responses which are not errors
+        self._latency: Optional[float] = None
+        self._condition = threading.Condition()
+
+    @property
+    def concurrency_limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _refill(self, now: float):
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _wait_time(self, now: float) -> Optional[float]:
+        """Seconds until a request may start, 0 when it may start now and None when waiting for a release"""
+        if self._in_flight >= self.concurrency_limit:
+            return None
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.rate and self._tokens < 1:
+            return (1 - self._tokens) / self.rate
+        return 0
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Waits until a request to the host may start. Returns False if it may not start and blocking is False"""
+        with self._condition:
+            while True:
+                now = self._clock()
+                self._refill(now)
+                wait_time = self._wait_time(now)
+                if wait_time == 0:
+                    break
+                if not blocking:
+                    return False
+                self._condition.wait(wait_time)
+            self._in_flight += 1
+            if self.rate:
+                self._tokens -= 1
+            return True
+
+    def release(
+        self,
+        latency: Optional[float] = None,
+        status_code: Optional[int] = None,
+        failed: bool = False,
+        retry_after: Optional[float] = None,
+    ):
+        """Ends a request and adapts the concurrency limit to how the host responded, if it did"""
+        with self._condition:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._condition.notify_all()
+            self._record(latency, status_code, failed, retry_after)
+
+    def _record(
+        self,
+        latency: Optional[float],
+        status_code: Optional[int],
+        failed: bool,
+        retry_after: Optional[float],
+    ):
+        # Adapts the concurrency limit to how the host responded, called holding the condition
+        if latency is None and status_code is None and not failed:
+            return
+        now = self._clock()
+        overloaded = failed or status_code == 429 or (status_code is not None and status_code >= 500)
+        slow = (
+            latency is not None
+            and self._latency is not None
+            and latency > self._latency * self.latency_factor
+        )
+        if overloaded or slow:
+            self._decrease(now)
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+        else:
+            self._increase()
+        if latency is not None and not overloaded:
+            smoothing = SLOW_LATENCY_SMOOTHING if slow else LATENCY_SMOOTHING
+            self._latency = latency if self._latency is None else (
+                self._latency + smoothing * (latency - self._latency)
+            )
+
+    def _increase(self):
+        # Adds about one request per round trip of all allowed concurrent requests
+        self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+
+    def _decrease(self, now: float):
+        # Concurrent requests failing because of the same overload should only halve the limit once
+        if now - self._decreased_at < (self._latency or 0):
+            return
+        self._decreased_at = now
+        limit = max(float(self.min_concurrency), self._limit * DECREASE_FACTOR)
+        if int(limit) < self.concurrency_limit:
+            log.info("Host overloaded, lowering concurrent requests to %s", int(limit))
+        self._limit = limit
+
+    def call(self, function: Callable[..., T], *args, **kwargs) -> T:
+        """Calls a function making a request to the host within the limits and records its response"""
+        response, release = self.call_streamed(function, *args, **kwargs)
+        release()
+        return response
+
+    def call_streamed(self, function: Callable[..., T], *args, **kwargs) -> Tuple[T, Callable[[], None]]:
+        """
+        Like call, for a streamed request whose body is read after the function returns. The response is recorded
+        as soon as it arrives, but the request counts against the concurrency limit until the returned release
+        function is called, once the body is read or the response is closed.
+        """
+        self.acquire()
+        started = self._clock()
+        try:
+            response = function(*args, **kwargs)
+        except (ConnectionError, Timeout):
+            self.release(self._clock() - started, failed=True)
+            raise
+        except BaseException:
+            self.release()
+            raise
+        status_code = getattr(response, "status_code", None)
+        with self._condition:
+            self._record(
+                self._clock() - started,
+                status_code if isinstance(status_code, int) else None,
+                False,
+                _retry_after(response),
+            )
+
+        released = threading.Event()
+
+        def release():
+            # Releasing twice would let another request in
+            if not released.is_set():
+                released.set()
+                self.release()
+
+        return response, release
+
+
+class HostLimiters:
+    """Limiters by host, shared by every component of a process making requests to the same hosts"""
+
+    def __init__(self, **limiter_settings):
+        self._settings = limiter_settings
+        self._limiters: Dict[str, HostLimiter] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, **limiter_settings):
+        """Changes the settings of new limiters. Existing limiters are replaced only if the settings changed"""
+        with self._lock:
+            if limiter_settings != self._settings:
+                self._settings = limiter_settings
+                self._limiters.clear()
+
+    def get(self, url) -> HostLimiter:
+        host = urlparse(str(url)).netloc.lower()
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = self._limiters[host] = HostLimiter(**self._settings)
+            return limiter
+
+
+host_limiters = HostLimiters()
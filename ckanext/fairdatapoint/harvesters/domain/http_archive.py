@@ -0,0 +1,211 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Recording and replaying the HTTP requests of a harvest, to repeat a crawl of a live FDP offline.
+
+RecordingTransport sends requests as usual and writes every request with its response, or the connection error or
+timeout it ended in, to a gzip compressed archive of JSON lines. Bodies are stored decompressed. A body larger than
+the maximum body size is read no further than one byte past it and recorded as truncated, which is still too large
+for the harvester when it is replayed. ReplayTransport
+answers requests from an archive: the responses to a URL are replayed in the order they were recorded, so retries of
+a failing request fail and succeed as they did, and the last response is repeated once they run out. With timings,
+every response takes as long as it took when it was recorded, which reproduces a slow harvest; without them, the
+crawl runs at the speed of the CPU, to compare optimizations on the same data.
+"""
+
+import base64
+import gzip
+import io
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Deque, Dict, Iterable, Iterator, List, Tuple, Union
+
+import requests
+from requests.exceptions import ConnectionError, RequestException
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3 import HTTPResponse
+
+from ckanext.fairdatapoint.harvesters.domain.document_limits import DEFAULT_MAX_BODY_SIZE
+from ckanext.fairdatapoint.harvesters.domain.transport import Transport
+
+log = logging.getLogger(__name__)
+
+# Headers which describe the body as it was sent, while archives store it decompressed
+_BODY_ENCODING_HEADERS = frozenset(["content-encoding", "content-length", "transfer-encoding"])
+# Request headers worth keeping to tell how a request was made
+_RECORDED_REQUEST_HEADERS = ("Accept", "Accept-Encoding")
+BODY_CHUNK_SIZE = 64 * 1024
+
+
+class HttpArchiveException(Exception):
+    pass
+
+
+class NotInArchiveException(ConnectionError):
+    """A request which the archive has no response to, handled like a host which cannot be reached"""
+
+
+def read_archive(path: Union[str, os.PathLike]) -> Iterator[dict]:
+    """The exchanges in an archive, in the order in which they completed"""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+    except (OSError, ValueError) as e:
+        raise HttpArchiveException(f"Could not read HTTP archive [{path}]: {e}") from e
+
+
+def _response(exchange: dict, body: bytes) -> requests.Response:
+    # A streamed response, as requests returns it, whose body is read from memory
+    headers = CaseInsensitiveDict(exchange["headers"])
+    headers["Content-Length"] = str(len(body))
+    response = requests.Response()
+    response.status_code = exchange["status"]
+    response.reason = exchange.get("reason") or ""
+    response.url = exchange.get("response_url") or exchange["url"]
+    response.headers = headers
+    response.encoding = get_encoding_from_headers(headers)
+    response.elapsed = timedelta(seconds=exchange.get("elapsed", 0.0))
+    response.raw = HTTPResponse(
+        body=io.BytesIO(body), headers=dict(headers), status=response.status_code, preload_content=False
+    )
+    return response
+
+
+def _exception(exchange: dict) -> RequestException:
+    exception_class = getattr(requests.exceptions, exchange["error"], None)
+    if not isinstance(exception_class, type) or not issubclass(exception_class, RequestException):
+        exception_class = ConnectionError
+    return exception_class(exchange.get("message", ""))
+
+
+class RecordingTransport(Transport):
+    """
+    Sends requests with requests and records them to an archive at path. Bodies are read up to max_body_size bytes,
+    0 is unlimited.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], max_body_size: int = DEFAULT_MAX_BODY_SIZE):
+        self.path = path
+        self.max_body_size = max(0, max_body_size)
+        self.exchanges = 0
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        exchange = {
+            "method": method.upper(),
+            "url": str(url),
+            "request_headers": {
+                name: value for name, value in (kwargs.get("headers") or {}).items()
+                if name in _RECORDED_REQUEST_HEADERS
+            },
+        }
+        started = time.monotonic()
+        exchange["started"] = started - self._started
+        try:
+            response = super().request(method, url, **dict(kwargs, stream=True))
+            body, truncated = self._read_body(response)
+        except RequestException as e:
+            exchange["elapsed"] = time.monotonic() - started
+            exchange["error"] = type(e).__name__
+            exchange["message"] = str(e)
+            self._write(exchange)
+            raise
+        exchange["elapsed"] = time.monotonic() - started
+        exchange["status"] = response.status_code
+        exchange["reason"] = response.reason
+        if response.url != exchange["url"]:
+            exchange["response_url"] = response.url
+        exchange["headers"] = {
+            name: value for name, value in response.headers.items() if name.lower() not in _BODY_ENCODING_HEADERS
+        }
+        exchange["body"] = base64.b64encode(body).decode("ascii")
+        if truncated:
+            log.warning(
+                "Response of %s exceeds the maximum body size of %s bytes and is truncated", url, self.max_body_size
+            )
+            exchange["truncated"] = True
+        self._write(exchange)
+        return _response(exchange, body)
+
+    def _read_body(self, response: requests.Response) -> Tuple[bytes, bool]:
+        """
+        Reads and decompresses the body of a streamed response. Returns the body, cut one byte past the maximum body
+        size, and whether it was cut.
+        """
+        chunks = []
+        size = 0
+        try:
+            for chunk in response.iter_content(BODY_CHUNK_SIZE):
+                chunks.append(chunk)
+                size += len(chunk)
+                if self.max_body_size and size > self.max_body_size:
+                    return b"".join(chunks)[:self.max_body_size + 1], True
+        finally:
+            response.close()
+        return b"".join(chunks), False
+
+    def _write(self, exchange: dict):
+        line = json.dumps(exchange, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self.exchanges += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self) -> "RecordingTransport":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayTransport(Transport):
+    """
+    Answers requests from an archive, or from the exchanges read from one. With timings, every response is
+    delayed by the time it took when it was recorded.
+    """
+
+    def __init__(self, archive: Union[str, os.PathLike, Iterable[dict]], timings: bool = False):
+        exchanges = read_archive(archive) if isinstance(archive, (str, os.PathLike)) else archive
+        self.timings = timings
+        self._exchanges: Dict[Tuple[str, str], Deque[dict]] = {}
+        for exchange in exchanges:
+            self._exchanges.setdefault((exchange["method"], exchange["url"]), deque()).append(exchange)
+        self.replayed = 0
+        # Requests which were not in the archive
+        self.misses: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        key = (method.upper(), str(url))
+        with self._lock:
+            exchanges = self._exchanges.get(key)
+            if not exchanges:
+                self.misses.append(key)
+                exchange = None
+            else:
+                # The last response to a URL is repeated for every later request
+                exchange = exchanges.popleft() if len(exchanges) > 1 else exchanges[0]
+                self.replayed += 1
+        if exchange is None:
+            log.warning("Request %s %s is not in the HTTP archive", method, url)
+            raise NotInArchiveException(f"{method} {url} is not in the HTTP archive")
+        if self.timings:
+            time.sleep(exchange.get("elapsed", 0.0))
+        if "error" in exchange:
+            raise _exception(exchange)
+        return _response(exchange, base64.b64decode(exchange["body"]))
@@ -0,0 +1,84 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Scheduling of harvest object imports which depend on each other.
+
+A dataset which is a member of a dataset series can only be linked to the series once the package of the series
+exists. The scheduler releases every object without pending dependencies at once, so they can be imported in
+parallel, and holds the others until all objects they depend on are done.
+"""
+
+import logging
+from collections import defaultdict, deque
+from typing import Deque, Dict, Hashable, Iterable, List, Mapping, Set
+
+log = logging.getLogger(__name__)
+
+
+class ImportScheduler:
+    """
+    Schedules keys given a mapping from each key to the keys it depends on. Dependencies which are not scheduled
+    themselves, for instance series imported by an earlier harvest job, are considered to be done.
+    """
+
+    def __init__(self, dependencies: Mapping[Hashable, Iterable[Hashable]]):
+        self._waiting_for: Dict[Hashable, Set[Hashable]] = {}
+        self._dependents: Dict[Hashable, Set[Hashable]] = defaultdict(set)
+        self._ready: Deque[Hashable] = deque()
+        self._unfinished: Set[Hashable] = set(dependencies)
+        self._released: Set[Hashable] = set()
+
+        for key, key_dependencies in dependencies.items():
+            waiting_for = {
+                dependency for dependency in key_dependencies
+                if dependency in self._unfinished and dependency != key
+            }
+            if waiting_for:
+                self._waiting_for[key] = waiting_for
+                for dependency in waiting_for:
+                    self._dependents[dependency].add(key)
+            else:
+                self._ready.append(key)
+
+    @property
+    def finished(self) -> bool:
+        return not self._unfinished
+
+    @property
+    def in_progress(self) -> int:
+        """Number of released keys which are not done yet"""
+        return len(self._released & self._unfinished)
+
+    def pop_ready(self) -> List[Hashable]:
+        """Returns the keys which can be started now, each key is returned once"""
+        if not self._ready and not self.in_progress and self._waiting_for:
+            # Nothing is running and nothing can be started, so the remaining keys depend on each other
+            log.warning(
+                "Circular dependencies between [%s], releasing them without order",
+                ", ".join(map(str, self._waiting_for)),
+            )
+            self._ready.extend(self._waiting_for)
+            self._waiting_for.clear()
+            self._dependents.clear()
+
+        ready = list(self._ready)
+        self._ready.clear()
+        self._released.update(ready)
+        return ready
+
+    def done(self, key: Hashable):
+        """
+        Marks a key as done, successful or not. Dependents of a failed key are released as well, they are imported
+        without the link to it.
+        """
+        self._unfinished.discard(key)
+        for dependent in self._dependents.pop(key, ()):
+            waiting_for = self._waiting_for.get(dependent)
+            if waiting_for is None:
+                continue
+            waiting_for.discard(key)
+            if not waiting_for:
+                del self._waiting_for[dependent]
+                self._ready.append(dependent)
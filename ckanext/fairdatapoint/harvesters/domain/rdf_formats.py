@@ -0,0 +1,83 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Content negotiation of RDF serializations.
+
+FAIR data points can serve a record in several serializations, which differ a lot in parsing cost: N-Triples is parsed
+line by line, while Turtle and especially JSON-LD need a full grammar. Requests ask for all serializations, weighted
+from cheapest to most expensive to parse. Which serialization each host actually serves is recorded, so the next
+requests to that host ask for it first.
+"""
+
+import threading
+from typing import Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+# Media types and rdflib parser names, from cheapest to most expensive to parse
+RDF_MEDIA_TYPES = {
+    "application/n-triples": "nt",
+    "text/turtle": "turtle",
+    "application/rdf+xml": "xml",
+    "application/ld+json": "json-ld",
+}
+# Parser used when the response does not name a known RDF media type, the format FDPs serve by default
+DEFAULT_RDF_FORMAT = "turtle"
+
+_MEDIA_TYPES_BY_FORMAT = {rdf_format: media_type for media_type, rdf_format in RDF_MEDIA_TYPES.items()}
+
+
+def rdf_format_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    """Returns the rdflib parser for a Content-Type header, None if it is not a known RDF media type"""
+    if not content_type:
+        return None
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return RDF_MEDIA_TYPES.get(media_type)
+
+
+def _accept_header(media_types: List[str]) -> str:
+    accept = []
+    for position, media_type in enumerate(media_types):
+        quality = round(1 - position / 10, 1)
+        accept.append(media_type if quality == 1 else f"{media_type};q={quality}")
+    return ", ".join(accept)
+
+
+class HostFormats:
+    """Record of the RDF formats each host served"""
+
+    def __init__(self):
+        self._served: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _host(url) -> str:
+        return urlparse(str(url)).netloc.lower()
+
+    def record(self, url, rdf_format: str):
+        """Records that the host of url served a document in the given format"""
+        if rdf_format not in _MEDIA_TYPES_BY_FORMAT:
+            return
+        with self._lock:
+            self._served.setdefault(self._host(url), set()).add(rdf_format)
+
+    def supported_formats(self, url) -> Set[str]:
+        with self._lock:
+            return set(self._served.get(self._host(url), ()))
+
+    def accept_header(self, url) -> str:
+        """
+        Accept header preferring the cheapest format. Once the host served a format, the cheapest format it served
+        is preferred, since the host did not serve the cheaper ones it was asked for.
+        """
+        media_types = list(RDF_MEDIA_TYPES)
+        served = self.supported_formats(url)
+        if served:
+            cheapest = next(rdf_format for rdf_format in RDF_MEDIA_TYPES.values() if rdf_format in served)
+            media_types.remove(_MEDIA_TYPES_BY_FORMAT[cheapest])
+            media_types.insert(0, _MEDIA_TYPES_BY_FORMAT[cheapest])
+        return _accept_header(media_types)
+
+
+host_formats = HostFormats()
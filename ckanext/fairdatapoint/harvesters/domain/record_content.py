@@ -0,0 +1,167 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Serialization of record graphs into the content of a harvest object and back.
+
+Three content formats are supported:
+
+- ``turtle``: pretty Turtle, as stored by earlier versions of the harvester. Content without a header is
+  always read as Turtle, so existing harvest objects remain readable;
+- ``ntriples``: line based N-Triples, which is cheaper to write and to parse than Turtle;
+- ``compact``: a dictionary encoding of the triples. Every distinct term is written once and triples refer to
+  terms by index, so decoding only has to construct terms and does not need an RDF parser at all.
+
+Non-Turtle content starts with a comment line naming its format. The comment is valid Turtle and N-Triples,
+so the content remains usable by generic RDF tooling.
+"""
+
+import re
+from typing import Dict, Optional
+
+from rdflib import BNode, Graph, Literal, URIRef
+
+CONTENT_FORMAT_TURTLE = "turtle"
+CONTENT_FORMAT_NTRIPLES = "ntriples"
+CONTENT_FORMAT_COMPACT = "compact"
+CONTENT_FORMATS = (CONTENT_FORMAT_TURTLE, CONTENT_FORMAT_NTRIPLES, CONTENT_FORMAT_COMPACT)
+DEFAULT_CONTENT_FORMAT = CONTENT_FORMAT_TURTLE
+
+# rdflib format names of the content formats that are parsed by an rdflib parser
+RDFLIB_FORMATS = {CONTENT_FORMAT_TURTLE: "ttl", CONTENT_FORMAT_NTRIPLES: "nt"}
+
+HEADER_PREFIX = "#fdp-content: "
+
+URI_TERM = "U"
+BNODE_TERM = "B"
+LITERAL_TERM = "L"
+FIELD_SEPARATOR = "\t"
+
+_ESCAPES = {"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_UNESCAPES = {value[1]: key for key, value in _ESCAPES.items()}
+_ESCAPE_PATTERN = re.compile(r"[\\\n\r\t]")
+_UNESCAPE_PATTERN = re.compile(r"\\(.)")
+
+
+class RecordContentException(Exception):
+    pass
+
+
+def validate_content_format(content_format: str) -> str:
+    if content_format not in CONTENT_FORMATS:
+        raise RecordContentException(
+            f"Unknown content format [{content_format}], expected one of {list(CONTENT_FORMATS)}"
+        )
+    return content_format
+
+
+def serialize_graph(graph: Graph, content_format: str = DEFAULT_CONTENT_FORMAT) -> str:
+    """Serializes a record graph into harvest object content of the given format"""
+    validate_content_format(content_format)
+
+    if content_format == CONTENT_FORMAT_TURTLE:
+        return graph.serialize(format="ttl")
+    if content_format == CONTENT_FORMAT_NTRIPLES:
+        return HEADER_PREFIX + content_format + "\n" + graph.serialize(format="nt")
+    return _encode_compact(graph)
+
+
+def detect_content_format(content: str) -> str:
+    """Returns the content format of harvest object content, Turtle if the content has no header"""
+    if content.startswith(HEADER_PREFIX):
+        header = content[len(HEADER_PREFIX):content.find("\n")].strip()
+        return validate_content_format(header)
+    return CONTENT_FORMAT_TURTLE
+
+
+def parse_content(content: str, graph: Optional[Graph] = None) -> Graph:
+    """Parses harvest object content of any content format into a (new) graph"""
+    if graph is None:
+        graph = Graph()
+
+    content_format = detect_content_format(content)
+    if content_format == CONTENT_FORMAT_COMPACT:
+        decode_compact(content, graph)
+    else:
+        graph.parse(data=content, format=RDFLIB_FORMATS[content_format])
+    return graph
+
+
+def _escape(value: str) -> str:
+    return _ESCAPE_PATTERN.sub(lambda match: _ESCAPES[match.group(0)], value)
+
+
+def _unescape(value: str) -> str:
+    if "\\" not in value:
+        return value
+    return _UNESCAPE_PATTERN.sub(lambda match: _UNESCAPES[match.group(1)], value)
+
+
+def _encode_term(term) -> str:
+    if isinstance(term, Literal):
+        return FIELD_SEPARATOR.join(
+            (
+                LITERAL_TERM + (term.language or ""),
+                _escape(str(term.datatype or "")),
+                _escape(str(term)),
+            )
+        )
+    if isinstance(term, BNode):
+        return BNODE_TERM + _escape(str(term))
+    return URI_TERM + _escape(str(term))
+
+
+def _encode_compact(graph: Graph) -> str:
+    term_ids: Dict = {}
+    term_lines = []
+    triple_lines = []
+
+    for triple in graph:
+        ids = []
+        for term in triple:
+            term_id = term_ids.get(term)
+            if term_id is None:
+                term_id = term_ids[term] = len(term_lines)
+                term_lines.append(_encode_term(term))
+            ids.append(str(term_id))
+        triple_lines.append(" ".join(ids))
+
+    # Terms and triples are separated by an empty line, a term line is never empty
+    lines = [HEADER_PREFIX + CONTENT_FORMAT_COMPACT] + term_lines + [""] + triple_lines
+    return "\n".join(lines) + "\n"
+
+
+def _decode_term(line: str):
+    kind = line[0]
+    if kind == URI_TERM:
+        return URIRef(_unescape(line[1:]))
+    if kind == BNODE_TERM:
+        return BNode(_unescape(line[1:]))
+    if kind == LITERAL_TERM:
+        language, datatype, value = line[1:].split(FIELD_SEPARATOR, 2)
+        return Literal(
+            _unescape(value),
+            lang=language or None,
+            datatype=URIRef(_unescape(datatype)) if datatype else None,
+        )
+    raise RecordContentException(f"Unknown term kind [{kind}] in compact content")
+
+
+def decode_compact(content: str, graph: Graph) -> Graph:
+    """Adds the triples of compact content to a graph"""
+    lines = content.split("\n")
+    try:
+        separator = lines.index("", 1)
+    except ValueError as e:
+        raise RecordContentException("Compact content has no triples section") from e
+
+    terms = [_decode_term(line) for line in lines[1:separator]]
+    try:
+        graph.addN(
+            (terms[int(s)], terms[int(p)], terms[int(o)], graph)
+            for s, p, o in (line.split(" ") for line in lines[separator + 1:] if line)
+        )
+    except (IndexError, ValueError) as e:
+        raise RecordContentException(f"Malformed triple in compact content: {e}") from e
+    return graph
@@ -0,0 +1,120 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Conversion of records to package dictionaries in a pool of worker processes.
+
+Converting a record (parsing the RDF and applying the profiles) is pure CPU work, so a single import process is
+limited by the GIL. The pool converts records in worker processes while the calling process keeps doing everything
+that touches CKAN: label resolution and the package actions.
+"""
+
+import logging
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Dict, Hashable, Iterable, Iterator, NamedTuple, Optional
+
+from ckanext.fairdatapoint.labels import resolve_labels, skip_label_resolution
+
+log = logging.getLogger(__name__)
+
+# Workers are forked, so they inherit the CKAN configuration and the loaded plugins and profiles of the parent
+MULTIPROCESSING_START_METHOD = "fork"
+
+# Converter of the worker process, set by the pool initializer
+_worker_converter = None
+
+
+class ConversionRequest(NamedTuple):
+    key: Hashable
+    guid: str
+    record: str
+    series_mapping: Optional[Dict[str, Dict[str, str]]] = None
+
+
+class ConversionResult(NamedTuple):
+    key: Hashable
+    package_dict: Optional[Dict[str, Any]]
+    error: Optional[Exception] = None
+
+
+def _initialize_worker(converter):
+    global _worker_converter
+    _worker_converter = converter
+
+
+def _convert(guid: str, record: str, series_mapping) -> Optional[Dict[str, Any]]:
+    # Label resolution needs CKAN actions, the pool resolves labels in the parent process instead
+    with skip_label_resolution():
+        return _worker_converter.record_to_package(guid, record, series_mapping=series_mapping)
+
+
+class RecordToPackagePool:
+    """
+    Pool of processes converting records with a copy of a record to package converter. Use as a context manager to
+    shut down the worker processes afterwards.
+    """
+
+    def __init__(self, converter, max_workers: Optional[int] = None, max_pending: Optional[int] = None):
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        # Bounds the number of records held in memory while waiting for a worker
+        self.max_pending = max_pending or self.max_workers * 4
+        self._pending: Dict[Future, Hashable] = {}
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context(MULTIPROCESSING_START_METHOD),
+            initializer=_initialize_worker,
+            initargs=(converter,),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    @property
+    def pending(self) -> int:
+        """Number of submitted records whose result has not been collected yet"""
+        return len(self._pending)
+
+    def convert(self, requests: Iterable[ConversionRequest]) -> Iterator[ConversionResult]:
+        """
+        Converts records in the worker processes and yields the results in order of completion. Requests are
+        consumed lazily, so they can be read from a queue of pending objects while earlier records are converted.
+        Conversion errors are returned in the result instead of being raised.
+        """
+        for request in requests:
+            self.submit(request)
+            if self.pending >= self.max_pending:
+                yield from self.collect()
+
+        while self.pending:
+            yield from self.collect()
+
+    def submit(self, request: ConversionRequest):
+        future = self._executor.submit(
+            _convert, request.guid, request.record, request.series_mapping
+        )
+        self._pending[future] = request.key
+
+    def collect(self) -> Iterator[ConversionResult]:
+        """Waits until at least one submitted record is converted and yields the results of all completed ones"""
+        if not self._pending:
+            return
+        done, _ = wait(self._pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            key = self._pending.pop(future)
+            try:
+                package_dict = future.result()
+                if package_dict:
+                    resolve_labels(package_dict)
+            except Exception as e:
+                log.error("Error converting record [%s]: [%r]", key, e)
+                yield ConversionResult(key, None, e)
+            else:
+                yield ConversionResult(key, package_dict)
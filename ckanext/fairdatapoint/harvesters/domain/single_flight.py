@@ -0,0 +1,66 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Coalescing of concurrent calls for the same key.
+
+Distributions, publishers and vocabulary terms are shared by many datasets, so concurrent fetches of different records
+often request the same URL at the same moment. The first call for a key does the work; calls for the same key made
+while it is in flight wait for it and get the same result, or the same exception.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.participants = 1
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, function: Callable[..., T], *args, **kwargs) -> Tuple[T, bool]:
+        """
+        Calls the function, unless a call for the same key is in flight, in which case its result is awaited.
+        Returns the result and whether it is shared with other callers, in which case callers which modify the
+        result must copy it first.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.participants += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if leader:
+            try:
+                call.result = function(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                # No callers can join once the call is removed, so the number of participants is final
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result, call.participants > 1
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,197 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Snapshots of a FAIR data point as a gzip compressed N-Quads dump.
+
+A snapshot holds every document the crawl of the FDP requested, the root, catalogs, records and distributions, each
+in a named graph named after its URL, exactly as the FDP served it. Names of contact points looked up at ORCID are
+added in a named graph per contact point. A snapshot can therefore be harvested with FileRecordProvider, giving the
+same records as harvesting the FDP itself, for offline imports, debugging and performance regression runs.
+"""
+
+import gzip
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Set, Union
+
+from rdflib import Dataset, Graph, Literal, URIRef
+
+from ckanext.fairdatapoint.harvesters.domain.document_limits import DEFAULT_MAX_BODY_SIZE
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point import (
+    CONNECT_TIMEOUT,
+    REQUEST_RETRIES,
+    REQUEST_TIMEOUT,
+    FairDataPoint,
+)
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider import (
+    FETCH_CONCURRENCY,
+    VCARD,
+    FairDataPointRecordProvider,
+)
+
+log = logging.getLogger(__name__)
+
+# Documents kept during a crawl, distributions and publishers are often shared by many records
+DEFAULT_DOCUMENT_CACHE_SIZE = 1024
+
+
+class SnapshotWriter:
+    """Writes named graphs to a gzip compressed N-Quads file, every name once"""
+
+    def __init__(self, path: Union[str, os.PathLike]):
+        self.path = path
+        self.documents = 0
+        self.triples = 0
+        self._written: Set[str] = set()
+        self._file = gzip.open(path, "wb")
+        self._lock = threading.Lock()
+
+    def write(self, name: str, graph: Graph) -> bool:
+        """Writes the graph named name, returns False if a graph of that name was written before"""
+        with self._lock:
+            if name in self._written:
+                return False
+        dataset = Dataset()
+        named_graph = dataset.graph(URIRef(name))
+        named_graph += graph
+        data = dataset.serialize(format="nquads", encoding="utf-8")
+        with self._lock:
+            if name in self._written:
+                return False
+            self._written.add(name)
+            self._file.write(data)
+            self.documents += 1
+            self.triples += len(graph)
+        return True
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _SnapshotFairDataPoint:
+    # Writes every document requested through the FairDataPoint it wraps to the snapshot, and caches documents
+
+    def __init__(self, fair_data_point: FairDataPoint, writer: SnapshotWriter, cache_size: int):
+        self._fair_data_point = fair_data_point
+        self._writer = writer
+        self._cache_size = cache_size
+        self._cache: "OrderedDict[str, Graph]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self._fair_data_point, name)
+
+    def get_graph(self, path: Union[str, URIRef]) -> Graph:
+        key = str(path)
+        with self._lock:
+            graph = self._cache.get(key)
+            if graph is not None:
+                self._cache.move_to_end(key)
+        if graph is None:
+            graph = self._fair_data_point.get_graph(path)
+            self._writer.write(key, graph)
+            if self._cache_size > 0:
+                with self._lock:
+                    self._cache[key] = graph
+                    while len(self._cache) > self._cache_size:
+                        self._cache.popitem(last=False)
+        # Callers change the graphs they get
+        copy = Graph()
+        copy += graph
+        return copy
+
+
+class SnapshotRecordProvider(FairDataPointRecordProvider):
+    """Record provider writing every document it requests to a snapshot"""
+
+    def __init__(
+        self,
+        fdp_end_point: str,
+        writer: SnapshotWriter,
+        cache_size: int = DEFAULT_DOCUMENT_CACHE_SIZE,
+        **kwargs,
+    ):
+        super().__init__(fdp_end_point, **kwargs)
+        self.writer = writer
+        self.fair_data_point = _SnapshotFairDataPoint(self.fair_data_point, writer, cache_size)
+
+    def _get_orcid_name(self, contact_point_uri: URIRef) -> Optional[str]:
+        name = super()._get_orcid_name(contact_point_uri)
+        if name is not None:
+            graph = Graph()
+            graph.add((contact_point_uri, VCARD.fn, Literal(name)))
+            self.writer.write(str(contact_point_uri), graph)
+        return name
+
+
+class CrawlStatistics(NamedTuple):
+    records: int
+    failed_records: int
+    skipped_documents: int
+    documents: int
+    triples: int
+    size: int  # bytes of the snapshot
+    seconds: float
+
+    @property
+    def records_per_second(self) -> float:
+        return self.records / self.seconds if self.seconds else 0.0
+
+    @property
+    def documents_per_second(self) -> float:
+        return self.documents / self.seconds if self.seconds else 0.0
+
+
+def crawl_snapshot(
+    fdp_end_point: str,
+    path: Union[str, os.PathLike],
+    harvest_catalogs: bool = False,
+    fetch_concurrency: int = FETCH_CONCURRENCY,
+    cache_size: int = DEFAULT_DOCUMENT_CACHE_SIZE,
+    request_timeout: int = REQUEST_TIMEOUT,
+    connect_timeout: int = CONNECT_TIMEOUT,
+    request_retries: int = REQUEST_RETRIES,
+    max_body_size: int = DEFAULT_MAX_BODY_SIZE,
+) -> CrawlStatistics:
+    """Crawls the FDP, completing every record like the harvester does, and writes a snapshot of it to path"""
+    start = time.monotonic()
+    records = failed_records = 0
+    with SnapshotWriter(path) as writer:
+        provider = SnapshotRecordProvider(
+            fdp_end_point,
+            writer,
+            cache_size=cache_size,
+            harvest_catalogs=harvest_catalogs,
+            request_timeout=request_timeout,
+            fetch_concurrency=fetch_concurrency,
+            request_retries=request_retries,
+            connect_timeout=connect_timeout,
+            max_body_size=max_body_size,
+        )
+        for guid, fetched in provider.get_records():
+            if isinstance(fetched, Exception):
+                failed_records += 1
+            else:
+                records += 1
+        for url, error in provider.crawl_errors:
+            log.error("Document [%s] was skipped: [%s]", url, error)
+    return CrawlStatistics(
+        records=records,
+        failed_records=failed_records,
+        skipped_documents=len(provider.crawl_errors),
+        documents=writer.documents,
+        triples=writer.triples,
+        size=os.path.getsize(path),
+        seconds=time.monotonic() - start,
+    )
@@ -0,0 +1,84 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Time budgets bounding the requests made for a single record or a whole gather stage.
+
+A budget is set for a block of code and applies to every request made within it, however deeply nested. Budgets are
+kept in a context variable, so code running in worker threads only sees a budget when it runs in a copy of the
+context of the thread which set it, see run_in_context. Nested budgets can only shorten the time which is left.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Callable, Iterator, Optional, Tuple, TypeVar, Union
+
+T = TypeVar("T")
+
+Timeout = Union[float, Tuple[float, float]]
+
+_deadline: ContextVar[Optional[float]] = ContextVar("time_budget_deadline", default=None)
+
+
+class TimeBudgetExceededException(Exception):
+    pass
+
+
+@contextmanager
+def time_budget(seconds: Optional[float]) -> Iterator[None]:
+    """Limits the requests made within the block to the given number of seconds. No or a zero budget is unlimited"""
+    if not seconds or seconds <= 0:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left of the current budget, None if there is no budget"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def time_budget_exceeded() -> bool:
+    remaining = remaining_time()
+    return remaining is not None and remaining <= 0
+
+
+def check_time_budget():
+    if time_budget_exceeded():
+        raise TimeBudgetExceededException("Time budget exceeded")
+
+
+def limit_timeout(timeout: Timeout) -> Timeout:
+    """
+    Shortens a requests timeout, a single number or a (connect, read) tuple, to the time left of the current budget.
+    Raises TimeBudgetExceededException if no time is left.
+    """
+    check_time_budget()
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    if isinstance(timeout, tuple):
+        return tuple(min(part, remaining) for part in timeout)
+    return min(timeout, remaining)
+
+
+def run_in_context(function: Callable[..., T]) -> Callable[..., T]:
+    """Wraps a function to run in a copy of the current context, to pass budgets on to worker threads"""
+    context = copy_context()
+
+    def run(*args, **kwargs):
+        # A context can only be entered by one thread at a time, so every call gets its own copy
+        return context.copy().run(function, *args, **kwargs)
+
+    return run
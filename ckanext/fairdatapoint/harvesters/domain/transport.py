@@ -0,0 +1,59 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Transport of the HTTP requests of the harvester: FDP documents, ORCID lookups and the label resolver.
+
+Requests are sent with requests, unless a transport is installed with use_transport. A transport answers requests
+in its own way, for instance recording them or replaying a recording, see http_archive. The transport is installed
+for the whole process, since requests are made from worker threads.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import requests
+
+
+class Transport:
+    """Sends requests with requests, subclasses answer them in their own way"""
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        return requests.request(method, url, **kwargs)
+
+
+_transport: Optional[Transport] = None
+_transport_lock = threading.Lock()
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """requests.request through the installed transport"""
+    transport = _transport
+    if transport is None:
+        return requests.request(method, url, **kwargs)
+    return transport.request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """requests.get through the installed transport"""
+    transport = _transport
+    if transport is None:
+        return requests.get(url, **kwargs)
+    kwargs.setdefault("allow_redirects", True)
+    return transport.request("GET", url, **kwargs)
+
+
+@contextmanager
+def use_transport(transport: Transport) -> Iterator[Transport]:
+    """Sends every request through transport within the context"""
+    global _transport
+    with _transport_lock:
+        previous = _transport
+        _transport = transport
+    try:
+        yield transport
+    finally:
+        with _transport_lock:
+            _transport = previous
@@ -4,10 +4,28 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 import logging
 
+from rdflib import DCAT, URIRef
+
 from ckanext.fairdatapoint.harvesters.civity_harvester import CivityHarvester
 from ckanext.fairdatapoint.harvesters.config import (
+    get_blob_store_path,
+    get_file_source_directory,
+    get_graph_cache_size,
     get_harvester_int_setting,
     get_harvester_setting,
+    get_harvester_str_setting,
+    get_host_max_concurrency,
+    get_host_rate_limit,
+)
+from ckanext.fairdatapoint.harvesters.domain.blob_store import ContentBlobStore
+from ckanext.fairdatapoint.harvesters.domain.content_compression import (
+    DEFAULT_COMPRESSION,
+    validate_compression,
+)
+from ckanext.fairdatapoint.harvesters.domain import fair_data_point
+from ckanext.fairdatapoint.harvesters.domain.document_limits import (
+    DEFAULT_MAX_BODY_SIZE,
+    DEFAULT_MAX_TRIPLES,
 )
 from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider import (
     FairDataPointRecordProvider,
@@ -15,11 +33,44 @@ from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider imp
 from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_to_package_converter import (
     FairDataPointRecordToPackageConverter,
 )
+from ckanext.fairdatapoint.harvesters.domain.file_record_provider import (
+    FileRecordProvider,
+    resolve_file_source,
+)
+from ckanext.fairdatapoint.harvesters.domain.graph_cache import GraphCache
+from ckanext.fairdatapoint.harvesters.domain.host_limiter import host_limiters
+from ckanext.fairdatapoint.harvesters.domain.identifier import Identifier
+from ckanext.fairdatapoint.harvesters.domain.record_content import (
+    DEFAULT_CONTENT_FORMAT,
+)
+
+# Type of the harvest sources of this harvester
+HARVESTER_TYPE = "fair_data_point_harvester"
 
 PROFILE = "profile"
 HARVEST_CATALOG = "harvest_catalogs"
 REQUEST_TIMEOUT = "request_timeout"
-DEFAULT_REQUEST_TIMEOUT = 100
+DEFAULT_REQUEST_TIMEOUT = fair_data_point.REQUEST_TIMEOUT
+REQUEST_RETRIES = "request_retries"
+DEFAULT_REQUEST_RETRIES = fair_data_point.REQUEST_RETRIES
+CONNECT_TIMEOUT = "connect_timeout"
+DEFAULT_CONNECT_TIMEOUT = fair_data_point.CONNECT_TIMEOUT
+RECORD_TIME_BUDGET = "record_time_budget"
+GATHER_DEADLINE = "gather_deadline"
+MAX_BODY_SIZE = "max_body_size"
+MAX_TRIPLES = "max_triples"
+CONTENT_FORMAT = "content_format"
+CONTENT_COMPRESSION = "content_compression"
+BLOB_STORE_MIN_SIZE = "blob_store_min_size"
+DEFAULT_BLOB_STORE_MIN_SIZE = 0
+FETCH_IN_GATHER = "fetch_in_gather"
+FETCH_BATCH_SIZE = "fetch_batch_size"
+DEFAULT_FETCH_BATCH_SIZE = 1
+FETCH_CONCURRENCY = "fetch_concurrency"
+DEFAULT_FETCH_CONCURRENCY = 8
+BATCH_IMPORT = "batch_import"
+DEPENDENCY_TIMEOUT = "dependency_timeout"
+DEFAULT_DEPENDENCY_TIMEOUT = 60
 
 # HARVEST_CATALOG_CONFIG = "ckanext.fairdatapoint.harvest_catalogs"
 
@@ -28,6 +79,25 @@ log = logging.getLogger(__name__)
 
 class FairDataPointCivityHarvester(CivityHarvester):
     def setup_record_provider(self, harvest_url, harvest_config_dict):
+        self.record_provider = self.create_record_provider(harvest_url, harvest_config_dict)
+        self.gather_deadline = self.get_gather_deadline(harvest_config_dict)
+        self.fetch_batch_size = get_harvester_int_setting(
+            harvest_config_dict, FETCH_BATCH_SIZE, DEFAULT_FETCH_BATCH_SIZE
+        )
+        self.fetch_in_gather = get_harvester_setting(
+            harvest_config_dict, FETCH_IN_GATHER, False
+        )
+        self.content_compression = validate_compression(
+            get_harvester_str_setting(
+                harvest_config_dict, CONTENT_COMPRESSION, DEFAULT_COMPRESSION
+            )
+        )
+        self._setup_content_blob_store(harvest_config_dict)
+        self._setup_graph_cache()
+
+    def create_record_provider(self, harvest_url, harvest_config_dict):
+        # Requests of the provider go through the host limiters, whose settings are server settings
+        self._setup_host_limiters()
         # Harvest catalog config can be set on global CKAN level, but can be overriden by harvest config
         harvest_catalogs = get_harvester_setting(
             harvest_config_dict, HARVEST_CATALOG, False
@@ -35,25 +105,119 @@ class FairDataPointCivityHarvester(CivityHarvester):
         request_timeout = get_harvester_int_setting(
             harvest_config_dict, REQUEST_TIMEOUT, DEFAULT_REQUEST_TIMEOUT
         )
+        request_retries = get_harvester_int_setting(
+            harvest_config_dict, REQUEST_RETRIES, DEFAULT_REQUEST_RETRIES
+        )
+        connect_timeout = get_harvester_int_setting(
+            harvest_config_dict, CONNECT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT
+        )
+        record_time_budget = get_harvester_int_setting(
+            harvest_config_dict, RECORD_TIME_BUDGET, 0
+        )
+        max_body_size = get_harvester_int_setting(
+            harvest_config_dict, MAX_BODY_SIZE, DEFAULT_MAX_BODY_SIZE
+        )
+        max_triples = get_harvester_int_setting(
+            harvest_config_dict, MAX_TRIPLES, DEFAULT_MAX_TRIPLES
+        )
+        content_format = get_harvester_str_setting(
+            harvest_config_dict, CONTENT_FORMAT, DEFAULT_CONTENT_FORMAT
+        )
 
-        self.record_provider = FairDataPointRecordProvider(
-            harvest_url,
-            harvest_catalogs,
-            request_timeout=request_timeout,
+        fetch_concurrency = get_harvester_int_setting(
+            harvest_config_dict, FETCH_CONCURRENCY, DEFAULT_FETCH_CONCURRENCY
         )
 
+        if harvest_url.startswith("file:"):
+            # A local dump instead of a live FDP
+            return FileRecordProvider(
+                resolve_file_source(harvest_url, get_file_source_directory()),
+                harvest_catalogs,
+                content_format=content_format,
+            )
+        else:
+            return FairDataPointRecordProvider(
+                harvest_url,
+                harvest_catalogs,
+                request_timeout=request_timeout,
+                content_format=content_format,
+                fetch_concurrency=fetch_concurrency,
+                request_retries=request_retries,
+                connect_timeout=connect_timeout,
+                record_time_budget=record_time_budget,
+                max_body_size=max_body_size,
+                max_triples=max_triples,
+            )
+
+    def get_gather_deadline(self, harvest_config_dict):
+        return get_harvester_int_setting(harvest_config_dict, GATHER_DEADLINE, 0)
+
     def setup_record_to_package_converter(self, harvest_url, harvest_config_dict):
+        self._setup_content_blob_store(harvest_config_dict)
+        self._setup_graph_cache()
+        # Label resolution in the import stage makes requests to vocabulary hosts
+        self._setup_host_limiters()
+        self.batch_import = get_harvester_setting(harvest_config_dict, BATCH_IMPORT, False)
+        self.dependency_timeout = get_harvester_int_setting(
+            harvest_config_dict, DEPENDENCY_TIMEOUT, DEFAULT_DEPENDENCY_TIMEOUT
+        )
+
         if PROFILE in harvest_config_dict:
-            self.record_to_package_converter = FairDataPointRecordToPackageConverter(
-                harvest_config_dict.get(PROFILE)
-            )
+            profile = harvest_config_dict.get(PROFILE)
+            # Keep the converter of the previous harvest object, so its parser and profiles are reused
+            if getattr(self.record_to_package_converter, "profile", None) != profile:
+                self.record_to_package_converter = FairDataPointRecordToPackageConverter(profile)
         else:
             raise Exception("[{0}] not found in harvester config JSON".format(PROFILE))
 
+    def _setup_content_blob_store(self, harvest_config_dict):
+        # The location of the blob store is a server setting, the minimum size can be overridden per harvester
+        blob_store_path = get_blob_store_path()
+        if blob_store_path:
+            self.content_blob_store = ContentBlobStore(
+                blob_store_path,
+                min_size=get_harvester_int_setting(
+                    harvest_config_dict, BLOB_STORE_MIN_SIZE, DEFAULT_BLOB_STORE_MIN_SIZE
+                ),
+            )
+        else:
+            self.content_blob_store = None
+
+    def _get_record(self, identifier):
+        # The graph is needed for the dependencies of the record, regardless of the graph cache
+        return self.record_provider.get_record_with_graph_by_id(identifier)
+
+    def _get_records(self, identifiers):
+        return self.record_provider.get_records_with_graphs_by_ids(identifiers)
+
+    def _get_record_dependencies(self, guid, graph):
+        # A dataset depends on the series it is a member of
+        identifier = Identifier(guid)
+        if graph is None or identifier.get_id_type() != "dataset":
+            return []
+        return sorted(
+            str(series) for series in graph.objects(URIRef(identifier.get_id_value()), DCAT.inSeries)
+        )
+
+    def _setup_graph_cache(self):
+        # The cache outlives the setup of a single harvest object, it is only replaced when its size is changed
+        graph_cache_size = get_graph_cache_size()
+        if graph_cache_size <= 0:
+            self.graph_cache = None
+        elif self.graph_cache is None or self.graph_cache.max_size != graph_cache_size:
+            self.graph_cache = GraphCache(graph_cache_size)
+
+    @staticmethod
+    def _setup_host_limiters():
+        # The limiters keep what they learned about each host unless the settings are changed
+        host_limiters.configure(
+            rate=get_host_rate_limit(), max_concurrency=get_host_max_concurrency()
+        )
+
     @staticmethod
     def info():
         return {
-            "name": "fair_data_point_harvester",
+            "name": HARVESTER_TYPE,
             "title": "FAIR data point harvester",
             "description": "Harvester for end points implementing the FAIR data point protocol",
         }
@@ -4,6 +4,8 @@
 from __future__ import annotations
 
 import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
 from urllib.parse import urlparse
 
 from ckan.plugins import toolkit
@@ -76,6 +78,28 @@ NESTED_FIELD_TRANSLATIONS = {
     "publisher": {"publisher_type", "type"},
 }
 
+_skip_label_resolution = ContextVar("skip_label_resolution", default=False)
+
+
+@contextmanager
+def skip_label_resolution():
+    """Context in which profiles do not resolve labels
+
+    Label resolution calls CKAN actions, so it has to be skipped when records are converted
+    outside of the CKAN process. The caller is then responsible for calling `resolve_labels`
+    on the resulting package dictionaries.
+    """
+    token = _skip_label_resolution.set(True)
+    try:
+        yield
+    finally:
+        _skip_label_resolution.reset(token)
+
+
+def is_label_resolution_skipped() -> bool:
+    """Returns True within a `skip_label_resolution` context"""
+    return _skip_label_resolution.get()
+
 
 def resolve_labels(package_dict: dict) -> int:
     """Resolves labels and updates the database
@@ -7,9 +7,14 @@
 import ckan.plugins as plugins
 import ckan.plugins.toolkit as toolkit
 
+from ckanext.fairdatapoint import actions, cli
+
 
 class FairdatapointPlugin(plugins.SingletonPlugin):
     plugins.implements(plugins.IConfigurer)
+    plugins.implements(plugins.IClick)
+    plugins.implements(plugins.IActions)
+    plugins.implements(plugins.IAuthFunctions)
 
     # IConfigurer
 
@@ -17,3 +22,18 @@ class FairdatapointPlugin(plugins.SingletonPlugin):
         toolkit.add_template_directory(config_, "templates")
         toolkit.add_public_directory(config_, "public")
         toolkit.add_resource("fanstatic", "fairdatapoint")
+
+    # IClick
+
+    def get_commands(self):
+        return cli.get_commands()
+
+    # IActions
+
+    def get_actions(self):
+        return actions.get_actions()
+
+    # IAuthFunctions
+
+    def get_auth_functions(self):
+        return actions.get_auth_functions()
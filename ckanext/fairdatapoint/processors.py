@@ -3,16 +3,57 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-only
 
-from typing import Dict, Iterable
+from functools import lru_cache
+from importlib.metadata import entry_points
+from typing import Dict, Iterable, List, Optional, Tuple
 
+import rdflib
 from rdflib import DCAT, RDF
 from rdflib.term import Node
 
-from ckanext.dcat.processors import RDFParser
+from ckanext.dcat.exceptions import RDFProfileException
+from ckanext.dcat.processors import RDF_PROFILES_ENTRY_POINT_GROUP, RDFParser
+
+
+@lru_cache(maxsize=None)
+def _load_profile_classes(profile_names: Tuple[str, ...]) -> Tuple[type, ...]:
+    # Looking up the entry points is slow, the profile classes do not change during the life of the process
+    all_entry_points = entry_points()
+    if hasattr(all_entry_points, "select"):
+        group = all_entry_points.select(group=RDF_PROFILES_ENTRY_POINT_GROUP)
+    else:
+        # Python 3.8 and 3.9 return the entry points by group
+        group = all_entry_points.get(RDF_PROFILES_ENTRY_POINT_GROUP, [])
+    profile_entry_points = {entry_point.name: entry_point for entry_point in group}
+
+    unknown_profiles = set(profile_names) - set(profile_entry_points)
+    if unknown_profiles:
+        raise RDFProfileException(f"Unknown RDF profiles: {', '.join(sorted(unknown_profiles))}")
+
+    profile_classes = []
+    for profile_name in profile_names:
+        profile_class = profile_entry_points[profile_name].load()
+        # ckanext-dcat refers to a profile by the name it is registered with
+        profile_class.name = profile_name
+        profile_classes.append(profile_class)
+    return tuple(profile_classes)
 
 
 class FairDataPointRDFParser(RDFParser):
 
+    _catalog_profiles: Optional[List] = None
+
+    def _load_profiles(self, profile_names):
+        return list(_load_profile_classes(tuple(profile_names)))
+
+    def reset(self, graph: Optional[rdflib.Graph] = None):
+        """
+        Replaces the graph of the parser, so a single parser can be used for many records. The parsing methods all
+        work on this graph, so a record is parsed once regardless of which of them are called.
+        """
+        self.g = graph if graph is not None else rdflib.ConjunctiveGraph()
+        self._catalog_profiles = None
+
     def _catalogs(self) -> Iterable[Node]:
         """
         Generator that returns all DCAT catalogs on the graph
@@ -35,10 +76,16 @@ class FairDataPointRDFParser(RDFParser):
         """
         for catalog_ref in self._catalogs():
             catalog_dict = {}
-            for profile_class in self._profiles:
-                profile = profile_class(
-                    graph=self.g, compatibility_mode=self.compatibility_mode
-                )
+            for profile in self._get_catalog_profiles():
                 profile.parse_dataset(catalog_dict, catalog_ref)
 
             yield catalog_dict
+
+    def _get_catalog_profiles(self) -> List:
+        # Profiles look up the dataset schema when created, so create them once per graph instead of per catalog
+        if self._catalog_profiles is None:
+            self._catalog_profiles = [
+                profile_class(graph=self.g, compatibility_mode=self.compatibility_mode)
+                for profile_class in self._profiles
+            ]
+        return self._catalog_profiles
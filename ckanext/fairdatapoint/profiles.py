@@ -10,7 +10,11 @@ from typing import Dict, List
 from rdflib import Namespace, URIRef
 
 from ckanext.dcat.profiles import EuropeanHealthDCATAPProfile
-from ckanext.fairdatapoint.labels import PACKAGE_REPLACE_FIELDS, resolve_labels
+from ckanext.fairdatapoint.labels import (
+    PACKAGE_REPLACE_FIELDS,
+    is_label_resolution_skipped,
+    resolve_labels,
+)
 
 log = logging.getLogger(__name__)
 
@@ -77,7 +81,8 @@ class FAIRDataPointDCATAPProfile(EuropeanHealthDCATAPProfile):
 
         dataset_dict["tags"] = validate_tags(dataset_dict.get("tags", []))
 
-        resolve_labels(dataset_dict)
+        if not is_label_resolution_skipped():
+            resolve_labels(dataset_dict)
 
         return dataset_dict
 
@@ -9,7 +9,10 @@ from rdflib import RDFS, SDO, SKOS, Graph, URIRef
 import re
 import requests
 from urllib.parse import urlparse
-from ckanext.fairdatapoint.harvesters.config import get_bioportal_api_key
+from ckanext.fairdatapoint.harvesters.config import get_bioportal_api_key, get_request_timeout
+from ckanext.fairdatapoint.harvesters.domain import transport
+from ckanext.fairdatapoint.harvesters.domain.host_limiter import host_limiters
+from ckanext.fairdatapoint.harvesters.domain.single_flight import SingleFlight
 
 log = logging.getLogger(__name__)
 
@@ -18,7 +21,8 @@ log = logging.getLogger(__name__)
 DEFAULT_LABEL_LANG = "en"
 LANG_LIST = ["en", "nl"]
 SKIP_URIS = []
-REQUEST_TIMEOUT = 100  # seconds
+
+_label_graph_loads = SingleFlight()
 
 
 class resolvable_label_resolver:
@@ -125,8 +129,8 @@ class resolvable_label_resolver:
                 "Accept": "text/turtle",
                 "User-Agent": "ckanext-fairdatapoint/harvester",
             }
-            response = requests.get(
-                wikidata_url, headers=headers, timeout=REQUEST_TIMEOUT
+            response = host_limiters.get(wikidata_url).call(
+                transport.get, wikidata_url, headers=headers, timeout=get_request_timeout()
             )
             response.raise_for_status()
             self.label_graph.parse(data=response.text, format="turtle")
@@ -166,7 +170,9 @@ class resolvable_label_resolver:
                 "Accept": "application/json",
                 "Authorization": f"apikey token={api_key}"
             }
-            response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+            response = host_limiters.get(url).call(
+                transport.get, url, headers=headers, timeout=get_request_timeout()
+            )
 
             if response.status_code == 200:
                 self.label_graph.parse(data=response.text, format="json-ld")
@@ -204,7 +210,9 @@ class resolvable_label_resolver:
                     "*/*;q=0.1"
                 )
             }
-            response = requests.get(uri, headers=headers, timeout=REQUEST_TIMEOUT)
+            response = host_limiters.get(uri).call(
+                transport.get, uri, headers=headers, timeout=get_request_timeout()
+            )
             response.raise_for_status()
 
             # Try parsing with multiple formats
@@ -248,36 +256,34 @@ class resolvable_label_resolver:
             del self.label_graph
             self.label_graph = Graph()
 
+        # Concurrent loads of the same URI into the same graph share one request and parse
+        _label_graph_loads.do((id(self.label_graph), uri_str), self._load_uri, uri_str)
+        return self.label_graph
+
+    def _load_uri(self, uri_str: str):
+        """Loads a URI into the label graph, adding it to SKIP_URIS if it cannot be loaded"""
         try:
             parsed_uri = urlparse(uri_str)
 
             # Try Wikidata special handling
             if parsed_uri.netloc in ["wikidata.org", "www.wikidata.org"]:
-                if self._load_wikidata_graph(uri_str):
-                    return self.label_graph
-                else:
+                if not self._load_wikidata_graph(uri_str):
                     SKIP_URIS.append(uri_str)
-                    return self.label_graph
+                return
 
             # Try BioOntology special handling
             if re.search(r"bioontology.org", uri_str, re.IGNORECASE):
-                if self._load_bioontology_graph(uri_str):
-                    return self.label_graph
-                else:
+                if not self._load_bioontology_graph(uri_str):
                     SKIP_URIS.append(uri_str)
-                    return self.label_graph
+                return
 
             # Try generic HTTP loading
-            if self._load_generic_graph(uri_str):
-                return self.label_graph
-            else:
+            if not self._load_generic_graph(uri_str):
                 SKIP_URIS.append(uri_str)
-                return self.label_graph
 
         except Exception as e:
             log.warning("Error loading graph from %s: %s", uri_str, str(e))
             SKIP_URIS.append(uri_str)
-        return self.label_graph
 
     def load_and_translate_uri(self, subject_uri: str | URIRef) -> list[dict[str, str]]:
         """Loads the RDF graph for a given subject, extracts labels
@@ -0,0 +1,249 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Benchmark of FairDataPointRecordToPackageConverter on the DCAT-AP and HealthDCAT-AP records in test_data.
+
+The catalogs, datasets and dataseries of the Turtle files in test_data are copied under new URLs, with a numbered
+title, to get a few hundred distinct records of each type. Every record is converted like the import stage does,
+without resolving labels, which would measure the vocabulary hosts instead. For each type the benchmark reports
+records per second, the 50th and 99th percentile of the time per record, the peak memory allocated while
+converting a record, the share of the time spent in FAIRDataPointDCATAPProfile.parse_dataset and the functions
+taking the most time.
+
+The time per record and the peak memory are compared with converter_baseline.json, and the benchmark fails when
+either is worse than its tolerance allows, or when the baseline has no entry for a type. Times are divided by the
+time of a calibration run parsing the same records with rdflib, so the baseline holds on faster and slower machines.
+To store the results of a run as the new baseline, run it with FDP_BENCHMARK_UPDATE_BASELINE=1. Datasets and
+dataseries are converted with the series support of the Health-RI fork of ckanext-dcat, so they are skipped, and
+need no baseline, where that fork is not installed.
+
+Benchmarks are not collected by a regular test run. Run them explicitly with:
+
+    pytest -s ckanext/fairdatapoint/tests/benchmarks/bench_converter_throughput.py --ckan-ini=test.ini
+"""
+
+import cProfile
+import inspect
+import json
+import os
+import pstats
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pytest
+from rdflib import DCAT, DCTERMS, RDF, Graph, Literal, URIRef
+
+from ckanext.dcat.processors import RDFParser
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_to_package_converter import (
+    FairDataPointRecordToPackageConverter,
+)
+from ckanext.fairdatapoint.labels import skip_label_resolution
+from ckanext.fairdatapoint.profiles import FAIRDataPointDCATAPProfile
+
+TEST_DATA_DIRECTORY = Path(Path(__file__).parent.parent.resolve(), "test_data")
+BASELINE_PATH = Path(Path(__file__).parent.resolve(), "converter_baseline.json")
+UPDATE_BASELINE = os.environ.get("FDP_BENCHMARK_UPDATE_BASELINE") == "1"
+
+PROFILE = "fairdatapoint_dcat_ap"
+RECORDS_PER_TYPE = 300
+CALIBRATION_REPEATS = 5
+PROFILED_RECORDS = 50
+# Regressions of more than 25% fail the benchmark, the 99th percentile is noisier and may be 50% worse
+TOLERANCE = 0.25
+TOLERANCES = {"relative_mean": TOLERANCE, "relative_p99": 0.5, "peak_kib": TOLERANCE}
+
+FIXTURES = {
+    "catalog": (DCAT.Catalog, ["fdp_catalog.ttl"]),
+    "dataset": (
+        DCAT.Dataset,
+        [
+            "dataset_898ca4b8-197b-4d40-bc81-d9cd88197670.ttl",
+            "dataset_d7129d28-b72a-437f-8db0-4f0258dd3c25_out.ttl",
+            "dataset_cbioportal.ttl",
+            "Project_27866022694497978_out.ttl",
+        ],
+    ),
+    "dataseries": (DCAT.DatasetSeries, ["fdp_multiple_parents.ttl", "root_fdp_response.ttl"]),
+}
+# Types converted with the series support of the Health-RI fork of ckanext-dcat
+SERIES_TYPES = {"dataset", "dataseries"}
+HAS_SERIES_SUPPORT = (
+    hasattr(RDFParser, "dataset_series") and "series_mapping" in inspect.signature(RDFParser.datasets).parameters
+)
+BENCHMARKED_TYPES = [
+    datatype for datatype in FIXTURES if HAS_SERIES_SUPPORT or datatype not in SERIES_TYPES
+]
+
+
+def renamed(graph: Graph, subject: URIRef, new_subject: URIRef, index: int) -> Graph:
+    """Copy of graph with subject, and the URIs below it, renamed to new_subject and a numbered title"""
+    prefix = str(subject)
+
+    def rename(node):
+        if isinstance(node, URIRef) and (node == subject or str(node).startswith(prefix + "#")):
+            return URIRef(str(new_subject) + str(node)[len(prefix):])
+        return node
+
+    copy = Graph()
+    for s, p, o in graph:
+        if s == subject and p == DCTERMS.title and isinstance(o, Literal):
+            o = Literal(f"{o} {index}", lang=o.language, datatype=o.datatype)
+        copy.add((rename(s), p, rename(o)))
+    return copy
+
+
+def build_records(datatype: str, count: int) -> List[Tuple[str, str]]:
+    """GUIDs and Turtle content of count records of a type, copied from the test_data records of that type"""
+    rdf_type, file_names = FIXTURES[datatype]
+    templates = []
+    for file_name in file_names:
+        graph = Graph().parse(Path(TEST_DATA_DIRECTORY, file_name))
+        templates.extend((graph, subject) for subject in sorted(graph.subjects(RDF.type, rdf_type)))
+    records = []
+    for index in range(count):
+        graph, subject = templates[index % len(templates)]
+        new_subject = URIRef(f"{subject}/benchmark-{index}")
+        content = renamed(graph, subject, new_subject, index).serialize(format="turtle")
+        records.append((f"{datatype}={new_subject}", content))
+    return records
+
+
+def calibrate(records: List[Tuple[str, str]]) -> float:
+    """Best time per record of parsing the records with rdflib, the unit of the normalized times"""
+    timings = []
+    for _ in range(CALIBRATION_REPEATS):
+        start = time.perf_counter()
+        for _, content in records:
+            Graph().parse(data=content, format="turtle")
+        timings.append((time.perf_counter() - start) / len(records))
+    return min(timings)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def load_baseline() -> Dict[str, dict]:
+    if not BASELINE_PATH.exists():
+        return {}
+    return json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+
+
+def store_baseline(datatype: str, result: dict):
+    baseline = load_baseline()
+    baseline[datatype] = result
+    BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+def test_baseline_covers_every_type():
+    # A type without a baseline would never be compared, so its regressions would go unnoticed
+    if UPDATE_BASELINE:
+        pytest.skip("The baseline is being stored")
+    missing = sorted(set(BENCHMARKED_TYPES) - set(load_baseline()))
+    assert not missing, (
+        f"{BASELINE_PATH.name} has no baseline for {', '.join(missing)}, "
+        f"run with FDP_BENCHMARK_UPDATE_BASELINE=1 to store one"
+    )
+
+
+@pytest.fixture
+def timed_parse_dataset(monkeypatch):
+    # Seconds spent in the parse_dataset of the profile
+    timing = {"seconds": 0.0}
+    parse_dataset = FAIRDataPointDCATAPProfile.parse_dataset
+
+    def timed(self, dataset_dict, dataset_ref):
+        start = time.perf_counter()
+        try:
+            return parse_dataset(self, dataset_dict, dataset_ref)
+        finally:
+            timing["seconds"] += time.perf_counter() - start
+
+    monkeypatch.setattr(FAIRDataPointDCATAPProfile, "parse_dataset", timed)
+    return timing
+
+
+@pytest.mark.ckan_config("ckan.plugins", "scheming_datasets")
+@pytest.mark.usefixtures("with_plugins")
+@pytest.mark.parametrize(
+    "datatype",
+    [
+        pytest.param(
+            datatype,
+            marks=pytest.mark.skipif(
+                datatype not in BENCHMARKED_TYPES, reason="requires the Health-RI fork of ckanext-dcat"
+            ),
+        )
+        for datatype in FIXTURES
+    ],
+)
+def test_benchmark_converter(datatype, timed_parse_dataset):
+    records = build_records(datatype, RECORDS_PER_TYPE)
+    converter = FairDataPointRecordToPackageConverter(profile=PROFILE)
+    calibration = calibrate(records)
+
+    with skip_label_resolution():
+        # Warm up, the first record loads the profiles and the scheming schema
+        assert converter.record_to_package(*records[0]) is not None
+
+        timed_parse_dataset["seconds"] = 0.0
+        latencies = []
+        start = time.perf_counter()
+        for guid, content in records:
+            record_start = time.perf_counter()
+            assert converter.record_to_package(guid, content) is not None
+            latencies.append(time.perf_counter() - record_start)
+        seconds = time.perf_counter() - start
+        profile_share = timed_parse_dataset["seconds"] / seconds
+
+        tracemalloc.start()
+        peaks = []
+        try:
+            for guid, content in records:
+                tracemalloc.clear_traces()
+                converter.record_to_package(guid, content)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        for guid, content in records[:PROFILED_RECORDS]:
+            converter.record_to_package(guid, content)
+        profiler.disable()
+
+    latencies.sort()
+    result = {
+        "records_per_second": round(len(records) / seconds, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        # Times per record in units of the calibration time, comparable between machines
+        "relative_mean": round(statistics.mean(latencies) / calibration, 3),
+        "relative_p99": round(percentile(latencies, 0.99) / calibration, 3),
+        "peak_kib": round(statistics.mean(peaks) / 1024, 1),
+    }
+
+    print(
+        f"\n{datatype:<10} {result['records_per_second']:8.1f} records/s, p50 {result['p50_ms']:7.2f} ms, "
+        f"p99 {result['p99_ms']:7.2f} ms, {result['peak_kib']:8.1f} KiB peak per record, "
+        f"{profile_share:5.1%} in parse_dataset"
+    )
+    pstats.Stats(profiler).sort_stats("tottime").print_stats(10)
+
+    if UPDATE_BASELINE:
+        store_baseline(datatype, result)
+        return
+    baseline = load_baseline().get(datatype)
+    if baseline is None:
+        pytest.fail(f"No baseline for {datatype}, run with FDP_BENCHMARK_UPDATE_BASELINE=1 to store one")
+    regressions = [
+        f"{key} {result[key]} > {baseline[key]}"
+        for key, tolerance in TOLERANCES.items()
+        if result[key] > baseline[key] * (1 + tolerance)
+    ]
+    assert not regressions, f"{datatype} regressed against {BASELINE_PATH.name}: {', '.join(regressions)}"
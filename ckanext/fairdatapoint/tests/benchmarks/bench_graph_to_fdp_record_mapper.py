@@ -0,0 +1,88 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Benchmark of GraphToFdpRecordMapper on large catalog graphs.
+
+Benchmarks are not collected by a regular test run. Run them explicitly with:
+
+    pytest -s ckanext/fairdatapoint/tests/benchmarks/bench_graph_to_fdp_record_mapper.py
+"""
+
+import time
+from pathlib import Path
+
+import pytest
+from rdflib import Graph, Namespace, URIRef
+
+from ckanext.fairdatapoint.harvesters.domain.graph_to_fdp_record_mapper import (
+    GraphToFdpRecordMapper,
+)
+
+LDP = Namespace("http://www.w3.org/ns/ldp#")
+
+TEST_DATA_DIRECTORY = Path(Path(__file__).parent.parent.resolve(), "test_data")
+CATALOG_URL = "https://fair.healthinformationportal.eu/catalog/1c75c2c9-d2cc-44cb-aaa8-cf8c11515c8d"
+CONTAINER_URL = "https://fair.healthinformationportal.eu/dataset/"
+DATASET_URL = "https://fair.healthinformationportal.eu/dataset/898ca4b8-197b-4d40-bc81-d9cd88197670"
+
+CATALOG_SIZES = [100, 1000, 5000]
+REPEATS = 5
+
+
+def build_catalog_graph(number_of_children: int) -> Graph:
+    """
+    Catalog page from test_data with a given number of children. Each child carries a copy of the metadata of a
+    dataset from test_data, so the graph is dominated by triples which are not ldp:contains.
+    """
+    graph = Graph().parse(Path(TEST_DATA_DIRECTORY, "fdp_catalog.ttl"))
+    dataset_graph = Graph().parse(
+        Path(TEST_DATA_DIRECTORY, "dataset_898ca4b8-197b-4d40-bc81-d9cd88197670.ttl")
+    )
+    dataset_triples = list(dataset_graph.predicate_objects(subject=URIRef(DATASET_URL)))
+
+    for index in range(number_of_children):
+        child = URIRef(f"{CONTAINER_URL}benchmark-{index}")
+        graph.add((URIRef(CONTAINER_URL), LDP.contains, child))
+        for predicate, obj in dataset_triples:
+            graph.add((child, predicate, obj))
+    return graph
+
+
+def full_scan_children(rdf_graph: Graph) -> set:
+    """Reference implementation that compares the predicate of every triple in Python"""
+    children = set()
+    for subject, predicate, obj in rdf_graph:
+        if predicate == LDP.contains:
+            children.add(str(obj))
+    return children
+
+
+def best_of(function, *args) -> float:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+@pytest.mark.parametrize("number_of_children", CATALOG_SIZES)
+def test_benchmark_map_catalog(number_of_children):
+    graph = build_catalog_graph(number_of_children)
+    mapper = GraphToFdpRecordMapper(CATALOG_URL)
+
+    record = mapper.map(graph)
+    assert record.is_catalog()
+    assert record.children() == full_scan_children(graph)
+
+    full_scan = best_of(full_scan_children, graph)
+    indexed = best_of(mapper.map, graph)
+
+    print(
+        f"\n{number_of_children:>6} children, {len(graph):>7} triples: "
+        f"full scan {full_scan * 1000:8.2f} ms, indexed {indexed * 1000:8.2f} ms, "
+        f"speedup {full_scan / indexed:6.1f}x"
+    )
+    assert indexed < full_scan
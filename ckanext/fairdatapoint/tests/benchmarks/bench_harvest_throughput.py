@@ -0,0 +1,128 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Benchmark of the throughput of the gather, fetch and import stages on a synthetic FAIR data point.
+
+The record provider crawls a synthetic FDP served from a local HTTP server (gather), then fetches and completes every
+record it found (fetch), and the records are converted to package dicts (import, without writing them to the
+database). Each stage reports records and requests per second.
+
+Benchmarks are not collected by a regular test run. Run them explicitly with:
+
+    pytest -s ckanext/fairdatapoint/tests/benchmarks/bench_harvest_throughput.py --ckan-ini=test.ini
+
+A single size is selected with -k, for example -k 10k. Crawling 100k records takes a while.
+"""
+
+import time
+
+import pytest
+
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider import (
+    FETCH_CONCURRENCY,
+    FairDataPointRecordProvider,
+)
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_to_package_converter import (
+    FairDataPointRecordToPackageConverter,
+)
+from ckanext.fairdatapoint.tests.benchmarks.synthetic_fdp import SyntheticFdp, SyntheticFdpServer
+
+RECORD_COUNTS = {"1k": 1000, "10k": 10000, "100k": 100000}
+CATALOGS = 10
+DISTRIBUTIONS = 2
+# A series for every hundred datasets, and a contact at ORCID for every fifty
+SERIES_SHARE = 100
+ORCID_CONTACT_SHARE = 50
+LATENCY = 0.0  # seconds added to every response
+ERROR_RATE = 0.0
+PROFILE = "fairdatapoint_dcat_ap"
+
+
+def synthetic_fdp(records: int) -> SyntheticFdp:
+    series = records // SERIES_SHARE
+    return SyntheticFdp(
+        datasets=records - series,
+        catalogs=CATALOGS,
+        distributions=DISTRIBUTIONS,
+        series=series,
+        orcid_contacts=max(1, records // ORCID_CONTACT_SHARE),
+    )
+
+
+def report(stage: str, records: int, seconds: float, requests: int = None):
+    line = f"\n{stage:<8} {records:>7} records in {seconds:8.2f} s: {records / seconds:9.1f} records/s"
+    if requests is not None:
+        line += f", {requests:>7} requests, {requests / seconds:9.1f} requests/s"
+    print(line)
+
+
+@pytest.fixture(scope="module", params=list(RECORD_COUNTS.values()), ids=list(RECORD_COUNTS))
+def server(request):
+    fdp = synthetic_fdp(request.param)
+    with SyntheticFdpServer(fdp, latency=LATENCY, error_rate=ERROR_RATE) as server:
+        yield server
+
+
+@pytest.fixture(scope="module")
+def crawled(server):
+    # Record IDs found by the gather stage, shared by the fetch benchmark
+    return {}
+
+
+@pytest.fixture(scope="module")
+def fetched(server):
+    # Records of the fetch stage, shared by the convert benchmark
+    return {}
+
+
+def test_benchmark_crawl(server, crawled):
+    provider = FairDataPointRecordProvider(server.root_url, fetch_concurrency=FETCH_CONCURRENCY)
+    server.reset_statistics()
+
+    start = time.perf_counter()
+    guids = list(provider.get_record_ids())
+    seconds = time.perf_counter() - start
+
+    report("crawl", len(guids), seconds, server.requests)
+    assert len(guids) == server.fdp.records
+    crawled["guids"] = guids
+
+
+def test_benchmark_fetch(server, crawled, fetched):
+    guids = crawled.get("guids")
+    if guids is None:
+        pytest.skip("Crawl benchmark did not run")
+    provider = FairDataPointRecordProvider(server.root_url, fetch_concurrency=FETCH_CONCURRENCY)
+    server.reset_statistics()
+
+    start = time.perf_counter()
+    records = {}
+    for guid, fetched_record in provider.get_records_by_ids(guids):
+        assert not isinstance(fetched_record, Exception), fetched_record
+        records[guid] = fetched_record
+    seconds = time.perf_counter() - start
+
+    report("fetch", len(records), seconds, server.requests)
+    assert len(records) == len(guids)
+    fetched["records"] = records
+
+
+@pytest.mark.ckan_config("ckan.plugins", "scheming_datasets")
+@pytest.mark.usefixtures("with_plugins")
+def test_benchmark_convert(fetched):
+    records = fetched.get("records")
+    if records is None:
+        pytest.skip("Fetch benchmark did not run")
+    converter = FairDataPointRecordToPackageConverter(profile=PROFILE)
+
+    start = time.perf_counter()
+    converted = 0
+    for guid, record in records.items():
+        if converter.record_to_package(guid, record) is not None:
+            converted += 1
+    seconds = time.perf_counter() - start
+
+    report("convert", converted, seconds)
+    assert converted == len(records)
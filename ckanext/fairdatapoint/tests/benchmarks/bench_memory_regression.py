@@ -0,0 +1,128 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Memory regression test of long harvest jobs.
+
+Workers run harvest jobs for days, so memory which a job leaves behind adds up: labels kept by the label resolver,
+URIs added to SKIP_URIS, records and graphs kept in caches. This runs harvest jobs on a synthetic FAIR data point in
+a single process: the gather stage crawls it, the fetch stage completes every record, and the labels of the
+vocabulary terms of the records, on the FDP host, are resolved like the import stage does. The CKAN part of label
+resolution, looking up and storing translations in the database, is left out.
+
+The convert stage is not covered: records are not converted to packages, and the terms are taken from the graphs of
+the records instead. Converting datasets and series needs the Health-RI fork of ckanext-dcat, and the memory a
+conversion allocates is measured per record by bench_converter_throughput, though not what it retains.
+
+A first job warms up imports and caches. A second job finds records with other content and themes from other
+vocabulary terms, so its labels and unresolvable terms are not in the label graph and SKIP_URIS yet. The memory still
+allocated after the second job, compared with before it, is divided by the number of records, and the test fails
+when this passes RETAINED_BYTES_PER_RECORD. The lines allocating the most retained memory are printed, with the
+growth of the label graph and SKIP_URIS.
+
+Benchmarks are not collected by a regular test run. Run them explicitly with:
+
+    pytest -s ckanext/fairdatapoint/tests/benchmarks/bench_memory_regression.py --ckan-ini=test.ini
+"""
+
+import gc
+import tracemalloc
+
+from rdflib import URIRef
+
+from ckanext.fairdatapoint import resolver
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider import (
+    FETCH_CONCURRENCY,
+    FairDataPointRecordProvider,
+)
+from ckanext.fairdatapoint.tests.benchmarks.synthetic_fdp import SyntheticFdp, SyntheticFdpServer
+
+DATASETS = 1000
+SERIES = 10
+VOCABULARY_TERMS = 100
+MISSING_VOCABULARY_TERMS = 10
+RETAINED_BYTES_PER_RECORD = 1024
+# Allocation sites are grouped by line, more frames would show their callers but slow the harvest down
+TRACEBACK_FRAMES = 1
+TOP_ALLOCATION_SITES = 15
+
+
+def synthetic_fdp(job: int) -> SyntheticFdp:
+    # Every job gets other content and vocabulary terms, so it does not only find what earlier jobs cached
+    return SyntheticFdp(
+        datasets=DATASETS,
+        catalogs=4,
+        distributions=2,
+        series=SERIES,
+        orcid_contacts=DATASETS // 50,
+        vocabulary_terms=VOCABULARY_TERMS,
+        missing_vocabulary_terms=MISSING_VOCABULARY_TERMS,
+        vocabulary_offset=job * VOCABULARY_TERMS,
+        seed=job,
+    )
+
+
+def harvest_job(server: SyntheticFdpServer) -> int:
+    """Gathers and fetches the records of the FDP and resolves the labels of their terms, returns the record count"""
+    provider = FairDataPointRecordProvider(server.root_url, fetch_concurrency=FETCH_CONCURRENCY)
+    label_resolver = resolver.resolvable_label_resolver()
+    # Vocabularies on other hosts are not requested
+    vocabulary = f"{server.url}/vocabulary/"
+
+    guids = list(provider.get_record_ids())
+    for guid, fetched in provider.get_records_with_graphs_by_ids(guids):
+        assert not isinstance(fetched, Exception), fetched
+        _, graph = fetched
+        for term in set(graph.objects()):
+            if isinstance(term, URIRef) and str(term).startswith(vocabulary):
+                label_resolver.load_and_translate_uri(term)
+    return len(guids)
+
+
+def traced_memory() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def test_memory_retained_per_record():
+    with SyntheticFdpServer(synthetic_fdp(0)) as server:
+        tracemalloc.start(TRACEBACK_FRAMES)
+        try:
+            harvest_job(server)
+
+            before = traced_memory()
+            snapshot_before = tracemalloc.take_snapshot()
+            label_triples_before = len(resolver.resolvable_label_resolver.label_graph)
+            skip_uris_before = len(resolver.SKIP_URIS)
+
+            server.fdp = synthetic_fdp(1)
+            records = harvest_job(server)
+
+            after = traced_memory()
+            snapshot_after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    retained_per_record = (after - before) / records
+    print(
+        f"\n{records} records: {after - before} bytes retained, {retained_per_record:.1f} bytes per record, "
+        f"peak {peak / 1024 / 1024:.1f} MiB"
+    )
+    print(
+        f"Label graph grew by {len(resolver.resolvable_label_resolver.label_graph) - label_triples_before} triples, "
+        f"SKIP_URIS by {len(resolver.SKIP_URIS) - skip_uris_before} URIs"
+    )
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ]
+    statistics = snapshot_after.filter_traces(filters).compare_to(snapshot_before.filter_traces(filters), "lineno")
+    print(f"Top {TOP_ALLOCATION_SITES} allocation sites of retained memory:")
+    for statistic in statistics[:TOP_ALLOCATION_SITES]:
+        print(f"  {statistic}")
+
+    assert retained_per_record <= RETAINED_BYTES_PER_RECORD, (
+        f"{retained_per_record:.1f} bytes retained per record, more than {RETAINED_BYTES_PER_RECORD}"
+    )
@@ -0,0 +1,389 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+"""
+Synthetic FAIR data point served from a local HTTP server, to measure how gather, fetch and import scale.
+
+The FDP has a root, catalogs, dataset series, datasets and distributions, and contact points with an ORCID URI
+whose public record is served by the same server, as are the terms of a vocabulary of themes. Documents are
+generated from their URL when they are requested, so an FDP of 100k records takes no memory, and the same settings
+and seed always give the same documents. The server can add latency to every response and answer a share of
+requests with an error, to measure retries and the host limits.
+
+Documents are written as Turtle with string templates instead of being serialized by rdflib, so the server, running
+in the process being measured, takes little of its CPU.
+"""
+
+import json
+import random
+import threading
+import time
+import uuid
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional, Tuple
+
+TURTLE_CONTENT_TYPE = "text/turtle;charset=utf-8"
+JSON_CONTENT_TYPE = "application/json"
+
+PREFIXES = """@prefix dcat: <http://www.w3.org/ns/dcat#> .
+@prefix dcterms: <http://purl.org/dc/terms/> .
+@prefix fdp: <https://w3id.org/fdp/fdp-o#> .
+@prefix foaf: <http://xmlns.com/foaf/0.1/> .
+@prefix ldp: <http://www.w3.org/ns/ldp#> .
+@prefix skos: <http://www.w3.org/2004/02/skos/core#> .
+@prefix vcard: <http://www.w3.org/2006/vcard/ns#> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+
+"""
+
+KEYWORDS = [
+    "cancer", "cardiology", "cohort", "covid-19", "diabetes", "epidemiology", "genomics", "imaging", "mental health",
+    "microbiome", "oncology", "pediatrics", "proteomics", "rare diseases", "registry", "survey",
+]
+THEMES = [
+    "http://publications.europa.eu/resource/authority/data-theme/HEAL",
+    "http://publications.europa.eu/resource/authority/data-theme/SOCI",
+    "http://publications.europa.eu/resource/authority/data-theme/TECH",
+]
+LANGUAGES = [
+    "http://publications.europa.eu/resource/authority/language/ENG",
+    "http://publications.europa.eu/resource/authority/language/NLD",
+]
+MEDIA_TYPES = ["text/csv", "application/json", "application/zip", "text/turtle"]
+WORDS = [
+    "analysis", "blood", "clinical", "collected", "data", "follow-up", "health", "hospital", "measurements",
+    "national", "outcomes", "participants", "patients", "population", "samples", "study", "treatment", "visits",
+]
+
+
+class SyntheticFdp:
+    """
+    Generates the documents of a synthetic FDP. Datasets are spread over the catalogs, and when there are series
+    every dataset is part of one, which is part of the catalog of the dataset. Each dataset has a number of
+    distributions, and a contact point which is one of orcid_contacts ORCID URIs, or a vCard when there are none.
+    With vocabulary_terms, the themes of datasets are terms of a vocabulary on the FDP host, so labels can be
+    resolved without other hosts. The missing_vocabulary_terms last terms of the vocabulary cannot be resolved.
+    Terms are numbered from vocabulary_offset, so FDPs with different offsets share no terms.
+    """
+
+    def __init__(
+        self,
+        datasets: int = 1000,
+        catalogs: int = 1,
+        distributions: int = 1,
+        series: int = 0,
+        orcid_contacts: int = 0,
+        vocabulary_terms: int = 0,
+        missing_vocabulary_terms: int = 0,
+        vocabulary_offset: int = 0,
+        seed: int = 0,
+    ):
+        self.datasets = max(0, datasets)
+        self.catalogs = max(1, catalogs)
+        self.distributions = max(0, distributions)
+        self.series = max(0, series)
+        self.orcid_contacts = max(0, orcid_contacts)
+        self.vocabulary_terms = max(0, vocabulary_terms)
+        self.missing_vocabulary_terms = max(0, missing_vocabulary_terms) if vocabulary_terms else 0
+        self.vocabulary_offset = max(0, vocabulary_offset)
+        self.seed = seed
+
+    @property
+    def records(self) -> int:
+        """Number of records a harvest without catalogs finds"""
+        return self.datasets + self.series
+
+    def _random(self, kind: str, index: int) -> random.Random:
+        # Seeded by the document, so a document does not depend on the order in which documents are requested
+        return random.Random(f"{self.seed}:{kind}:{index}")
+
+    def _series_of_dataset(self, index: int) -> Optional[int]:
+        return index % self.series if self.series else None
+
+    def _catalog_of_series(self, index: int) -> int:
+        return index % self.catalogs
+
+    def _catalog_of_dataset(self, index: int) -> int:
+        series = self._series_of_dataset(index)
+        return self._catalog_of_series(series) if series is not None else index % self.catalogs
+
+    def orcid_id(self, index: int) -> str:
+        return f"0000-0002-{index // 10000 % 10000:04d}-{index % 10000:04d}"
+
+    def orcid_name(self, index: int) -> str:
+        rng = self._random("orcid", index)
+        return f"{rng.choice(['Anna', 'Bram', 'Chen', 'Daan', 'Eva', 'Fatima'])} Synthetic {index}"
+
+    def record_urls(self, base_url: str) -> Iterator[str]:
+        """URLs of the series and datasets, the records a harvest without catalogs finds"""
+        for index in range(self.series):
+            yield f"{base_url}/series/{index}"
+        for index in range(self.datasets):
+            yield f"{base_url}/dataset/{index}"
+
+    def document(self, base_url: str, path: str) -> Optional[Tuple[str, bytes]]:
+        """Content type and body of the document at path, None when there is no document at path"""
+        parts = path.strip("/").split("/")
+        try:
+            if parts == [""]:
+                return TURTLE_CONTENT_TYPE, self._root(base_url).encode("utf-8")
+            if len(parts) == 2 and parts[0] == "catalog":
+                return TURTLE_CONTENT_TYPE, self._catalog(base_url, int(parts[1])).encode("utf-8")
+            if len(parts) == 2 and parts[0] == "series":
+                return TURTLE_CONTENT_TYPE, self._series(base_url, int(parts[1])).encode("utf-8")
+            if len(parts) == 2 and parts[0] == "dataset":
+                return TURTLE_CONTENT_TYPE, self._dataset(base_url, int(parts[1])).encode("utf-8")
+            if len(parts) == 2 and parts[0] == "distribution":
+                dataset, distribution = (int(part) for part in parts[1].split("-"))
+                return TURTLE_CONTENT_TYPE, self._distribution(base_url, dataset, distribution).encode("utf-8")
+            if len(parts) == 2 and parts[0] == "vocabulary":
+                return TURTLE_CONTENT_TYPE, self._vocabulary_term(base_url, int(parts[1])).encode("utf-8")
+            if len(parts) == 3 and parts[0] == "orcid" and parts[2] == "public-record.json":
+                return JSON_CONTENT_TYPE, self._orcid_record(parts[1]).encode("utf-8")
+        except (KeyError, ValueError):
+            return None
+        return None
+
+    def _root(self, base_url: str) -> str:
+        catalogs = ", ".join(f"<{base_url}/catalog/{index}>" for index in range(self.catalogs))
+        return PREFIXES + (
+            f'<{base_url}/> a fdp:MetadataService ;\n'
+            f'    dcterms:title "Synthetic FAIR data point"@en ;\n'
+            f"    ldp:contains {catalogs} .\n"
+        )
+
+    def _catalog(self, base_url: str, index: int) -> str:
+        if not 0 <= index < self.catalogs:
+            raise KeyError(index)
+        url = f"{base_url}/catalog/{index}"
+        children = [f"<{base_url}/series/{s}>" for s in range(self.series) if self._catalog_of_series(s) == index]
+        if not self.series:
+            children.extend(
+                f"<{base_url}/dataset/{d}>" for d in range(index, self.datasets, self.catalogs)
+            )
+        contains = f" ;\n    ldp:contains {', '.join(children)}" if children else ""
+        return PREFIXES + (
+            f"<{url}> a dcat:Catalog, dcat:Resource ;\n"
+            f'    dcterms:title "Synthetic catalog {index}"@en ;\n'
+            f'    dcterms:description "Catalog {index} of the synthetic FAIR data point"@en ;\n'
+            f"    dcterms:isPartOf <{base_url}/>{contains} .\n"
+        )
+
+    def _series(self, base_url: str, index: int) -> str:
+        if not 0 <= index < self.series:
+            raise KeyError(index)
+        url = f"{base_url}/series/{index}"
+        children = ", ".join(f"<{base_url}/dataset/{d}>" for d in range(index, self.datasets, self.series))
+        contains = f" ;\n    ldp:contains {children}" if children else ""
+        return PREFIXES + (
+            f"<{url}> a dcat:DatasetSeries, dcat:Resource ;\n"
+            f'    dcterms:title "Synthetic series {index}"@en ;\n'
+            f'    dcterms:description "Datasets of series {index} collected over the years"@en ;\n'
+            f"    dcterms:isPartOf <{base_url}/catalog/{self._catalog_of_series(index)}>{contains} .\n"
+        )
+
+    def _dataset(self, base_url: str, index: int) -> str:
+        if not 0 <= index < self.datasets:
+            raise KeyError(index)
+        rng = self._random("dataset", index)
+        url = f"{base_url}/dataset/{index}"
+        issued = f"20{rng.randint(10, 23)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00+00:00"
+        keywords = ", ".join(f'"{keyword}"@en' for keyword in rng.sample(KEYWORDS, rng.randint(1, 4)))
+        description = " ".join(rng.choice(WORDS) for _ in range(rng.randint(10, 60)))
+        lines = [
+            f"<{url}> a dcat:Dataset, dcat:Resource",
+            f'dcterms:title "Synthetic dataset {index}"@en',
+            f'dcterms:description "{description}"@en',
+            f'dcterms:identifier "{uuid.UUID(int=rng.getrandbits(128))}"',
+            f'dcterms:issued "{issued}"^^xsd:dateTime',
+            f'dcterms:modified "{issued}"^^xsd:dateTime',
+            f"dcterms:isPartOf <{base_url}/catalog/{self._catalog_of_dataset(index)}>",
+            f"dcterms:language <{rng.choice(LANGUAGES)}>",
+            "dcterms:license <https://creativecommons.org/licenses/by/4.0/>",
+            f'dcterms:publisher [ a foaf:Agent ; foaf:name "Synthetic publisher {rng.randint(0, 99)}" ]',
+            # Defaults an FDP adds, which the record provider removes
+            f"dcterms:accessRights <{url}#accessRights>",
+            f"dcterms:conformsTo <{base_url}/profile/dataset>",
+            f"dcat:keyword {keywords}",
+            f"dcat:theme <{self._theme(base_url, rng)}>",
+            f'fdp:metadataIssued "{issued}"^^xsd:dateTime',
+            f'fdp:metadataModified "{issued}"^^xsd:dateTime',
+        ]
+        if self.orcid_contacts:
+            contact = index % self.orcid_contacts
+            lines.append(f"dcat:contactPoint <{base_url}/orcid/{self.orcid_id(contact)}>")
+        else:
+            lines.append(
+                f'dcat:contactPoint [ a vcard:Kind ; vcard:fn "Contact {index}" ; '
+                f"vcard:hasEmail <mailto:contact-{index}@example.org> ]"
+            )
+        if self.distributions:
+            distributions = ", ".join(
+                f"<{base_url}/distribution/{index}-{d}>" for d in range(self.distributions)
+            )
+            lines.append(f"dcat:distribution {distributions}")
+        series = self._series_of_dataset(index)
+        if series is not None:
+            lines.append(f"dcat:inSeries <{base_url}/series/{series}>")
+        return PREFIXES + " ;\n    ".join(lines) + " .\n\n" + (
+            f"<{url}#accessRights> a dcterms:RightsStatement ;\n"
+            f'    dcterms:description "This resource has no access restriction" .\n'
+        )
+
+    def _theme(self, base_url: str, rng: random.Random) -> str:
+        if not self.vocabulary_terms:
+            return rng.choice(THEMES)
+        return f"{base_url}/vocabulary/{self.vocabulary_offset + rng.randrange(self.vocabulary_terms)}"
+
+    def _vocabulary_term(self, base_url: str, index: int) -> str:
+        if not 0 <= index - self.vocabulary_offset < self.vocabulary_terms - self.missing_vocabulary_terms:
+            raise KeyError(index)
+        return PREFIXES + (
+            f"<{base_url}/vocabulary/{index}> a skos:Concept ;\n"
+            f'    skos:prefLabel "Theme {index}"@en, "Thema {index}"@nl .\n'
+        )
+
+    def _distribution(self, base_url: str, dataset: int, index: int) -> str:
+        if not 0 <= dataset < self.datasets or not 0 <= index < self.distributions:
+            raise KeyError(index)
+        rng = self._random("distribution", dataset * max(1, self.distributions) + index)
+        url = f"{base_url}/distribution/{dataset}-{index}"
+        media_type = rng.choice(MEDIA_TYPES)
+        return PREFIXES + (
+            f"<{url}> a dcat:Distribution, dcat:Resource ;\n"
+            f'    dcterms:title "Distribution {index} of synthetic dataset {dataset}"@en ;\n'
+            f'    dcterms:description "Download of synthetic dataset {dataset}"@en ;\n'
+            f"    dcterms:isPartOf <{base_url}/dataset/{dataset}> ;\n"
+            f"    dcterms:license <https://creativecommons.org/licenses/by/4.0/> ;\n"
+            f"    dcterms:accessRights <{url}#accessRights> ;\n"
+            f"    dcterms:conformsTo <{base_url}/profile/distribution> ;\n"
+            f"    dcat:accessURL <https://data.example.org/download/{dataset}/{index}> ;\n"
+            f"    dcat:mediaType <https://www.iana.org/assignments/media-types/{media_type}> ;\n"
+            f'    dcat:byteSize "{rng.randint(1000, 10 ** 9)}"^^xsd:nonNegativeInteger .\n'
+        )
+
+    def _orcid_record(self, orcid_id: str) -> str:
+        prefix = "0000-0002-"
+        if not orcid_id.startswith(prefix):
+            raise KeyError(orcid_id)
+        high, low = (int(part) for part in orcid_id[len(prefix):].split("-"))
+        index = high * 10000 + low
+        if not 0 <= index < self.orcid_contacts:
+            raise KeyError(orcid_id)
+        return json.dumps({"orcid-identifier": {"path": orcid_id}, "displayName": self.orcid_name(index)})
+
+
+class _SyntheticFdpRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_SyntheticHTTPServer"
+
+    def do_GET(self):
+        synthetic_server = self.server.synthetic_server
+        status = synthetic_server.serve(self.path)
+        if status is not None:
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            if status == HTTPStatus.SERVICE_UNAVAILABLE:
+                self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        document = synthetic_server.fdp.document(synthetic_server.url, self.path.split("?", 1)[0])
+        if document is None:
+            self.send_response(HTTPStatus.NOT_FOUND)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        content_type, body = document
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Benchmarks make hundreds of thousands of requests
+        pass
+
+
+class _SyntheticHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+    synthetic_server: "SyntheticFdpServer"
+
+
+class SyntheticFdpServer:
+    """
+    Serves a synthetic FDP on a free port of localhost, in a background thread. Every response is delayed by latency
+    seconds. A share of error_rate of the requests is answered with error_status instead; which requests fail is
+    decided by the seed, the path and the number of times the path was requested before, so retries of a failed
+    request can succeed.
+    """
+
+    def __init__(
+        self,
+        fdp: SyntheticFdp,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = HTTPStatus.SERVICE_UNAVAILABLE,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.fdp = fdp
+        self.latency = max(0.0, latency)
+        self.error_rate = min(1.0, max(0.0, error_rate))
+        self.error_status = error_status
+        self.requests = 0
+        self.errors = 0
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._http_server = _SyntheticHTTPServer((host, port), _SyntheticFdpRequestHandler)
+        self._http_server.synthetic_server = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._http_server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def root_url(self) -> str:
+        return f"{self.url}/"
+
+    def serve(self, path: str) -> Optional[int]:
+        """Counts and delays a request, returns the status of an injected error or None to serve the document"""
+        with self._lock:
+            self.requests += 1
+            attempt = self._attempts.get(path, 0)
+            if self.error_rate:
+                self._attempts[path] = attempt + 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.Random(f"{self.fdp.seed}:{path}:{attempt}").random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            return self.error_status
+        return None
+
+    def reset_statistics(self):
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+
+    def start(self) -> "SyntheticFdpServer":
+        self._thread = threading.Thread(target=self._http_server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._http_server.shutdown()
+        self._http_server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "SyntheticFdpServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,121 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import json
+from unittest.mock import patch
+
+import pytest
+from ckan.plugins import toolkit
+
+from ckanext.fairdatapoint import actions
+from ckanext.fairdatapoint.harvesters.domain.harvest_diff import HarvestDiff
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        value = self.values.get(key)
+        return value.encode() if value is not None else None
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+DIFF = HarvestDiff(
+    new=1, changed=2, unchanged=3, deleted=4, failed=0, crawl_seconds=1.0, estimated_import_seconds=None
+)
+
+
+@pytest.fixture
+def redis():
+    fake_redis = FakeRedis()
+    with patch("ckanext.fairdatapoint.actions.connect_to_redis", return_value=fake_redis):
+        yield fake_redis
+
+
+@patch("ckanext.fairdatapoint.actions.toolkit.enqueue_job")
+@patch("ckanext.fairdatapoint.actions.toolkit.check_access")
+@patch("ckanext.fairdatapoint.actions.plugins.get_plugin")
+@patch("ckanext.fairdatapoint.actions.HarvestSource")
+def test_fairdatapoint_harvest_diff(harvest_source, get_plugin, check_access, enqueue_job, redis):
+    harvest_source.get.return_value.id = "source-1"
+    get_plugin.return_value.diff_stage.return_value = DIFF
+    data_dict = {"id": "source-1", "compare_content": "true"}
+
+    pending = actions.fairdatapoint_harvest_diff({}, data_dict)
+
+    # The crawl does not run in the request
+    assert pending["status"] == "pending"
+    get_plugin.return_value.diff_stage.assert_not_called()
+    check_access.assert_called_once_with("fairdatapoint_harvest_diff", {}, data_dict)
+    enqueue_job.assert_called_once()
+    function, args = enqueue_job.call_args.args
+    assert function is actions.run_harvest_diff
+    assert args == ["source-1", True]
+    assert enqueue_job.call_args.kwargs["rq_kwargs"]["job_id"] == pending["job_id"]
+    # A second call while the job runs does not enqueue another one
+    assert actions.fairdatapoint_harvest_diff({}, data_dict) == pending
+    enqueue_job.assert_called_once()
+
+    function(*args)
+
+    get_plugin.return_value.diff_stage.assert_called_once_with(
+        harvest_source.get.return_value, compare_content=True, refresh=True
+    )
+    assert actions.fairdatapoint_harvest_diff({}, data_dict) == {"status": "complete", "diff": DIFF._asdict()}
+    enqueue_job.assert_called_once()
+
+
+@patch("ckanext.fairdatapoint.actions.toolkit.enqueue_job")
+@patch("ckanext.fairdatapoint.actions.toolkit.check_access")
+@patch("ckanext.fairdatapoint.actions.HarvestSource")
+def test_fairdatapoint_harvest_diff_refresh(harvest_source, check_access, enqueue_job, redis):
+    harvest_source.get.return_value.id = "source-1"
+    redis.set(actions._diff_key("source-1", False), json.dumps(DIFF._asdict()))
+
+    result = actions.fairdatapoint_harvest_diff({}, {"id": "source-1", "refresh": "true"})
+
+    assert result["status"] == "pending"
+    enqueue_job.assert_called_once()
+    assert redis.get(actions._diff_key("source-1", False)) is None
+
+
+@patch("ckanext.fairdatapoint.actions.plugins.get_plugin")
+@patch("ckanext.fairdatapoint.actions.HarvestSource")
+def test_run_harvest_diff_failure_releases_claim(harvest_source, get_plugin, redis):
+    key = actions._diff_key("source-1", False)
+    redis.set(f"{key}.job", "job-1")
+    get_plugin.return_value.diff_stage.side_effect = RuntimeError("crawl failed")
+
+    with pytest.raises(RuntimeError):
+        actions.run_harvest_diff("source-1", False)
+
+    assert redis.get(f"{key}.job") is None
+    assert redis.get(key) is None
+
+
+@patch("ckanext.fairdatapoint.actions.toolkit.check_access")
+@patch("ckanext.fairdatapoint.actions.HarvestSource")
+def test_fairdatapoint_harvest_diff_unknown_source(harvest_source, check_access):
+    harvest_source.get.return_value = None
+
+    with pytest.raises(toolkit.ObjectNotFound):
+        actions.fairdatapoint_harvest_diff({}, {"id": "missing"})
+
+
+@patch("ckanext.fairdatapoint.actions.toolkit.check_access")
+def test_fairdatapoint_harvest_diff_auth(check_access):
+    assert actions.fairdatapoint_harvest_diff_auth({}, {"id": "source-1"}) == {"success": True}
+    check_access.assert_called_once_with("harvest_source_update", {}, {"id": "source-1"})
+
+    check_access.side_effect = toolkit.NotAuthorized
+    assert not actions.fairdatapoint_harvest_diff_auth({}, {"id": "source-1"})["success"]
@@ -0,0 +1,95 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import hashlib
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+from ckanext.fairdatapoint.harvesters.domain.blob_store import (
+    BlobStoreException,
+    ContentBlobStore,
+    is_blob_reference,
+)
+
+CONTENT = '<http://example.org/dataset> <http://purl.org/dc/terms/title> "Statistični urad"@sl .\n'
+
+
+class TestContentBlobStore:
+    def test_put_and_get(self, tmp_path):
+        blob_store = ContentBlobStore(tmp_path)
+
+        reference = blob_store.put(CONTENT)
+
+        digest = hashlib.sha256(CONTENT.encode("utf-8")).hexdigest()
+        assert reference == f"#fdp-blob: sha256:{digest}"
+        assert is_blob_reference(reference)
+        assert blob_store.path(digest) == tmp_path / digest[:2] / digest[2:4] / digest
+        assert blob_store.get(reference) == CONTENT
+
+    def test_identical_content_is_stored_once(self, tmp_path):
+        blob_store = ContentBlobStore(tmp_path)
+
+        assert blob_store.put(CONTENT) == blob_store.put(CONTENT)
+        assert len(list(blob_store.digests())) == 1
+
+    def test_failed_put_removes_temporary_file(self, tmp_path):
+        blob_store = ContentBlobStore(tmp_path)
+
+        with patch("os.replace", side_effect=OSError("No space left on device")):
+            with pytest.raises(OSError, match="No space left"):
+                blob_store.put(CONTENT)
+
+        assert [path for path in tmp_path.rglob("*") if path.is_file()] == []
+
+    def test_offload_small_content_is_kept_inline(self, tmp_path):
+        blob_store = ContentBlobStore(tmp_path, min_size=len(CONTENT) + 1)
+
+        assert blob_store.offload(CONTENT) == CONTENT
+        assert blob_store.resolve(CONTENT) == CONTENT
+        assert list(blob_store.digests()) == []
+
+    def test_offload_and_resolve(self, tmp_path):
+        blob_store = ContentBlobStore(tmp_path, min_size=10)
+
+        reference = blob_store.offload(CONTENT)
+
+        assert is_blob_reference(reference)
+        assert blob_store.resolve(reference) == CONTENT
+
+    def test_missing_blob(self, tmp_path):
+        blob_store = ContentBlobStore(tmp_path)
+        reference = blob_store.put(CONTENT)
+        os.remove(blob_store.path(reference.split(":")[-1]))
+
+        with pytest.raises(BlobStoreException, match="could not be read"):
+            blob_store.get(reference)
+
+    def test_corrupt_blob(self, tmp_path):
+        blob_store = ContentBlobStore(tmp_path)
+        reference = blob_store.put(CONTENT)
+        blob_store.path(reference.split(":")[-1]).write_text("tampered")
+
+        with pytest.raises(BlobStoreException, match="is corrupt"):
+            blob_store.get(reference)
+
+    def test_malformed_reference(self, tmp_path):
+        with pytest.raises(BlobStoreException, match="Malformed blob reference"):
+            ContentBlobStore(tmp_path).get("#fdp-blob: md5:abc")
+
+    def test_prune_keeps_referenced_and_recent_blobs(self, tmp_path):
+        blob_store = ContentBlobStore(tmp_path)
+        referenced = blob_store.put("referenced").split(":")[-1]
+        old = blob_store.put("old").split(":")[-1]
+        recent = blob_store.put("recent").split(":")[-1]
+        an_hour_ago = time.time() - 3600
+        for digest in (referenced, old):
+            os.utime(blob_store.path(digest), (an_hour_ago, an_hour_ago))
+
+        removed = blob_store.prune([referenced], min_age=60)
+
+        assert removed == 1
+        assert set(blob_store.digests()) == {referenced, recent}
@@ -0,0 +1,77 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import pytest
+
+from ckanext.fairdatapoint.harvesters.domain.circuit_breaker import (
+    CircuitBreaker,
+    CircuitBreakers,
+    CircuitOpenException,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, clock=FakeClock())
+
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+    breaker.before_request()
+    breaker.record_success()
+    for _ in range(3):
+        breaker.before_request()
+        breaker.record_failure()
+
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenException):
+        breaker.before_request()
+
+
+def test_half_open_trial_closes_circuit():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+
+    clock.now = 60
+    breaker.before_request()
+    # Only a single trial request is let through
+    with pytest.raises(CircuitOpenException):
+        breaker.before_request()
+    breaker.record_success()
+
+    assert not breaker.is_open
+    breaker.before_request()
+
+
+def test_failed_trial_keeps_circuit_open():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+
+    clock.now = 60
+    breaker.before_request()
+    breaker.record_failure()
+
+    clock.now = 100
+    with pytest.raises(CircuitOpenException):
+        breaker.before_request()
+    clock.now = 120
+    breaker.before_request()
+
+
+def test_circuit_breakers_by_host():
+    circuit_breakers = CircuitBreakers()
+
+    breaker = circuit_breakers.get("https://fdp.example.com/catalog/1")
+
+    assert circuit_breakers.get("https://fdp.example.com/dataset/2") is breaker
+    assert circuit_breakers.get("https://other.example.com") is not breaker
@@ -0,0 +1,254 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import gzip
+from unittest.mock import MagicMock, patch
+
+import pytest
+from click.testing import CliRunner
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from ckanext.fairdatapoint import cli
+from ckanext.fairdatapoint.harvesters.domain.blob_store import ContentBlobStore
+from ckanext.fairdatapoint.harvesters.domain.content_compression import (
+    decompress_content,
+)
+from ckanext.fairdatapoint.harvesters.domain import transport
+from ckanext.fairdatapoint.harvesters.domain.harvest_diff import HarvestDiff
+from ckanext.fairdatapoint.harvesters.domain.http_archive import NotInArchiveException, ReplayTransport
+from ckanext.fairdatapoint.harvesters.domain.snapshot import CrawlStatistics
+from ckanext.harvest.model import HarvestJob, HarvestObject, HarvestSource
+
+
+def _harvest_object(content):
+    harvest_object = MagicMock()
+    harvest_object.content = content
+    return harvest_object
+
+
+@patch("ckanext.fairdatapoint.cli.model.Session")
+def test_compress_harvest_objects(mock_session):
+    harvest_objects = [_harvest_object("first content " * 20), _harvest_object("second content " * 20)]
+    id_query = mock_session.query.return_value.join.return_value.filter.return_value.filter.return_value
+    id_query = id_query.filter.return_value.filter.return_value
+    id_query.__iter__.return_value = [("ho-1",), ("ho-2",)]
+    mock_session.query.return_value.filter.return_value.__iter__.side_effect = [
+        iter(harvest_objects[:1]),
+        iter(harvest_objects[1:]),
+    ]
+
+    count, size_before, size_after = cli.compress_harvest_objects("zlib", batch_size=1)
+
+    assert count == 2
+    assert size_after < size_before
+    assert decompress_content(harvest_objects[0].content) == "first content " * 20
+    assert decompress_content(harvest_objects[1].content) == "second content " * 20
+    assert mock_session.commit.call_count == 2
+
+
+@pytest.fixture
+def harvest_session():
+    """Session of an in-memory database with the harvest tables, used as the CKAN session"""
+    engine = create_engine("sqlite://")
+    tables = [HarvestSource.__table__, HarvestJob.__table__, HarvestObject.__table__]
+    HarvestSource.__table__.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    with patch("ckanext.fairdatapoint.cli.model.Session", session):
+        yield session
+    session.close()
+    engine.dispose()
+
+
+def test_compress_harvest_objects_of_fdp_sources_only(harvest_session):
+    content = "<https://example.org/s> <https://example.org/p> \"o\" .\n" * 20
+    for source_id, source_type in [("fdp-source", "fair_data_point_harvester"), ("dcat-source", "dcat_rdf")]:
+        source = HarvestSource(id=source_id, url=f"https://{source_id}.example.org", type=source_type)
+        job = HarvestJob(source=source)
+        harvest_session.add(
+            HarvestObject(id=f"{source_id}-object", guid="dataset=1", job=job, source=source, content=content)
+        )
+    harvest_session.commit()
+
+    assert cli.compress_harvest_objects("zlib")[0] == 1
+    # An explicit source of another harvester does not compress its objects either
+    assert cli.compress_harvest_objects("zlib", source_id="dcat-source")[0] == 0
+
+    assert decompress_content(harvest_session.get(HarvestObject, "fdp-source-object").content) == content
+    assert harvest_session.get(HarvestObject, "fdp-source-object").content != content
+    assert harvest_session.get(HarvestObject, "dcat-source-object").content == content
+
+
+@patch("ckanext.fairdatapoint.cli.compress_harvest_objects")
+@patch("ckanext.fairdatapoint.cli.HarvestSource")
+def test_compress_content_command_rejects_other_harvesters(harvest_source, compress_harvest_objects):
+    harvest_source.get.return_value.type = "dcat_rdf"
+
+    result = CliRunner().invoke(cli.fairdatapoint, ["compress-content", "--source", "dcat-source"])
+
+    assert result.exit_code != 0
+    assert "is not a fair_data_point_harvester source" in result.output
+    compress_harvest_objects.assert_not_called()
+
+
+@patch("ckanext.fairdatapoint.cli.compress_harvest_objects")
+@patch("ckanext.fairdatapoint.cli.HarvestSource")
+def test_compress_content_command(harvest_source, compress_harvest_objects):
+    harvest_source.get.return_value.type = "fair_data_point_harvester"
+    compress_harvest_objects.return_value = (3, 3000, 1000)
+
+    result = CliRunner().invoke(
+        cli.fairdatapoint, ["compress-content", "--source", "source-1", "--batch-size", "10"]
+    )
+
+    assert result.exit_code == 0, result.output
+    compress_harvest_objects.assert_called_once_with("zlib", source_id="source-1", batch_size=10)
+    assert "Compressed 3 harvest objects from 3000 to 1000 characters" in result.output
+
+
+@patch("ckanext.fairdatapoint.cli.model.Session")
+def test_prune_content_blobs(mock_session, tmp_path):
+    blob_store = ContentBlobStore(tmp_path)
+    referenced = blob_store.put("referenced content")
+    blob_store.put("unreferenced content")
+    mock_session.query.return_value.filter.return_value.__iter__.return_value = [(referenced,)]
+
+    removed = cli.prune_content_blobs(str(tmp_path), min_age=0)
+
+    assert removed == 1
+    assert blob_store.get(referenced) == "referenced content"
+    assert len(list(blob_store.digests())) == 1
+
+
+@patch("ckanext.fairdatapoint.cli.get_blob_store_path")
+def test_prune_blobs_command_without_blob_store(get_blob_store_path):
+    get_blob_store_path.return_value = None
+
+    result = CliRunner().invoke(cli.fairdatapoint, ["prune-blobs"])
+
+    assert result.exit_code != 0
+    assert "blob_store_path is not configured" in result.output
+
+
+@patch("ckanext.fairdatapoint.cli.plugins.get_plugin")
+@patch("ckanext.fairdatapoint.cli.model.Session")
+def test_import_pending_harvest_objects(mock_session, get_plugin):
+    harvest_objects = [MagicMock(id="ho-1"), MagicMock(id="ho-2"), MagicMock(id="ho-3")]
+    harvester = get_plugin.return_value
+    # Claimed in two batches, until nothing is pending anymore
+    harvester.claim_pending_imports.side_effect = [harvest_objects[:2], harvest_objects[2:], []]
+    harvester.import_stage_batch.side_effect = [{"ho-1": True, "ho-2": False}, {"ho-3": True}]
+    harvester._get_object_extra.side_effect = lambda harvest_object, key: {"ho-1": "new", "ho-3": "change"}.get(
+        harvest_object.id
+    )
+
+    succeeded, failed = cli.import_pending_harvest_objects("source-1", max_workers=4, batch_size=2)
+
+    assert (succeeded, failed) == (2, 1)
+    get_plugin.assert_called_once_with("fairdatapointharvester")
+    harvester.claim_pending_imports.assert_called_with("source-1", 2)
+    harvester.import_stage_batch.assert_any_call(harvest_objects[:2], max_workers=4)
+    assert [o.state for o in harvest_objects] == ["COMPLETE", "ERROR", "COMPLETE"]
+    assert [o.report_status for o in harvest_objects] == ["added", "errored", "updated"]
+    assert harvest_objects[0].import_finished is not None
+    assert mock_session.commit.call_count == 2
+
+
+@patch("ckanext.fairdatapoint.cli.import_pending_harvest_objects")
+def test_import_command(import_pending_harvest_objects):
+    import_pending_harvest_objects.return_value = (5, 0)
+
+    result = CliRunner().invoke(cli.fairdatapoint, ["import", "--source", "source-1", "--workers", "2"])
+
+    assert result.exit_code == 0, result.output
+    import_pending_harvest_objects.assert_called_once_with("source-1", max_workers=2, batch_size=cli.DEFAULT_BATCH_SIZE)
+    assert "Imported 5 harvest objects, 0 failed" in result.output
+
+
+@patch("ckanext.fairdatapoint.crawl.crawl_snapshot")
+def test_crawl_command_replay(crawl_snapshot, tmp_path):
+    archive = tmp_path / "archive.jsonl.gz"
+    with gzip.open(archive, "wt") as file:
+        file.write("")
+    installed = []
+
+    def crawl(*args, **kwargs):
+        installed.append(transport._transport)
+        with pytest.raises(NotInArchiveException):
+            transport.get("https://fdp.example.org/")
+        return CrawlStatistics(
+            records=1, failed_records=0, skipped_documents=0, documents=1, triples=5, size=100, seconds=1.0
+        )
+
+    crawl_snapshot.side_effect = crawl
+
+    result = CliRunner().invoke(
+        cli.fairdatapoint,
+        ["crawl", "https://fdp.example.org/", "-o", str(tmp_path / "snapshot.nq.gz"), "--replay", str(archive)],
+    )
+
+    assert result.exit_code == 0, result.output
+    assert isinstance(installed[0], ReplayTransport)
+    assert transport._transport is None
+    assert "1 requests were not in the HTTP archive" in result.output
+
+
+def test_crawl_command_record_and_replay(tmp_path):
+    archive = tmp_path / "archive.jsonl.gz"
+    archive.touch()
+
+    result = CliRunner().invoke(
+        cli.fairdatapoint,
+        [
+            "crawl", "https://fdp.example.org/", "-o", str(tmp_path / "snapshot.nq.gz"),
+            "--record", str(tmp_path / "new.jsonl.gz"), "--replay", str(archive),
+        ],
+    )
+
+    assert result.exit_code != 0
+    assert "cannot be combined" in result.output
+
+
+@patch("ckanext.fairdatapoint.cli.plugins.get_plugin")
+@patch("ckanext.fairdatapoint.cli.HarvestSource")
+def test_diff_command(harvest_source, get_plugin):
+    harvester = get_plugin.return_value
+    harvester.diff_stage.return_value = HarvestDiff(
+        new=3, changed=10, unchanged=None, deleted=1, failed=0, crawl_seconds=4.2, estimated_import_seconds=28.0
+    )
+
+    result = CliRunner().invoke(cli.fairdatapoint, ["diff", "--source", "source-1", "--concurrency", "4"])
+
+    assert result.exit_code == 0, result.output
+    harvest_source.get.assert_called_once_with("source-1")
+    harvester.diff_stage.assert_called_once_with(
+        harvest_source.get.return_value, compare_content=False, fetch_concurrency=4, refresh=False
+    )
+    assert "New: 3, changed: 10, unchanged: unknown, deleted: 1, failed: 0" in result.output
+    assert "Estimated import time: 28 seconds" in result.output
+    assert "incomplete" not in result.output
+
+
+@patch("ckanext.fairdatapoint.cli.plugins.get_plugin")
+@patch("ckanext.fairdatapoint.cli.HarvestSource")
+def test_diff_command_incomplete(harvest_source, get_plugin):
+    get_plugin.return_value.diff_stage.return_value = HarvestDiff(
+        new=3, changed=10, unchanged=None, deleted=0, failed=0, crawl_seconds=4.2, estimated_import_seconds=None,
+        complete=False, crawl_errors=2,
+    )
+
+    result = CliRunner().invoke(cli.fairdatapoint, ["diff", "--source", "source-1"])
+
+    assert result.exit_code == 0, result.output
+    assert "The crawl was incomplete (2 documents could not be crawled" in result.output
+
+
+@patch("ckanext.fairdatapoint.cli.HarvestSource")
+def test_diff_command_unknown_source(harvest_source):
+    harvest_source.get.return_value = None
+
+    result = CliRunner().invoke(cli.fairdatapoint, ["diff", "--source", "missing"])
+
+    assert result.exit_code != 0
+    assert "Harvest source missing not found" in result.output
@@ -0,0 +1,66 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from pathlib import Path
+
+import pytest
+
+from ckanext.fairdatapoint.harvesters.domain import content_compression
+from ckanext.fairdatapoint.harvesters.domain.content_compression import (
+    COMPRESSION_NONE,
+    COMPRESSION_ZLIB,
+    COMPRESSION_ZSTD,
+    ContentCompressionException,
+    compress_content,
+    decompress_content,
+    is_compressed,
+)
+
+TEST_DATA_DIRECTORY = Path(Path(__file__).parent.resolve(), "test_data")
+CONTENT = Path(
+    TEST_DATA_DIRECTORY, "dataset_d7129d28-b72a-437f-8db0-4f0258dd3c25_out.ttl"
+).read_text(encoding="utf-8")
+
+
+class TestContentCompression:
+    def test_no_compression(self):
+        assert compress_content(CONTENT, COMPRESSION_NONE) == CONTENT
+
+    def test_zlib_round_trip(self):
+        compressed = compress_content(CONTENT, COMPRESSION_ZLIB)
+
+        assert compressed.startswith("#fdp-compressed: zlib\n")
+        assert is_compressed(compressed)
+        assert len(compressed) < len(CONTENT)
+        assert decompress_content(compressed) == CONTENT
+
+    def test_zstd_round_trip(self):
+        pytest.importorskip("zstandard")
+        compressed = compress_content(CONTENT, COMPRESSION_ZSTD)
+
+        assert compressed.startswith("#fdp-compressed: zstd\n")
+        assert decompress_content(compressed) == CONTENT
+
+    def test_zstd_not_installed(self, monkeypatch):
+        monkeypatch.setattr(content_compression, "zstandard", None)
+
+        with pytest.raises(ContentCompressionException, match="requires the zstandard package"):
+            compress_content(CONTENT, COMPRESSION_ZSTD)
+
+    def test_uncompressed_content_is_returned_unchanged(self):
+        assert not is_compressed(CONTENT)
+        assert decompress_content(CONTENT) == CONTENT
+
+    def test_non_ascii_content(self):
+        content = '<http://example.org/a> <http://example.org/b> "Statistični urad"@sl .\n'
+
+        assert decompress_content(compress_content(content, COMPRESSION_ZLIB)) == content
+
+    def test_unknown_compression(self):
+        with pytest.raises(ContentCompressionException, match="Unknown content compression"):
+            compress_content(CONTENT, "gzip")
+
+    def test_corrupt_content(self):
+        with pytest.raises(ContentCompressionException, match="could not be decompressed"):
+            decompress_content("#fdp-compressed: zlib\nbm90IHpsaWI=")
@@ -0,0 +1,62 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import io
+
+import pytest
+
+from ckanext.fairdatapoint.harvesters.domain.document_limits import (
+    DocumentTooLargeException,
+    check_content_length,
+    limit_stream,
+    limited_graph,
+    release_limit,
+)
+
+TRIPLES = (
+    "<http://example.org/s> <http://example.org/p> <http://example.org/o1> .\n"
+    "<http://example.org/s> <http://example.org/p> <http://example.org/o2> .\n"
+    "<http://example.org/s> <http://example.org/p> <http://example.org/o3> .\n"
+)
+
+
+@pytest.mark.parametrize("content_length", [None, "", "1024", "invalid"])
+def test_check_content_length_allows(content_length):
+    check_content_length(content_length, 1024, "http://example.org")
+
+
+def test_check_content_length_aborts():
+    with pytest.raises(DocumentTooLargeException, match="1025 bytes"):
+        check_content_length("1025", 1024, "http://example.org")
+    # No maximum
+    check_content_length("1025", 0, "http://example.org")
+
+
+def test_limit_stream_allows_maximum_size():
+    assert limit_stream(io.BytesIO(b"x" * 10), 10, "http://example.org").read() == b"x" * 10
+
+
+def test_limit_stream_aborts_while_reading():
+    stream = limit_stream(io.BytesIO(b"x" * 11), 10, "http://example.org")
+
+    with pytest.raises(DocumentTooLargeException, match="maximum body size of 10 bytes"):
+        stream.read()
+
+
+@pytest.mark.parametrize("rdf_format", ["nt", "turtle", "json-ld"])
+def test_limited_graph_aborts_parsing(rdf_format):
+    data = limited_graph(0, "").parse(data=TRIPLES, format="nt").serialize(format=rdf_format)
+
+    with pytest.raises(DocumentTooLargeException, match="maximum of 2 triples"):
+        limited_graph(2, "http://example.org").parse(data=data, format=rdf_format)
+    assert len(limited_graph(3, "http://example.org").parse(data=data, format=rdf_format)) == 3
+
+
+def test_release_limit():
+    graph = limited_graph(3, "http://example.org").parse(data=TRIPLES, format="nt")
+    release_limit(graph)
+
+    graph.parse(data=TRIPLES.replace("/s>", "/t>"), format="nt")
+
+    assert len(graph) == 6
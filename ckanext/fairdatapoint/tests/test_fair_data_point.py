@@ -2,13 +2,28 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-only
 
+import gzip
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 from pytest_mock import mocker
-from rdflib import Graph
+from rdflib import Graph, URIRef
 from rdflib.compare import to_isomorphic
 from rdflib.exceptions import ParserError
+import requests
+from requests.exceptions import ConnectionError, HTTPError
+from urllib3 import HTTPResponse
 
-from ckanext.fairdatapoint.harvesters.domain.fair_data_point import FairDataPoint
+from ckanext.fairdatapoint.harvesters.domain.circuit_breaker import DEFAULT_FAILURE_THRESHOLD
+from ckanext.fairdatapoint.harvesters.domain.document_limits import DocumentTooLargeException
+from ckanext.fairdatapoint.harvesters.domain import fair_data_point
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point import (
+    DocumentUnavailableException,
+    FairDataPoint,
+    FdpDocument,
+)
 
 
 TEST_DATA = "@prefix dcat: <http://www.w3.org/ns/dcat#> .\n"\
@@ -20,12 +35,28 @@ TEST_DATA = "@prefix dcat: <http://www.w3.org/ns/dcat#> .\n"\
             "<https://example.com/123> dcterms:identifier '123'^^xsd:token ."
 
 
+def _document(data: str) -> FdpDocument:
+    return FdpDocument(io.BytesIO(data.encode()), "text/turtle")
+
+
+def _response(body, headers=None) -> requests.Response:
+    """A streamed response as returned by requests, with an unread body"""
+    if isinstance(body, str):
+        body = body.encode()
+    headers = {"Content-Type": "text/turtle", **(headers or {})}
+    response = requests.Response()
+    response.status_code = 200
+    response.headers.update(headers)
+    response.raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=200, preload_content=False)
+    return response
+
+
 class TestFairDataPoint:
     def test_fdp_get_graph(self, mocker):
         fdp_get_data = mocker.MagicMock(name="get_data")
         mocker.patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point.FairDataPoint._get_data",
                      new=fdp_get_data)
-        fdp_get_data.return_value = TEST_DATA
+        fdp_get_data.return_value = _document(TEST_DATA)
 
         expected = Graph().parse("./ckanext/fairdatapoint/tests/test_data/example_graph.ttl")
         fdp = FairDataPoint("some endpoint")
@@ -37,7 +68,7 @@ class TestFairDataPoint:
         fdp_get_data = mocker.MagicMock(name="get_data")
         mocker.patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point.FairDataPoint._get_data",
                      new=fdp_get_data)
-        fdp_get_data.return_value = "I am not a graph"
+        fdp_get_data.return_value = _document("I am not a graph")
 
         fdp = FairDataPoint("some endpoint")
         actual = fdp.get_graph("some_path")
@@ -49,7 +80,7 @@ class TestFairDataPoint:
         fdp_get_data = mocker.MagicMock(name="get_data")
         mocker.patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point.FairDataPoint._get_data",
                      new=fdp_get_data)
-        fdp_get_data.return_value = ""
+        fdp_get_data.return_value = _document("")
 
         fdp = FairDataPoint("some endpoint")
         actual = fdp.get_graph("some_path")
@@ -68,11 +99,9 @@ class TestFairDataPoint:
         assert to_isomorphic(actual) == to_isomorphic(Graph())
 
     def test_fdp_get_data_uses_request_timeout(self, mocker):
-        response = mocker.MagicMock()
-        response.text = TEST_DATA
-        response.raise_for_status.return_value = None
+        response = _response(TEST_DATA)
         request_mock = mocker.patch(
-            "ckanext.fairdatapoint.harvesters.domain.fair_data_point.requests.request",
+            "ckanext.fairdatapoint.harvesters.domain.transport.requests.request",
             return_value=response,
         )
 
@@ -82,7 +111,217 @@ class TestFairDataPoint:
         request_mock.assert_called_once_with(
             "GET",
             "https://fdp.example.com",
-            headers={"Accept": "text/turtle"},
-            timeout=42,
+            headers={
+                "Accept": "application/n-triples, text/turtle;q=0.9, application/rdf+xml;q=0.8, "
+                          "application/ld+json;q=0.7",
+                "Accept-Encoding": fair_data_point.ACCEPT_ENCODING,
+            },
+            timeout=(10, 42),
+            stream=True,
+        )
+        assert actual.stream.read() == TEST_DATA.encode()
+        assert actual.content_type == "text/turtle"
+
+    def test_fdp_get_graph_decompresses_stream(self, mocker):
+        mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.transport.requests.request",
+            return_value=_response(gzip.compress(TEST_DATA.encode()), {"Content-Encoding": "gzip"}),
+        )
+
+        actual = FairDataPoint("some endpoint").get_graph("https://gzip.example.com/catalog")
+
+        expected = Graph().parse("./ckanext/fairdatapoint/tests/test_data/example_graph.ttl")
+        assert to_isomorphic(actual) == to_isomorphic(expected)
+
+    def test_fdp_get_graph_parses_content_type(self, mocker):
+        expected = Graph().parse("./ckanext/fairdatapoint/tests/test_data/example_graph.ttl")
+        body = expected.serialize(format="nt")
+        request_mock = mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.transport.requests.request",
+            side_effect=lambda *args, **kwargs: _response(body, {"Content-Type": "application/n-triples"}),
         )
-        assert actual == TEST_DATA
+        fdp = FairDataPoint("https://nt.example.com")
+
+        actual = fdp.get_graph("https://nt.example.com/catalog")
+
+        assert to_isomorphic(actual) == to_isomorphic(expected)
+        assert fair_data_point.host_formats.supported_formats("https://nt.example.com") == {"nt"}
+        fdp.get_graph("https://nt.example.com/dataset")
+        accept = request_mock.call_args.kwargs["headers"]["Accept"]
+        assert accept.startswith("application/n-triples,")
+
+    def test_fdp_get_graph_holds_host_slot_while_parsing(self, mocker):
+        limiter = fair_data_point.host_limiters.get("https://slot.example.com")
+        in_flight = []
+        response = _response(TEST_DATA)
+        read = response.raw.read
+
+        def read_body(*args, **kwargs):
+            in_flight.append(limiter.in_flight)
+            return read(*args, **kwargs)
+
+        response.raw.read = read_body
+        mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.transport.requests.request", return_value=response
+        )
+
+        FairDataPoint("https://slot.example.com").get_graph("https://slot.example.com/catalog")
+
+        assert in_flight and set(in_flight) == {1}
+        assert limiter.in_flight == 0
+
+    def test_fdp_get_graph_drops_truncated_stream(self, mocker):
+        body = gzip.compress(TEST_DATA.encode())[:-20]
+        mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.transport.requests.request",
+            return_value=_response(body, {"Content-Encoding": "gzip"}),
+        )
+
+        actual = FairDataPoint("some endpoint").get_graph("https://truncated.example.com/catalog")
+
+        assert len(actual) == 0
+
+    def test_fdp_get_graph_aborts_oversized_body(self, mocker):
+        body = gzip.compress(b"<http://example.org/s> <http://example.org/p> <http://example.org/o> .\n" * 1000)
+        response = _response(body, {"Content-Type": "application/n-triples", "Content-Encoding": "gzip"})
+        mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.transport.requests.request", return_value=response
+        )
+        fdp = FairDataPoint("https://large.example.com", max_body_size=len(body) * 2)
+
+        with pytest.raises(DocumentTooLargeException, match="maximum body size"):
+            fdp.get_graph("https://large.example.com/dataset")
+        assert response.raw.closed
+
+    def test_fdp_get_data_aborts_declared_oversized_body(self, mocker):
+        response = _response(b"", {"Content-Length": "2048"})
+        mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.transport.requests.request", return_value=response
+        )
+        fdp = FairDataPoint("https://large.example.com", max_body_size=1024)
+
+        with pytest.raises(DocumentTooLargeException, match="2048 bytes"):
+            fdp.get_graph("https://large.example.com/declared")
+
+    def test_fdp_get_graph_aborts_too_many_triples(self, mocker):
+        expected = Graph().parse("./ckanext/fairdatapoint/tests/test_data/example_graph.ttl")
+        mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.transport.requests.request",
+            side_effect=lambda *args, **kwargs: _response(expected.serialize(format="turtle")),
+        )
+
+        with pytest.raises(DocumentTooLargeException, match="triples"):
+            FairDataPoint("https://many.example.com", max_triples=len(expected) - 1).get_graph(
+                "https://many.example.com/catalog"
+            )
+        actual = FairDataPoint("https://many.example.com", max_triples=len(expected)).get_graph(
+            "https://many.example.com/dataset"
+        )
+        # The limit only applies to parsing, the graph can be completed afterwards
+        actual.add((URIRef("http://example.org/s"), URIRef("http://example.org/p"), URIRef("http://example.org/o")))
+        assert len(actual) == len(expected) + 1
+
+    def test_fdp_get_data_retries_server_errors(self, mocker):
+        error_response = mocker.MagicMock(status_code=502)
+        error_response.raise_for_status.side_effect = HTTPError("502 Bad Gateway")
+        response = _response(TEST_DATA)
+        request_mock = mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.transport.requests.request",
+            side_effect=[ConnectionError("refused"), error_response, response],
+        )
+        sleep_mock = mocker.patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point.time.sleep")
+
+        fdp = FairDataPoint("https://retry.example.com", request_retries=2)
+        actual = fdp._get_data("https://retry.example.com/catalog")
+
+        assert actual.stream.read() == TEST_DATA.encode()
+        assert request_mock.call_count == 3
+        first_delay, second_delay = [call.args[0] for call in sleep_mock.call_args_list]
+        assert 0.5 <= first_delay <= 1
+        assert 1 <= second_delay <= 2
+
+    @pytest.mark.parametrize("status_code", [404, 410])
+    def test_fdp_get_graph_of_absent_document_is_empty(self, mocker, status_code):
+        response = mocker.MagicMock(status_code=status_code)
+        response.raise_for_status.side_effect = HTTPError(f"{status_code} Client Error")
+        request_mock = mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.transport.requests.request",
+            return_value=response,
+        )
+
+        fdp = FairDataPoint("https://not-found.example.com")
+
+        assert fdp._get_data("https://not-found.example.com/catalog") is None
+        assert len(fdp.get_graph("https://not-found.example.com/catalog")) == 0
+        assert request_mock.call_count == 2
+
+    def test_fdp_get_data_fails_fast_when_circuit_is_open(self, mocker):
+        request_mock = mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.transport.requests.request",
+            side_effect=ConnectionError("refused"),
+        )
+        mocker.patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point.time.sleep")
+
+        fdp = FairDataPoint("https://down.example.com", request_retries=2)
+        for number in range(10):
+            with pytest.raises(DocumentUnavailableException):
+                fdp.get_graph(f"https://down.example.com/dataset/{number}")
+
+        assert request_mock.call_count == DEFAULT_FAILURE_THRESHOLD
+
+    def test_fdp_get_graph_shared_request_returns_copies(self, mocker):
+        release = threading.Event()
+
+        def get_data(path):
+            release.wait(5)
+            return _document(TEST_DATA)
+
+        fdp_get_data = mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.fair_data_point.FairDataPoint._get_data",
+            side_effect=get_data,
+        )
+        fdp = FairDataPoint("some endpoint")
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(fdp.get_graph, "https://shared.example.com/distribution") for _ in range(3)]
+            key = fdp._request_key("https://shared.example.com/distribution")
+            while not fair_data_point._graph_requests._calls or (
+                fair_data_point._graph_requests._calls[key].participants < 3
+            ):
+                pass
+            release.set()
+        graphs = [future.result() for future in futures]
+
+        assert fdp_get_data.call_count == 1
+        assert len({id(graph) for graph in graphs}) == 3
+        graphs[0].remove((None, None, None))
+        assert len(graphs[1]) == len(graphs[2]) > 0
+
+    def test_fdp_get_graph_does_not_share_requests_with_other_limits(self, mocker):
+        release = threading.Event()
+
+        def get_data(path):
+            release.wait(5)
+            return _document(TEST_DATA)
+
+        fdp_get_data = mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.fair_data_point.FairDataPoint._get_data",
+            side_effect=get_data,
+        )
+        unlimited = FairDataPoint("some endpoint", max_triples=0)
+        limited = FairDataPoint("some endpoint", max_triples=1)
+        path = "https://limits.example.com/distribution"
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            unlimited_graph = executor.submit(unlimited.get_graph, path)
+            while not fair_data_point._graph_requests._calls:
+                pass
+            limited_graph = executor.submit(limited.get_graph, path)
+            while sum(call.participants for call in list(fair_data_point._graph_requests._calls.values())) < 2:
+                pass
+            release.set()
+
+        assert len(unlimited_graph.result()) > 1
+        with pytest.raises(DocumentTooLargeException, match="triples"):
+            limited_graph.result()
+        assert fdp_get_data.call_count == 2
@@ -3,11 +3,20 @@
 # SPDX-License-Identifier: AGPL-3.0-only
 
 import unittest
+from pathlib import Path
 from unittest.mock import MagicMock, patch
 
+from rdflib import DCAT, Graph, URIRef
+
 from ckanext.fairdatapoint.harvesters.config import (
     get_harvester_int_setting,
     get_harvester_setting,
+    get_harvester_str_setting,
+)
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider import FairDataPointRecordProvider
+from ckanext.fairdatapoint.harvesters.domain.file_record_provider import (
+    FileRecordProvider,
+    FileRecordProviderException,
 )
 import ckanext.fairdatapoint.plugin as plugin
 from ckanext.fairdatapoint.harvesters import (
@@ -15,6 +24,8 @@ from ckanext.fairdatapoint.harvesters import (
     fair_data_point_civity_harvester,
 )
 
+TEST_DATA_DIRECTORY = Path(Path(__file__).parent.resolve(), "test_data")
+
 
 class TestFairDataPointCivityHarvester(unittest.TestCase):
 
@@ -73,6 +84,9 @@ class TestFairDataPointCivityHarvester(unittest.TestCase):
         "ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider.FairDataPointRecordProvider"
         ".__init__"
     )
+    @patch(
+        "ckanext.fairdatapoint.harvesters.fair_data_point_civity_harvester.get_harvester_str_setting"
+    )
     @patch(
         "ckanext.fairdatapoint.harvesters.fair_data_point_civity_harvester.get_harvester_int_setting"
     )
@@ -83,26 +97,117 @@ class TestFairDataPointCivityHarvester(unittest.TestCase):
         self,
         get_harvester_setting,
         get_harvester_int_setting,
+        get_harvester_str_setting,
         mock_record_provider,
     ):
         mock_record_provider.return_value = None
         harvester = FairDataPointCivityHarvester()
         get_harvester_setting.return_value = True
-        get_harvester_int_setting.return_value = 25
+        get_harvester_int_setting.side_effect = lambda config, name, default: {
+            fair_data_point_civity_harvester.REQUEST_TIMEOUT: 25,
+            fair_data_point_civity_harvester.REQUEST_RETRIES: 2,
+            fair_data_point_civity_harvester.CONNECT_TIMEOUT: 5,
+            fair_data_point_civity_harvester.RECORD_TIME_BUDGET: 60,
+            fair_data_point_civity_harvester.GATHER_DEADLINE: 3600,
+            fair_data_point_civity_harvester.FETCH_CONCURRENCY: 4,
+            fair_data_point_civity_harvester.FETCH_BATCH_SIZE: 50,
+            fair_data_point_civity_harvester.MAX_BODY_SIZE: 1024,
+            fair_data_point_civity_harvester.MAX_TRIPLES: 500,
+        }[name]
+        get_harvester_str_setting.side_effect = lambda config, name, default: {
+            fair_data_point_civity_harvester.CONTENT_FORMAT: "ntriples",
+            fair_data_point_civity_harvester.CONTENT_COMPRESSION: "zlib",
+        }[name]
         harvest_url = "http://example.com"
         harvest_config_dict = {fair_data_point_civity_harvester.HARVEST_CATALOG: "true"}
         harvester.setup_record_provider(harvest_url, harvest_config_dict)
-        get_harvester_setting.assert_called_once_with(
+        get_harvester_setting.assert_any_call(
             harvest_config_dict, fair_data_point_civity_harvester.HARVEST_CATALOG, False
         )
-        get_harvester_int_setting.assert_called_once_with(
+        get_harvester_setting.assert_any_call(
+            harvest_config_dict, fair_data_point_civity_harvester.FETCH_IN_GATHER, False
+        )
+        get_harvester_int_setting.assert_any_call(
             harvest_config_dict,
             fair_data_point_civity_harvester.REQUEST_TIMEOUT,
             fair_data_point_civity_harvester.DEFAULT_REQUEST_TIMEOUT,
         )
+        get_harvester_int_setting.assert_any_call(
+            harvest_config_dict,
+            fair_data_point_civity_harvester.FETCH_CONCURRENCY,
+            fair_data_point_civity_harvester.DEFAULT_FETCH_CONCURRENCY,
+        )
+        get_harvester_str_setting.assert_any_call(
+            harvest_config_dict,
+            fair_data_point_civity_harvester.CONTENT_FORMAT,
+            "turtle",
+        )
+        get_harvester_str_setting.assert_any_call(
+            harvest_config_dict,
+            fair_data_point_civity_harvester.CONTENT_COMPRESSION,
+            "none",
+        )
         mock_record_provider.assert_called_once_with(
-            harvest_url, True, request_timeout=25
+            harvest_url,
+            True,
+            request_timeout=25,
+            content_format="ntriples",
+            fetch_concurrency=4,
+            request_retries=2,
+            connect_timeout=5,
+            record_time_budget=60,
+            max_body_size=1024,
+            max_triples=500,
         )
+        self.assertEqual(harvester.content_compression, "zlib")
+        self.assertEqual(harvester.gather_deadline, 3600)
+        self.assertEqual(harvester.fetch_batch_size, 50)
+
+    def test_setup_record_provider_file_source(self):
+        harvester = FairDataPointCivityHarvester()
+        dump = Path(TEST_DATA_DIRECTORY, "dataset_cbioportal.ttl")
+        with patch(
+            "ckanext.fairdatapoint.harvesters.fair_data_point_civity_harvester.get_file_source_directory",
+            return_value=str(TEST_DATA_DIRECTORY),
+        ):
+            harvester.setup_record_provider(dump.as_uri(), {})
+
+        self.assertIsInstance(harvester.record_provider, FileRecordProvider)
+        self.assertEqual(harvester.record_provider.source.path, dump)
+
+    def test_create_record_provider_leaves_harvester_unchanged(self):
+        harvester = FairDataPointCivityHarvester()
+        harvester.setup_record_provider("https://fdp.example.org", {})
+        record_provider = harvester.record_provider
+        gather_deadline = harvester.gather_deadline
+
+        created = harvester.create_record_provider("https://other.example.org", {"gather_deadline": "60"})
+
+        self.assertIsInstance(created, FairDataPointRecordProvider)
+        self.assertIsNot(created, record_provider)
+        self.assertIs(harvester.record_provider, record_provider)
+        self.assertEqual(harvester.get_gather_deadline({"gather_deadline": "60"}), 60)
+        self.assertEqual(harvester.gather_deadline, gather_deadline)
+
+    def test_setup_record_provider_file_source_outside_directory(self):
+        harvester = FairDataPointCivityHarvester()
+        with patch(
+            "ckanext.fairdatapoint.harvesters.fair_data_point_civity_harvester.get_file_source_directory",
+            return_value=str(Path(TEST_DATA_DIRECTORY, "scheming")),
+        ):
+            with self.assertRaises(FileRecordProviderException):
+                harvester.setup_record_provider(Path(TEST_DATA_DIRECTORY, "dataset_cbioportal.ttl").as_uri(), {})
+
+    def test_get_content_format_setting_from_dict(self):
+        harvest_config_dict = {
+            fair_data_point_civity_harvester.CONTENT_FORMAT: " compact "
+        }
+        result = get_harvester_str_setting(
+            harvest_config_dict,
+            fair_data_point_civity_harvester.CONTENT_FORMAT,
+            "turtle",
+        )
+        self.assertEqual(result, "compact")
 
     @patch(
         "ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_to_package_converter"
@@ -117,6 +222,46 @@ class TestFairDataPointCivityHarvester(unittest.TestCase):
         harvester.setup_record_to_package_converter(harvest_url, harvest_config_dict)
         mock_converter.assert_called_once_with("test_profile")
 
+    def test_setup_record_to_package_converter_reuses_converter(self):
+        harvester = FairDataPointCivityHarvester()
+        harvest_config_dict = {fair_data_point_civity_harvester.PROFILE: "test_profile"}
+
+        harvester.setup_record_to_package_converter("http://example.com", harvest_config_dict)
+        converter = harvester.record_to_package_converter
+        harvester.setup_record_to_package_converter("http://example.com", harvest_config_dict)
+        self.assertIs(harvester.record_to_package_converter, converter)
+
+        harvester.setup_record_to_package_converter(
+            "http://example.com", {fair_data_point_civity_harvester.PROFILE: "other_profile"}
+        )
+        self.assertIsNot(harvester.record_to_package_converter, converter)
+        self.assertEqual(harvester.record_to_package_converter.profile, "other_profile")
+
+    @patch("ckanext.fairdatapoint.harvesters.fair_data_point_civity_harvester.get_graph_cache_size")
+    def test_setup_graph_cache(self, get_graph_cache_size):
+        harvester = FairDataPointCivityHarvester()
+        get_graph_cache_size.return_value = 8
+
+        harvester._setup_graph_cache()
+        graph_cache = harvester.graph_cache
+        harvester._setup_graph_cache()
+        self.assertIs(harvester.graph_cache, graph_cache)
+        self.assertEqual(graph_cache.max_size, 8)
+
+        get_graph_cache_size.return_value = 0
+        harvester._setup_graph_cache()
+        self.assertIsNone(harvester.graph_cache)
+
+    def test_get_record_dependencies(self):
+        harvester = FairDataPointCivityHarvester()
+        graph = Graph().parse(Path(TEST_DATA_DIRECTORY, "root_fdp_response.ttl"))
+        dataset_url = next(str(s) for s in graph.subjects(DCAT.inSeries, None))
+        series_url = str(graph.value(URIRef(dataset_url), DCAT.inSeries))
+
+        self.assertEqual(harvester._get_record_dependencies(f"dataset={dataset_url}", graph), [series_url])
+        self.assertEqual(harvester._get_record_dependencies(f"dataseries={series_url}", graph), [])
+        self.assertEqual(harvester._get_record_dependencies(f"dataset={dataset_url}", None), [])
+
     def test_setup_record_to_package_converter_raises_exception(self):
         # Instantiate the harvester
         harvester = FairDataPointCivityHarvester()
@@ -2,77 +2,65 @@
 #
 # SPDX-License-Identifier: AGPL-3.0-only 
 
+import subprocess
+import sys
 from unittest.mock import patch
-from ckanext.fairdatapoint.fair_data_point_main import main
-from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider import FairDataPointRecordProvider
-from rdflib import URIRef
 
+import pytest
 
-TEST_CAT_IDS_DICT = {
-            "catalog=https://fair.healthinformationportal.eu/catalog/1c75c2c9-d2cc-44cb-aaa8-cf8c11515c8d":
-                URIRef("https://fair.healthinformationportal.eu/catalog/1c75c2c9-d2cc-44cb-aaa8-cf8c11515c8d"),
-            "catalog=https://fair.healthinformationportal.eu/catalog/1c75c2c9-d2cc-44cb-aaa8-cf8c11515c8d;"
-            "dataset=https://fair.healthinformationportal.eu/dataset/898ca4b8-197b-4d40-bc81-d9cd88197670":
-                URIRef("https://fair.healthinformationportal.eu/dataset/898ca4b8-197b-4d40-bc81-d9cd88197670"),
-            "catalog=https://fair.healthinformationportal.eu/catalog/14225c50-00b0-4fba-8300-a677ab0c86f4":
-                URIRef("https://fair.healthinformationportal.eu/catalog/14225c50-00b0-4fba-8300-a677ab0c86f4"),
-            "catalog=https://fair.healthinformationportal.eu/catalog/14225c50-00b0-4fba-8300-a677ab0c86f4;"
-            "dataset=https://fair.healthinformationportal.eu/dataset/32bd0246-b731-480a-b5f4-a2f60ccaebc9":
-                URIRef("https://fair.healthinformationportal.eu/dataset/32bd0246-b731-480a-b5f4-a2f60ccaebc9"),
-            "catalog=https://fair.healthinformationportal.eu/catalog/17412bc2-daf1-491e-94fb-6680f7a67b1e":
-                URIRef("https://fair.healthinformationportal.eu/catalog/17412bc2-daf1-491e-94fb-6680f7a67b1e")
-        }
+from ckanext.fairdatapoint.fair_data_point_main import main
+from ckanext.fairdatapoint.harvesters.domain.document_limits import DEFAULT_MAX_BODY_SIZE
+from ckanext.fairdatapoint.harvesters.domain.snapshot import CrawlStatistics
 
-TEST_NO_DATASETS_DICT = {
-            "catalog=https://fair.healthinformationportal.eu/catalog/1c75c2c9-d2cc-44cb-aaa8-cf8c11515c8d":
-                URIRef("https://fair.healthinformationportal.eu/catalog/1c75c2c9-d2cc-44cb-aaa8-cf8c11515c8d")}
 
+class TestFDPPlugin:
+    @patch("ckanext.fairdatapoint.crawl.crawl_snapshot")
+    def test_main(self, crawl_snapshot, tmp_path, monkeypatch, capsys):
+        crawl_snapshot.return_value = CrawlStatistics(
+            records=10, failed_records=0, skipped_documents=0, documents=25, triples=500, size=2048, seconds=2.0
+        )
+        output = str(tmp_path / "snapshot.nq.gz")
+        monkeypatch.setattr(
+            "sys.argv", ["fair_data_point_main", "https://fdp.example.org", "-o", output, "--concurrency", "4"]
+        )
 
-def get_iterable_for_mock():
-    return TEST_CAT_IDS_DICT.keys()
+        with pytest.raises(SystemExit) as exit_info:
+            main()
 
+        assert exit_info.value.code == 0
+        crawl_snapshot.assert_called_once_with(
+            "https://fdp.example.org",
+            output,
+            harvest_catalogs=False,
+            fetch_concurrency=4,
+            cache_size=1024,
+            request_timeout=100,
+            connect_timeout=10,
+            request_retries=3,
+            max_body_size=DEFAULT_MAX_BODY_SIZE,
+        )
+        assert "5.0 records/s, 12.5 documents/s" in capsys.readouterr().out
 
-def get_no_dataset_keys():
-    return TEST_NO_DATASETS_DICT.keys()
+    def test_main_requires_output(self, monkeypatch):
+        monkeypatch.setattr("sys.argv", ["fair_data_point_main", "https://fdp.example.org"])
 
+        with pytest.raises(SystemExit) as exit_info:
+            main()
 
-class TestFDPPlugin:
-    @patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider.FairDataPointRecordProvider"
-           ".get_record_ids")
-    def test_main(self, get_record_ids, mocker):
-        spy = mocker.spy(FairDataPointRecordProvider, "__init__")
-        main()
-        assert spy.call_count == 3
-        expected_calls = [
-            "https://fair.healthinformationportal.eu",
-            "https://health-ri.sandbox.semlab-leiden.nl/",
-            "https://portal-gdi-nl.molgeniscloud.org/api/fdp/"
-        ]
-        real_arguments = [x.args[1] for x in spy.call_args_list]
-        assert spy.call_count == 3
-        get_record_ids.assert_called()
-        assert real_arguments == expected_calls
+        assert exit_info.value.code != 0
+
+    def test_main_does_not_import_ckan(self):
+        # Importing ckan or ckanext.harvest fails, as it would where CKAN is not installed
+        script = (
+            "import sys\n"
+            "class BlockCkan:\n"
+            "    def find_spec(self, name, path=None, target=None):\n"
+            "        if name.split('.')[0] == 'ckan' or name.startswith('ckanext.harvest'):\n"
+            "            raise ImportError(name)\n"
+            "sys.meta_path.insert(0, BlockCkan())\n"
+            "import ckanext.fairdatapoint.fair_data_point_main\n"
+        )
 
-    @patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider.FairDataPointRecordProvider"
-           ".get_record_ids")
-    @patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider.FairDataPointRecordProvider"
-           ".get_record_by_id")
-    @patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider.FairDataPointRecordProvider"
-           ".__init__")
-    def test_main_get_record_by_id(self, init_fdp, get_record_by_id, get_record_ids):
-        init_fdp.return_value = None
-        get_record_ids.side_effect = get_iterable_for_mock
-        main()
-        assert get_record_by_id.call_count == 3
+        result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
 
-    @patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider.FairDataPointRecordProvider"
-           ".get_record_ids")
-    @patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider.FairDataPointRecordProvider"
-           ".get_record_by_id")
-    @patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider.FairDataPointRecordProvider"
-           ".__init__")
-    def test_main_get_record_by_id(self, init_fdp, get_record_by_id, get_record_ids):
-        init_fdp.return_value = None
-        get_record_ids.side_effect = get_no_dataset_keys
-        main()
-        assert get_record_by_id.call_count == 0
+        assert result.returncode == 0, result.stderr
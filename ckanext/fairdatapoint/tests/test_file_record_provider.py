@@ -0,0 +1,106 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import gzip
+import shutil
+from pathlib import Path
+
+import pytest
+from rdflib import Dataset, Graph, URIRef
+from rdflib.compare import to_isomorphic
+
+from ckanext.fairdatapoint.harvesters.domain.file_record_provider import (
+    FileRecordProvider,
+    FileRecordProviderException,
+    load_file_source,
+    resolve_file_source,
+)
+
+TEST_DATA_DIRECTORY = Path(Path(__file__).parent.resolve(), "test_data")
+DATASET_URL = "https://health-ri.sandbox.semlab-leiden.nl/dataset/d7129d28-b72a-437f-8db0-4f0258dd3c25"
+DISTRIBUTION_URL = "https://health-ri.sandbox.semlab-leiden.nl/distribution/f9b9dff8-a039-4ca2-be9b-da72a61e3bac"
+DOCUMENTS = {
+    DATASET_URL: "dataset_d7129d28-b72a-437f-8db0-4f0258dd3c25.ttl",
+    DISTRIBUTION_URL: "distribution_f9b9dff8-a039-4ca2-be9b-da72a61e3bac.ttl",
+}
+
+
+def expected_record() -> Graph:
+    return Graph().parse(Path(TEST_DATA_DIRECTORY, "dataset_d7129d28-b72a-437f-8db0-4f0258dd3c25_out.ttl"))
+
+
+@pytest.fixture
+def directory_source(tmp_path):
+    for file_name in DOCUMENTS.values():
+        shutil.copy(Path(TEST_DATA_DIRECTORY, file_name), tmp_path)
+    (tmp_path / "README.txt").write_text("Not RDF")
+    return tmp_path
+
+
+@pytest.fixture
+def nquads_source(tmp_path):
+    # A dump with a named graph per document, as a crawl of the FDP would write it
+    dataset = Dataset()
+    for url, file_name in DOCUMENTS.items():
+        dataset.graph(URIRef(url)).parse(Path(TEST_DATA_DIRECTORY, file_name))
+    path = tmp_path / "snapshot.nq.gz"
+    with gzip.open(path, "wb") as dump:
+        dump.write(dataset.serialize(format="nquads", encoding="utf-8"))
+    return path
+
+
+@pytest.mark.parametrize("source", ["directory_source", "nquads_source"])
+def test_get_record_ids(request, source):
+    provider = FileRecordProvider(request.getfixturevalue(source))
+
+    assert list(provider.get_record_ids()) == [f"dataset={DATASET_URL}"]
+
+
+@pytest.mark.parametrize("source", ["directory_source", "nquads_source"])
+def test_get_record_by_id(request, source):
+    provider = FileRecordProvider(request.getfixturevalue(source))
+
+    actual = Graph().parse(data=provider.get_record_by_id(f"dataset={DATASET_URL}"))
+
+    assert to_isomorphic(actual) == to_isomorphic(expected_record())
+
+
+def test_get_records(nquads_source):
+    provider = FileRecordProvider(nquads_source, content_format="ntriples")
+
+    [(guid, (record, graph))] = list(provider.get_records())
+
+    assert guid == f"dataset={DATASET_URL}"
+    assert to_isomorphic(graph) == to_isomorphic(expected_record())
+    assert to_isomorphic(Graph().parse(data=record, format="nt")) == to_isomorphic(expected_record())
+
+
+def test_get_record_ids_harvest_catalogs(tmp_path):
+    shutil.copy(Path(TEST_DATA_DIRECTORY, "fdp_catalog.ttl"), tmp_path)
+
+    assert not list(FileRecordProvider(tmp_path).get_record_ids())
+    assert all(guid.startswith("catalog=") for guid in FileRecordProvider(tmp_path, True).get_record_ids())
+
+
+def test_load_file_source_reuses_unchanged_source(directory_source):
+    source = load_file_source(directory_source)
+
+    assert load_file_source(directory_source) is source
+    shutil.copy(Path(TEST_DATA_DIRECTORY, "fdp_catalog.ttl"), directory_source)
+    assert load_file_source(directory_source) is not source
+
+
+def test_load_file_source_missing(tmp_path):
+    with pytest.raises(FileRecordProviderException, match="does not exist"):
+        load_file_source(tmp_path / "missing.nq")
+
+
+def test_resolve_file_source(tmp_path):
+    dump = tmp_path / "snapshot.nq"
+
+    assert resolve_file_source(dump.as_uri(), str(tmp_path)) == dump.resolve()
+    with pytest.raises(FileRecordProviderException, match="not enabled"):
+        resolve_file_source(dump.as_uri(), None)
+    with pytest.raises(FileRecordProviderException, match="not inside"):
+        resolve_file_source((tmp_path / ".." / "snapshot.nq").as_uri(), str(tmp_path))
@@ -0,0 +1,34 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from rdflib import Graph
+
+from ckanext.fairdatapoint.harvesters.domain.graph_cache import GraphCache
+
+
+class TestGraphCache:
+    def test_pop_returns_graph_once(self):
+        cache = GraphCache(max_size=2)
+        graph = Graph()
+        cache.put("ho-1", "content", graph)
+
+        assert cache.pop("ho-1", "content") is graph
+        assert cache.pop("ho-1", "content") is None
+
+    def test_changed_content_does_not_match(self):
+        cache = GraphCache(max_size=2)
+        cache.put("ho-1", "content", Graph())
+
+        assert cache.pop("ho-1", "other content") is None
+        assert cache.pop("ho-2", "content") is None
+
+    def test_least_recently_put_graph_is_evicted(self):
+        cache = GraphCache(max_size=2)
+        graphs = [Graph(), Graph(), Graph()]
+        for i, graph in enumerate(graphs):
+            cache.put(f"ho-{i}", "content", graph)
+
+        assert len(cache) == 2
+        assert cache.pop("ho-0", "content") is None
+        assert cache.pop("ho-2", "content") is graphs[2]
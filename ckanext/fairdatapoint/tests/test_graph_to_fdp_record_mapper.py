@@ -0,0 +1,55 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import gc
+import weakref
+from pathlib import Path
+
+import pytest
+from rdflib import DCAT, Graph
+
+from ckanext.fairdatapoint.harvesters.domain.fdp_record import FdpRecord
+from ckanext.fairdatapoint.harvesters.domain.graph_to_fdp_record_mapper import (
+    GraphToFdpRecordMapper,
+)
+
+TEST_DATA_DIRECTORY = Path(Path(__file__).parent.resolve(), "test_data")
+
+
+class TestGraphToFdpRecordMapper:
+    def test_map_catalog(self):
+        url = "https://fair.healthinformationportal.eu/catalog/1c75c2c9-d2cc-44cb-aaa8-cf8c11515c8d"
+        graph = Graph().parse(Path(TEST_DATA_DIRECTORY, "fdp_catalog.ttl"))
+
+        record = GraphToFdpRecordMapper(url).map(graph)
+
+        assert record.is_catalog()
+        assert not record.is_dataset()
+        assert not record.is_dataseries()
+        assert record.children() == {
+            "https://fair.healthinformationportal.eu/dataset/125c32c0-3aa8-4277-92f6-34acdd058d43"
+        }
+
+    def test_map_does_not_retain_graph(self):
+        url = "https://fair.healthinformationportal.eu/catalog/1c75c2c9-d2cc-44cb-aaa8-cf8c11515c8d"
+        graph = Graph().parse(Path(TEST_DATA_DIRECTORY, "fdp_catalog.ttl"))
+        graph_ref = weakref.ref(graph)
+
+        record = GraphToFdpRecordMapper(url).map(graph)
+        del graph
+        gc.collect()
+
+        assert graph_ref() is None
+        assert record.is_catalog()
+
+    def test_map_pass_none(self):
+        with pytest.raises(ValueError, match="rdf_graph cannot be None"):
+            GraphToFdpRecordMapper("http://example.org/catalog").map(None)
+
+    def test_record_has_no_instance_dict(self):
+        record = FdpRecord("http://example.org/dataset", types=[DCAT.Dataset])
+
+        assert not hasattr(record, "__dict__")
+        assert record.is_dataset()
+        assert record.children() == set()
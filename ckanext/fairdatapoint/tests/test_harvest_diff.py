@@ -0,0 +1,59 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from rdflib import BNode, Graph, Literal, URIRef
+
+from ckanext.fairdatapoint.harvesters.domain.harvest_diff import (
+    DiffCache,
+    HarvestDiff,
+    diff_records,
+    estimate_import_seconds,
+    graph_digest,
+)
+
+SUBJECT = URIRef("http://example.org/dataset")
+PREDICATE = URIRef("http://example.org/temporal")
+VALUE = URIRef("http://example.org/start")
+
+
+def _graph(value: str) -> Graph:
+    graph = Graph()
+    node = BNode()
+    graph.add((SUBJECT, PREDICATE, node))
+    graph.add((node, VALUE, Literal(value)))
+    return graph
+
+
+def test_graph_digest_ignores_blank_node_labels():
+    assert graph_digest(_graph("2020")) == graph_digest(_graph("2020"))
+    assert graph_digest(_graph("2020")) != graph_digest(_graph("2021"))
+
+
+def test_diff_records():
+    crawled = {"new": "a", "same": "b", "different": "c", "unknown": None}
+    current = {"same": "b", "different": "d", "unknown": "e", "gone": "f"}
+
+    new, changed, unchanged, deleted = diff_records(crawled, current)
+
+    assert new == {"new"}
+    assert changed == {"different", "unknown"}
+    assert unchanged == {"same"}
+    assert deleted == {"gone"}
+
+
+def test_estimate_import_seconds():
+    assert estimate_import_seconds(10, [0.5, 1.0, 60.0]) == 10.0
+    assert estimate_import_seconds(10, []) is None
+
+
+def test_diff_cache_expires():
+    now = [0.0]
+    cache = DiffCache(ttl=10, clock=lambda: now[0])
+    diff = HarvestDiff(1, 2, None, 3, 0, 1.5, None)
+    cache.put("source-1", diff)
+
+    now[0] = 10
+    assert cache.get("source-1") is diff
+    now[0] = 11
+    assert cache.get("source-1") is None
@@ -2,10 +2,25 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import time
+
 import pytest
+import requests
 from unittest.mock import patch, MagicMock
 
+from rdflib import Graph
+
 from ckanext.fairdatapoint.harvesters.civity_harvester import CivityHarvester
+from ckanext.fairdatapoint.harvesters.domain.blob_store import ContentBlobStore
+from ckanext.fairdatapoint.harvesters.domain.content_compression import (
+    compress_content,
+    decompress_content,
+)
+from ckanext.fairdatapoint.harvesters.domain.circuit_breaker import DEFAULT_FAILURE_THRESHOLD
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider import FairDataPointRecordProvider
+from ckanext.fairdatapoint.harvesters.domain.graph_cache import GraphCache
+from ckanext.fairdatapoint.harvesters.domain.record_to_package_pool import ConversionResult
+from ckanext.fairdatapoint.tests.benchmarks.synthetic_fdp import SyntheticFdp, SyntheticFdpServer
 from ckanext.harvest.model import HarvestObjectExtra as HOExtra
 
 
@@ -43,8 +58,12 @@ def harvest_object(mock_harvest_source, mock_harvest_job):
 def dummy_harvester():
     class DummyFDPHarvester(CivityHarvester):
         def setup_record_provider(self, harvest_url, harvest_config_dict):
-            self.record_provider = MagicMock()
-            self.record_provider.get_record_by_id = MagicMock()
+            self.record_provider = self.create_record_provider(harvest_url, harvest_config_dict)
+
+        def create_record_provider(self, harvest_url, harvest_config_dict):
+            record_provider = MagicMock()
+            record_provider.get_record_by_id = MagicMock()
+            return record_provider
 
         def setup_record_to_package_converter(self, harvest_url, harvest_config_dict):
             self.record_to_package_converter = MagicMock()
@@ -63,8 +82,12 @@ def configurable_harvester():
     def _create(record_return_value, package_return_value):
         class DummyFDPHarvester(CivityHarvester):
             def setup_record_provider(self, url, config):
-                self.record_provider = MagicMock()
-                self.record_provider.get_record_by_id = MagicMock(return_value=record_return_value)
+                self.record_provider = self.create_record_provider(url, config)
+
+            def create_record_provider(self, url, config):
+                record_provider = MagicMock()
+                record_provider.get_record_by_id = MagicMock(return_value=record_return_value)
+                return record_provider
 
             def setup_record_to_package_converter(self, url, config):
                 self.record_to_package_converter = MagicMock()
@@ -334,3 +357,669 @@ def test_import_stage_dataset_links_to_existing_series(configurable_harvester, h
         # Ensure that only the dataset receives the in_series update
         assert dataseries_guid in updated_pkg["in_series"]
         mock_session.commit.assert_called()
+
+
+def test_fetch_stage_compresses_content(configurable_harvester, harvest_object):
+    harvester = configurable_harvester("<rdf>dummy content</rdf>", None)
+    harvester.content_compression = "zlib"
+
+    result = harvester.fetch_stage(harvest_object)
+
+    assert result is True
+    assert harvest_object.content.startswith("#fdp-compressed: zlib\n")
+    assert decompress_content(harvest_object.content) == "<rdf>dummy content</rdf>"
+
+
+def test_import_stage_decompresses_content(dummy_harvester, harvest_object):
+    dummy_harvester.setup_record_to_package_converter(harvest_object.source.url, {})
+    dummy_harvester.record_to_package_converter.record_to_package.return_value = {
+        "title": "My Dataset",
+        "name": "my-dataset",
+        "resources": []
+    }
+    harvest_object.guid = "catalog=https://fdp.example.org/catalog/abc"
+    harvest_object.content = compress_content("<rdf>dummy content</rdf>", "zlib")
+
+    with patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session"):
+        result = dummy_harvester.import_stage(harvest_object)
+
+    assert result is True
+    dummy_harvester.record_to_package_converter.record_to_package.assert_called_once_with(
+        harvest_object.guid, "<rdf>dummy content</rdf>"
+    )
+
+
+def test_fetch_and_import_with_blob_store(configurable_harvester, dummy_harvester, harvest_object, tmp_path):
+    harvester = configurable_harvester("<rdf>dummy content</rdf>", None)
+    harvester.content_compression = "zlib"
+    harvester.content_blob_store = ContentBlobStore(tmp_path)
+
+    assert harvester.fetch_stage(harvest_object) is True
+    assert harvest_object.content.startswith("#fdp-blob: sha256:")
+
+    dummy_harvester.setup_record_to_package_converter(harvest_object.source.url, {})
+    dummy_harvester.content_blob_store = ContentBlobStore(tmp_path)
+    dummy_harvester.record_to_package_converter.record_to_package.return_value = {
+        "title": "My Dataset",
+        "name": "my-dataset",
+        "resources": []
+    }
+    harvest_object.guid = "catalog=https://fdp.example.org/catalog/abc"
+
+    with patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session"):
+        result = dummy_harvester.import_stage(harvest_object)
+
+    assert result is True
+    dummy_harvester.record_to_package_converter.record_to_package.assert_called_once_with(
+        harvest_object.guid, "<rdf>dummy content</rdf>"
+    )
+
+
+def test_import_stage_blob_reference_without_blob_store(dummy_harvester, harvest_object):
+    dummy_harvester.setup_record_to_package_converter(harvest_object.source.url, {})
+    harvest_object.content = "#fdp-blob: sha256:" + "0" * 64
+
+    result = dummy_harvester.import_stage(harvest_object)
+
+    assert result is False
+    assert "no blob store is configured" in dummy_harvester._save_object_error.call_args[0][0]
+
+
+class InlineRecordToPackagePool:
+    """Converts in the calling process, so the test can use the mocked converter"""
+
+    max_pending = 2
+
+    def __init__(self, converter, max_workers=None):
+        self.converter = converter
+        self.submitted = []
+
+    @property
+    def pending(self):
+        return len(self.submitted)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def submit(self, request):
+        assert self.pending < self.max_pending
+        self.submitted.append(request)
+
+    def collect(self):
+        # Completes one conversion at a time, in order of submission
+        request = self.submitted.pop(0)
+        try:
+            package_dict = self.converter.record_to_package(
+                request.guid, request.record, series_mapping=request.series_mapping
+            )
+            yield ConversionResult(request.key, package_dict)
+        except Exception as e:
+            yield ConversionResult(request.key, None, e)
+
+
+def _batch_harvest_object(mock_harvest_source, object_id, guid, status="new", content="<rdf>dummy</rdf>"):
+    obj = MagicMock()
+    obj.id = object_id
+    obj.guid = guid
+    obj.extras = [HOExtra(key="status", value=status)]
+    obj.content = content
+    obj.source = mock_harvest_source
+    return obj
+
+
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.RecordToPackagePool", InlineRecordToPackagePool)
+def test_import_stage_batch(dummy_harvester, mock_harvest_source):
+    dataset = _batch_harvest_object(mock_harvest_source, "ho-dataset", "dataset=https://fdp.example.org/dataset/abc")
+    dataset.extras.append(HOExtra(key="depends_on", value='["https://fdp.example.org/datasetseries/xyz"]'))
+    series = _batch_harvest_object(
+        mock_harvest_source, "ho-series", "dataseries=https://fdp.example.org/datasetseries/xyz"
+    )
+    broken = _batch_harvest_object(mock_harvest_source, "ho-broken", "dataset=https://fdp.example.org/dataset/def")
+    empty = _batch_harvest_object(
+        mock_harvest_source, "ho-empty", "dataset=https://fdp.example.org/dataset/ghi", content=None
+    )
+
+    imported_guids = []
+
+    def record_to_package(guid, record, series_mapping=None):
+        if guid == broken.guid:
+            raise ValueError("fail")
+        return {
+            "title": guid,
+            "name": guid.split("/")[-1],
+            "owner_org": "org-id",
+            "resources": [],
+            "series_mapping": series_mapping,
+        }
+
+    def create_or_update_package(package_dict, create_or_update, context, harvest_object):
+        imported_guids.append(harvest_object.guid)
+        return "pkg-123"
+
+    dummy_harvester.import_stage = MagicMock(wraps=dummy_harvester.import_stage)
+    dummy_harvester.setup_record_to_package_converter = MagicMock()
+    dummy_harvester.record_to_package_converter = MagicMock()
+    dummy_harvester.record_to_package_converter.record_to_package.side_effect = record_to_package
+    dummy_harvester._create_or_update_package = MagicMock(side_effect=create_or_update_package)
+
+    with patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session") as mock_session:
+        mock_query = mock_session.query.return_value
+        mock_query.join.return_value.filter.return_value.filter.return_value.filter.return_value.all.return_value = [
+            (series.guid, "series-xyz")
+        ]
+
+        results = dummy_harvester.import_stage_batch([dataset, series, broken, empty], max_workers=2)
+
+    assert results == {"ho-dataset": True, "ho-series": True, "ho-broken": False, "ho-empty": False}
+    # The dataset is held until the series it depends on is imported, the independent broken dataset is not
+    assert imported_guids == [series.guid, dataset.guid]
+    converted_guids = [c[0][0] for c in dummy_harvester.record_to_package_converter.record_to_package.call_args_list]
+    assert converted_guids == [series.guid, broken.guid, dataset.guid]
+    dataset_package = dummy_harvester._create_or_update_package.call_args_list[1][0][0]
+    assert dataset_package["series_mapping"] == {series.guid: {"id": "series-xyz"}}
+    assert {"key": "guid", "value": "https://fdp.example.org/dataset/abc"} in dataset_package["extras"]
+    assert dummy_harvester._save_object_error.call_count == 2
+
+
+def test_import_stage_batch_empty(dummy_harvester):
+    assert dummy_harvester.import_stage_batch([]) == {}
+
+
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.RecordToPackagePool", InlineRecordToPackagePool)
+def test_import_stage_batch_bounds_submissions(dummy_harvester, mock_harvest_source):
+    harvest_objects = [
+        _batch_harvest_object(mock_harvest_source, f"ho-{i}", f"catalog=https://fdp.example.org/catalog/{i}")
+        for i in range(5)
+    ]
+    dummy_harvester._load_content = MagicMock(side_effect=lambda content: content)
+    dummy_harvester.setup_record_to_package_converter = MagicMock()
+    dummy_harvester.record_to_package_converter = MagicMock()
+    dummy_harvester.record_to_package_converter.record_to_package.side_effect = lambda guid, record, **kwargs: {
+        "title": guid, "name": guid.split("/")[-1], "owner_org": "org-id", "resources": []
+    }
+
+    with patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session"):
+        results = dummy_harvester.import_stage_batch(harvest_objects)
+
+    # The pool never holds more than max_pending records, the content of the others is loaded as results come in
+    assert results == {f"ho-{i}": True for i in range(5)}
+    assert dummy_harvester._load_content.call_count == 5
+
+
+def test_import_stage_leaves_batch_import_pending(dummy_harvester, harvest_object):
+    harvest_object.content = "<rdf>dummy content</rdf>"
+    dummy_harvester.batch_import = True
+
+    with patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session") as mock_session:
+        result = dummy_harvester.import_stage(harvest_object)
+
+    assert result == "unchanged"
+    assert ("import_pending", "true") in [(extra.key, extra.value) for extra in harvest_object.extras]
+    dummy_harvester.record_to_package_converter.record_to_package.assert_not_called()
+    dummy_harvester._create_or_update_package.assert_not_called()
+    mock_session.commit.assert_called_once()
+
+
+def _dependent_harvest_object(harvest_object):
+    harvest_object.content = "<rdf>dummy content</rdf>"
+    harvest_object.harvest_job_id = "harvest-job-1"
+    harvest_object.extras.append(HOExtra(key="depends_on", value='["https://fdp.example.org/datasetseries/xyz"]'))
+    return harvest_object
+
+
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.time.sleep")
+def test_import_stage_waits_for_series_of_same_job(mock_sleep, dummy_harvester, harvest_object):
+    harvest_object = _dependent_harvest_object(harvest_object)
+    series_guid = "dataseries=https://fdp.example.org/datasetseries/xyz"
+    # The series is fetched and imported by other consumers during the first two checks
+    polls = iter([[(series_guid,)], [(series_guid,)], []])
+    dummy_harvester.setup_record_to_package_converter = MagicMock()
+    dummy_harvester.record_to_package_converter = MagicMock()
+    dummy_harvester.record_to_package_converter.record_to_package.return_value = {
+        "title": "My Dataset", "owner_org": "org-id", "resources": []
+    }
+
+    with patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session") as mock_session:
+        query = mock_session.query.return_value.filter.return_value.filter.return_value.filter.return_value.filter
+        query.return_value.__iter__.side_effect = lambda: iter(next(polls))
+        assert dummy_harvester.import_stage(harvest_object) is True
+
+    # The series is looked up by its exact GUID
+    criterion = query.call_args.args[0].compile(compile_kwargs={"literal_binds": True})
+    assert str(criterion) == f"harvest_object.guid IN ('{series_guid}')"
+    assert mock_sleep.call_count == 2
+    dummy_harvester.record_to_package_converter.record_to_package.assert_called_once()
+
+
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.time.monotonic")
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.time.sleep")
+def test_import_stage_stops_waiting_for_series(mock_sleep, mock_monotonic, dummy_harvester, harvest_object):
+    harvest_object = _dependent_harvest_object(harvest_object)
+    mock_monotonic.side_effect = [0, 30, 61]
+    dummy_harvester.setup_record_to_package_converter = MagicMock()
+    dummy_harvester.record_to_package_converter = MagicMock()
+    dummy_harvester.record_to_package_converter.record_to_package.return_value = {
+        "title": "My Dataset", "owner_org": "org-id", "resources": []
+    }
+
+    with patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session") as mock_session:
+        query = mock_session.query.return_value.filter.return_value.filter.return_value.filter.return_value.filter
+        query.return_value.__iter__.side_effect = lambda: iter([("dataseries=https://fdp.example.org/datasetseries/xyz",)])
+        assert dummy_harvester.import_stage(harvest_object) is True
+
+    # Imported without the series after the dependency timeout
+    assert mock_sleep.call_count == 1
+    dummy_harvester.record_to_package_converter.record_to_package.assert_called_once()
+
+
+def test_claim_pending_imports(mock_harvest_source):
+    pending = _batch_harvest_object(mock_harvest_source, "ho-1", "dataset=https://fdp.example.org/dataset/1")
+    pending.extras.append(HOExtra(key="import_pending", value="true"))
+
+    with patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session") as mock_session:
+        query = mock_session.query.return_value.join.return_value.filter.return_value.filter.return_value
+        query.filter.return_value.order_by.return_value.limit.return_value.with_for_update.return_value.all.return_value = [
+            pending
+        ]
+        claimed = CivityHarvester.claim_pending_imports("civity-source-id", 10)
+
+    assert claimed == [pending]
+    query.filter.return_value.order_by.return_value.limit.assert_called_once_with(10)
+    with_for_update = query.filter.return_value.order_by.return_value.limit.return_value.with_for_update
+    assert with_for_update.call_args.kwargs["skip_locked"] is True
+    assert [extra.key for extra in pending.extras] == ["status"]
+    assert pending.state == "IMPORT"
+    assert pending.import_started is not None
+    mock_session.commit.assert_called_once()
+
+
+def test_fetch_and_import_with_graph_cache(configurable_harvester, dummy_harvester, harvest_object):
+    graph = MagicMock()
+    fetch_harvester = configurable_harvester(None, None)
+    fetch_harvester.graph_cache = GraphCache()
+    fetch_harvester.setup_record_provider = MagicMock()
+    fetch_harvester.record_provider = MagicMock()
+    fetch_harvester.record_provider.get_record_with_graph_by_id.return_value = ("<rdf>dummy content</rdf>", graph)
+
+    with patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session"):
+        assert fetch_harvester.fetch_stage(harvest_object) is True
+
+    dummy_harvester.graph_cache = fetch_harvester.graph_cache
+    dummy_harvester._load_content = MagicMock()
+    dummy_harvester.setup_record_to_package_converter = MagicMock()
+    dummy_harvester.record_to_package_converter = MagicMock()
+    dummy_harvester.record_to_package_converter.record_to_package.return_value = {
+        "title": "My Dataset",
+        "name": "my-dataset",
+        "owner_org": "org-id",
+        "resources": [],
+    }
+
+    with patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session"):
+        assert dummy_harvester.import_stage(harvest_object) is True
+
+    dummy_harvester._load_content.assert_not_called()
+    call = dummy_harvester.record_to_package_converter.record_to_package.call_args
+    assert call[0] == (harvest_object.guid, None)
+    assert call[1]["graph"] is graph
+    assert len(dummy_harvester.graph_cache) == 0
+
+
+def test_fetch_stage_records_dependencies(configurable_harvester, harvest_object):
+    harvester = configurable_harvester("<rdf>dummy content</rdf>", None)
+    harvester._get_record_dependencies = MagicMock(return_value=["https://fdp.example.org/datasetseries/xyz"])
+
+    with patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session"):
+        assert harvester.fetch_stage(harvest_object) is True
+
+    depends_on = [extra.value for extra in harvest_object.extras if extra.key == "depends_on"]
+    assert depends_on == ['["https://fdp.example.org/datasetseries/xyz"]']
+
+
+def test_fetch_stage_skips_fetched_object(dummy_harvester, harvest_object):
+    harvest_object.content = "<rdf>fetched in a batch</rdf>"
+
+    assert dummy_harvester.fetch_stage(harvest_object) is True
+    dummy_harvester.record_provider.get_record_by_id.assert_not_called()
+
+
+def test_fetch_stage_batch(dummy_harvester, mock_harvest_source):
+    dataset, failing, empty = (
+        _batch_harvest_object(mock_harvest_source, f"ho-{i}", f"dataset=https://fdp.example.org/dataset/{i}", content=None)
+        for i in (1, 2, 3)
+    )
+    deleted = _batch_harvest_object(
+        mock_harvest_source, "ho-4", "dataset=https://fdp.example.org/dataset/4", status="delete", content=None
+    )
+    dummy_harvester.setup_record_provider(mock_harvest_source.url, {})
+    dummy_harvester.record_provider.get_records_by_ids.return_value = [
+        (dataset.guid, "<rdf>dataset 1</rdf>"),
+        (failing.guid, ValueError("unreachable")),
+        (empty.guid, ""),
+    ]
+
+    with patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session") as mock_session:
+        results = dummy_harvester.fetch_stage_batch([dataset, failing, empty, deleted])
+
+    assert results == {"ho-1": True, "ho-2": False, "ho-3": False, "ho-4": True}
+    dummy_harvester.record_provider.get_records_by_ids.assert_called_once_with(
+        [dataset.guid, failing.guid, empty.guid]
+    )
+    assert dataset.content == "<rdf>dataset 1</rdf>"
+    dataset.add.assert_called_once()
+    dataset.save.assert_not_called()
+    mock_session.commit.assert_called_once()
+    assert dummy_harvester._save_object_error.call_count == 2
+
+
+def test_fetch_stage_claims_batch(dummy_harvester, harvest_object, mock_harvest_source):
+    claimed = _batch_harvest_object(mock_harvest_source, "ho-claimed", "dataset=https://fdp.example.org/dataset/2")
+    dummy_harvester.fetch_batch_size = 10
+    dummy_harvester._claim_harvest_objects = MagicMock(return_value=[claimed])
+    dummy_harvester.fetch_stage_batch = MagicMock(return_value={harvest_object.id: True, claimed.id: False})
+
+    assert dummy_harvester.fetch_stage(harvest_object) is True
+
+    dummy_harvester._claim_harvest_objects.assert_called_once_with(harvest_object, 9)
+    dummy_harvester.fetch_stage_batch.assert_called_once_with([harvest_object, claimed])
+
+
+class FakeHarvestObject:
+    def __init__(self, guid, job, extras, package_id=None):
+        self.id = f"ho-{guid}"
+        self.guid = guid
+        self.package_id = package_id
+        self.extras = extras
+        self.content = None
+        self.add = MagicMock()
+
+
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.HarvestObject")
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session")
+def test_gather_stage_fetch_in_gather(mock_session, mock_HO, dummy_harvester, mock_harvest_job):
+    created = {}
+
+    def create_harvest_object(**kwargs):
+        created[kwargs["guid"]] = FakeHarvestObject(**kwargs)
+        return created[kwargs["guid"]]
+
+    mock_HO.side_effect = create_harvest_object
+    dummy_harvester.fetch_in_gather = True
+    dummy_harvester.gather_commit_size = 2
+    dummy_harvester._get_guids_to_package_ids_from_database = lambda job: {
+        "dataset=https://fdp.example.org/dataset/changed": "pkg-changed",
+        "dataset=https://fdp.example.org/dataset/deleted": "pkg-deleted",
+    }
+    dummy_harvester._get_record_dependencies = lambda guid, graph: ["https://fdp.example.org/series/1"] if graph else []
+    dummy_harvester._create_delete_object = MagicMock(return_value="ho-deleted")
+    dummy_harvester.setup_record_provider = MagicMock()
+    dummy_harvester.record_provider = MagicMock()
+    dummy_harvester.record_provider.get_records.return_value = [
+        ("dataset=https://fdp.example.org/dataset/new", ("<rdf>new</rdf>", "graph")),
+        ("dataset=https://fdp.example.org/dataset/changed", ("<rdf>changed</rdf>", None)),
+        ("dataseries=https://fdp.example.org/series/1", ("<rdf>series</rdf>", None)),
+        ("dataset=https://fdp.example.org/dataset/unreachable", ValueError("unreachable")),
+    ]
+
+    result = dummy_harvester.gather_stage(mock_harvest_job)
+
+    assert result == [
+        "ho-dataseries=https://fdp.example.org/series/1",
+        "ho-dataset=https://fdp.example.org/dataset/new",
+        "ho-dataset=https://fdp.example.org/dataset/changed",
+        "ho-dataset=https://fdp.example.org/dataset/unreachable",
+        "ho-deleted",
+    ]
+    new = created["dataset=https://fdp.example.org/dataset/new"]
+    assert new.content == "<rdf>new</rdf>"
+    assert [(e.key, e.value) for e in new.extras] == [
+        ("status", "new"), ("depends_on", '["https://fdp.example.org/series/1"]')
+    ]
+    assert created["dataset=https://fdp.example.org/dataset/changed"].package_id == "pkg-changed"
+    # Left to the fetch stage
+    assert created["dataset=https://fdp.example.org/dataset/unreachable"].content is None
+    dummy_harvester._create_delete_object.assert_called_once_with(
+        mock_harvest_job, "dataset=https://fdp.example.org/dataset/deleted", "pkg-deleted"
+    )
+    assert mock_session.commit.call_count == 3
+    dummy_harvester.record_provider.get_record_ids.assert_not_called()
+
+
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session")
+def test_gather_stage_fetch_in_gather_aborts_on_crawl_error(mock_session, dummy_harvester, mock_harvest_job):
+    def get_records():
+        raise ConnectionError("FDP unreachable")
+        yield
+
+    dummy_harvester.fetch_in_gather = True
+    dummy_harvester._get_guids_to_package_ids_from_database = lambda job: {}
+    dummy_harvester._save_gather_error = MagicMock()
+    dummy_harvester.setup_record_provider = MagicMock()
+    dummy_harvester.record_provider = MagicMock()
+    dummy_harvester.record_provider.get_records.side_effect = get_records
+
+    with pytest.raises(ConnectionError):
+        dummy_harvester.gather_stage(mock_harvest_job)
+
+    dummy_harvester._save_gather_error.assert_called_once()
+
+
+@patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point.time.sleep")
+@patch("ckanext.fairdatapoint.harvesters.domain.transport.requests.request")
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session")
+def test_gather_stage_fetch_in_gather_unreachable_root_deletes_nothing(
+    mock_session, mock_request, mock_sleep, dummy_harvester, mock_harvest_job
+):
+    mock_request.side_effect = requests.exceptions.ConnectionError("refused")
+    dummy_harvester.fetch_in_gather = True
+    dummy_harvester._get_guids_to_package_ids_from_database = lambda job: {
+        "dataset=https://unreachable.example.org/dataset/1": "pkg-1",
+        "dataset=https://unreachable.example.org/dataset/2": "pkg-2",
+    }
+    dummy_harvester.setup_record_provider = MagicMock()
+    dummy_harvester.record_provider = FairDataPointRecordProvider(
+        "https://unreachable.example.org", request_retries=1
+    )
+    dummy_harvester._create_delete_object = MagicMock()
+    dummy_harvester._save_gather_error = MagicMock()
+
+    result = dummy_harvester.gather_stage(mock_harvest_job)
+
+    assert result == []
+    assert mock_request.call_count == 2
+    dummy_harvester._create_delete_object.assert_not_called()
+    dummy_harvester._save_gather_error.assert_called()
+
+
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.HOExtra")
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.HarvestObject")
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session.query")
+def test_gather_stage_deadline_skips_deletes(mock_query, mock_HO, mock_HOExtra, dummy_harvester, mock_harvest_job):
+    def get_guids_in_harvest(job):
+        # The crawl stops when the deadline passes, returning the records found so far
+        time.sleep(0.02)
+        return {"guid-found"}
+
+    dummy_harvester.gather_deadline = 0.01
+    dummy_harvester._get_guids_in_harvest = get_guids_in_harvest
+    dummy_harvester._get_guids_to_package_ids_from_database = lambda job: {
+        "guid-found": "pkg-found",
+        "guid-not-reached": "pkg-not-reached",
+    }
+    dummy_harvester._create_delete_object = MagicMock()
+    dummy_harvester._save_gather_error = MagicMock()
+    mock_HO.return_value = MagicMock(id="ho-found")
+
+    result = dummy_harvester.gather_stage(mock_harvest_job)
+
+    assert result == ["ho-found"]
+    dummy_harvester._create_delete_object.assert_not_called()
+    message = dummy_harvester._save_gather_error.call_args.args[0]
+    assert "deadline" in message
+
+
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.HOExtra")
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.HarvestObject")
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session.query")
+def test_gather_stage_skipped_documents_skip_deletes(
+    mock_query, mock_HO, mock_HOExtra, dummy_harvester, mock_harvest_job
+):
+    dummy_harvester._get_guids_in_harvest = lambda job: {"guid-found"}
+    dummy_harvester._get_guids_to_package_ids_from_database = lambda job: {
+        "guid-found": "pkg-found",
+        "guid-below-skipped": "pkg-below-skipped",
+    }
+    dummy_harvester.setup_record_provider = MagicMock()
+    dummy_harvester.record_provider = MagicMock(
+        crawl_errors=[("http://example.com/catalog", Exception("Document exceeds the maximum body size"))]
+    )
+    dummy_harvester._create_delete_object = MagicMock()
+    dummy_harvester._save_gather_error = MagicMock()
+    mock_HO.return_value = MagicMock(id="ho-found")
+
+    result = dummy_harvester.gather_stage(mock_harvest_job)
+
+    assert result == ["ho-found"]
+    dummy_harvester._create_delete_object.assert_not_called()
+    message = dummy_harvester._save_gather_error.call_args.args[0]
+    assert "http://example.com/catalog" in message
+    assert "maximum body size" in message
+
+
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.HOExtra")
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.HarvestObject")
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session.query")
+def test_gather_stage_open_circuit_skips_deletes(mock_query, mock_HO, mock_HOExtra, dummy_harvester, mock_harvest_job):
+    fdp = SyntheticFdp(datasets=10, distributions=1)
+    send_request = requests.request
+
+    def request(method, url, **kwargs):
+        # The host stops answering after the catalog, so its circuit opens halfway through the datasets
+        if "/dataset/" in str(url):
+            raise requests.exceptions.ConnectionError("refused")
+        return send_request(method, url, **kwargs)
+
+    with SyntheticFdpServer(fdp) as server, patch(
+        "ckanext.fairdatapoint.harvesters.domain.transport.requests.request", side_effect=request
+    ) as mock_request:
+        catalog_guid = f"catalog={server.url}/catalog/0"
+        dummy_harvester._get_guids_to_package_ids_from_database = lambda job: {
+            catalog_guid: "pkg-catalog",
+            **{f"dataset={url}": f"pkg-{url}" for url in fdp.record_urls(server.url) if "/dataset/" in url},
+        }
+        dummy_harvester.setup_record_provider = MagicMock()
+        dummy_harvester.record_provider = FairDataPointRecordProvider(
+            server.root_url, harvest_catalogs=True, fetch_concurrency=1, request_retries=0
+        )
+        dummy_harvester._create_delete_object = MagicMock()
+        dummy_harvester._save_gather_error = MagicMock()
+        mock_HO.return_value = MagicMock(id="ho-catalog")
+
+        result = dummy_harvester.gather_stage(mock_harvest_job)
+
+    assert result == ["ho-catalog"]
+    dataset_requests = [c for c in mock_request.call_args_list if "/dataset/" in str(c.args[1])]
+    assert len(dataset_requests) == DEFAULT_FAILURE_THRESHOLD
+    dummy_harvester._create_delete_object.assert_not_called()
+    messages = [c.args[0] for c in dummy_harvester._save_gather_error.call_args_list]
+    assert len(messages) == 10
+    assert any("was not sent" in message for message in messages)
+
+
+@patch("ckanext.fairdatapoint.harvesters.civity_harvester.HarvestObject")
+def test_diff_stage_creates_no_harvest_objects(mock_HO, dummy_harvester, mock_harvest_source):
+    dummy_harvester._get_guids_to_package_ids_of_source = lambda source_id: {
+        "guid-existing": "pkg-existing",
+        "guid-gone": "pkg-gone",
+    }
+    dummy_harvester._get_import_durations_of_source = lambda source_id: [2.0, 2.0, 4.0]
+    record_provider = MagicMock(crawl_errors=[])
+    record_provider.get_record_ids.return_value = ["guid-existing", "guid-new"]
+    dummy_harvester.create_record_provider = MagicMock(return_value=record_provider)
+    harvest_record_provider = dummy_harvester.record_provider
+    mock_harvest_source.config = "{}"
+
+    diff = dummy_harvester.diff_stage(mock_harvest_source, fetch_concurrency=2, refresh=True)
+
+    assert (diff.new, diff.changed, diff.unchanged, diff.deleted) == (1, 1, None, 1)
+    assert diff.complete
+    # Two records found and one deletion
+    assert diff.estimated_import_seconds == 6.0
+    mock_HO.assert_not_called()
+    record_provider.get_records.assert_not_called()
+    # The dry run does not change the record provider of a harvest running on the same harvester
+    assert dummy_harvester.record_provider is harvest_record_provider
+    assert record_provider.fetch_concurrency == 2
+    # A second dry run returns the cached result
+    record_provider.get_record_ids.return_value = []
+    assert dummy_harvester.diff_stage(mock_harvest_source) == diff
+
+
+@pytest.mark.parametrize(
+    "crawl_errors, deadline_exceeded", [([("https://fdp.example.org/catalog", "unreachable")], False), ([], True)]
+)
+def test_diff_stage_reports_incomplete_crawl(dummy_harvester, mock_harvest_source, crawl_errors, deadline_exceeded):
+    dummy_harvester._get_guids_to_package_ids_of_source = lambda source_id: {
+        "guid-existing": "pkg-existing",
+        "guid-unseen": "pkg-unseen",
+    }
+    dummy_harvester._get_import_durations_of_source = lambda source_id: []
+    record_provider = MagicMock(crawl_errors=crawl_errors)
+    record_provider.get_record_ids.return_value = ["guid-existing"]
+    dummy_harvester.create_record_provider = MagicMock(return_value=record_provider)
+    mock_harvest_source.id = f"source-incomplete-{deadline_exceeded}"
+    mock_harvest_source.config = "{}"
+
+    with patch(
+        "ckanext.fairdatapoint.harvesters.civity_harvester.time_budget_exceeded", return_value=deadline_exceeded
+    ):
+        diff = dummy_harvester.diff_stage(mock_harvest_source)
+
+    assert not diff.complete
+    assert diff.crawl_errors == len(crawl_errors)
+    # Like the harvest, nothing is deleted after an incomplete crawl
+    assert diff.deleted == 0
+    # An incomplete result is not cached
+    record_provider.crawl_errors = []
+    with patch("ckanext.fairdatapoint.harvesters.civity_harvester.time_budget_exceeded", return_value=False):
+        assert dummy_harvester.diff_stage(mock_harvest_source).complete
+
+
+def test_diff_stage_compares_content(dummy_harvester, mock_harvest_source):
+    def record(value):
+        graph = Graph().parse(data=f'<http://example.org/s> <http://example.org/p> "{value}" .', format="nt")
+        return graph.serialize(format="turtle"), graph
+
+    dummy_harvester._get_guids_to_package_ids_of_source = lambda source_id: {
+        "guid-same": "pkg-same",
+        "guid-changed": "pkg-changed",
+        "guid-failed": "pkg-failed",
+    }
+    dummy_harvester._get_import_durations_of_source = lambda source_id: []
+    record_provider = MagicMock(crawl_errors=[])
+    record_provider.get_records.return_value = [
+        ("guid-same", record("same")),
+        ("guid-changed", record("new value")),
+        ("guid-failed", ConnectionError("unreachable")),
+    ]
+    dummy_harvester.create_record_provider = MagicMock(return_value=record_provider)
+    mock_harvest_source.id = "source-compare-content"
+    mock_harvest_source.config = "{}"
+    with patch("ckanext.fairdatapoint.harvesters.civity_harvester.model.Session.query") as mock_query:
+        mock_query.return_value.filter.return_value.filter.return_value.filter.return_value.filter.return_value = [
+            ("guid-same", record("same")[0]),
+            ("guid-changed", record("old value")[0]),
+            ("guid-failed", record("failed")[0]),
+        ]
+        diff = dummy_harvester.diff_stage(mock_harvest_source, compare_content=True, refresh=True)
+
+    assert (diff.new, diff.changed, diff.unchanged, diff.deleted, diff.failed) == (0, 2, 1, 0, 1)
+    assert diff.estimated_import_seconds is None
+    # Only the content of the records found is read
+    guid_filter = mock_query.return_value.filter.return_value.filter.return_value.filter.return_value.filter
+    assert str(guid_filter.call_args.args[0].compile(compile_kwargs={"literal_binds": True})).startswith(
+        "harvest_object.guid IN ("
+    )
@@ -0,0 +1,175 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from unittest.mock import MagicMock
+
+import pytest
+from requests.exceptions import ConnectTimeout
+
+from ckanext.fairdatapoint.harvesters.domain.host_limiter import (
+    HostLimiter,
+    HostLimiters,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _response(status_code, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return response
+
+
+def test_concurrency_limit():
+    limiter = HostLimiter(initial_concurrency=2, clock=FakeClock())
+
+    assert limiter.acquire(blocking=False)
+    assert limiter.acquire(blocking=False)
+    assert not limiter.acquire(blocking=False)
+
+    limiter.release()
+    assert limiter.acquire(blocking=False)
+
+
+def test_token_bucket():
+    clock = FakeClock()
+    limiter = HostLimiter(rate=2, burst=1, max_concurrency=10, initial_concurrency=10, clock=clock)
+
+    assert limiter.acquire(blocking=False)
+    assert not limiter.acquire(blocking=False)
+
+    clock.now = 0.5
+    assert limiter.acquire(blocking=False)
+
+
+def test_additive_increase_when_healthy():
+    limiter = HostLimiter(initial_concurrency=2, max_concurrency=3, clock=FakeClock())
+
+    for _ in range(10):
+        limiter.call(lambda: _response(200))
+
+    assert limiter.concurrency_limit == 3
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.parametrize("status_code", [429, 502, 503])
+def test_multiplicative_decrease_on_overload(status_code):
+    limiter = HostLimiter(initial_concurrency=8, clock=FakeClock())
+
+    limiter.call(lambda: _response(status_code))
+
+    assert limiter.concurrency_limit == 4
+
+
+def test_decrease_once_for_concurrent_failures():
+    clock = FakeClock()
+    limiter = HostLimiter(initial_concurrency=8, clock=clock)
+    limiter.acquire()
+    clock.now = 1.0
+    limiter.release(latency=1.0, status_code=200)
+
+    limiter.release(latency=1.0, status_code=503)
+    limiter.release(latency=1.0, status_code=503)
+
+    assert limiter.concurrency_limit == 4
+
+
+def test_decrease_on_latency_spike():
+    clock = FakeClock()
+    limiter = HostLimiter(initial_concurrency=8, max_concurrency=8, clock=clock)
+    limiter.release(latency=0.1, status_code=200)
+
+    limiter.release(latency=0.1, status_code=200)
+    assert limiter.concurrency_limit == 8
+
+    limiter.release(latency=1.0, status_code=200)
+    assert limiter.concurrency_limit == 4
+
+
+def test_recovers_after_lasting_latency_step():
+    clock = FakeClock()
+    limiter = HostLimiter(initial_concurrency=8, max_concurrency=8, clock=clock)
+    for _ in range(20):
+        clock.now += 0.1
+        limiter.release(latency=0.1, status_code=200)
+
+    # The host stays ten times slower, which is its new normal latency after a few responses
+    limits = []
+    for _ in range(100):
+        clock.now += 1.0
+        limiter.release(latency=1.0, status_code=200)
+        limits.append(limiter.concurrency_limit)
+
+    assert min(limits) < 8
+    assert limiter.concurrency_limit == 8
+
+
+def test_decrease_on_connection_failure():
+    limiter = HostLimiter(initial_concurrency=4, clock=FakeClock())
+
+    def fail():
+        raise ConnectTimeout("timed out")
+
+    with pytest.raises(ConnectTimeout):
+        limiter.call(fail)
+
+    assert limiter.concurrency_limit == 2
+    assert limiter.in_flight == 0
+
+
+def test_call_streamed_holds_slot_until_released():
+    limiter = HostLimiter(initial_concurrency=1, clock=FakeClock())
+
+    response, release = limiter.call_streamed(lambda: _response(503))
+
+    assert response.status_code == 503
+    # The response is recorded when it arrives, the slot is kept while the body is read
+    assert limiter.concurrency_limit == 1
+    assert limiter.in_flight == 1
+    assert not limiter.acquire(blocking=False)
+
+    release()
+    release()
+    assert limiter.in_flight == 0
+    assert limiter.acquire(blocking=False)
+    assert limiter.in_flight == 1
+
+
+def test_pause_on_retry_after():
+    clock = FakeClock()
+    limiter = HostLimiter(initial_concurrency=4, clock=clock)
+
+    limiter.call(lambda: _response(429, {"Retry-After": "5"}))
+
+    assert not limiter.acquire(blocking=False)
+    clock.now = 5.0
+    assert limiter.acquire(blocking=False)
+
+
+def test_host_limiters_by_host():
+    host_limiters = HostLimiters()
+
+    limiter = host_limiters.get("https://fdp.example.com/catalog/1")
+
+    assert host_limiters.get("https://FDP.example.com/dataset/2") is limiter
+    assert host_limiters.get("https://orcid.org/0000-0000") is not limiter
+
+
+def test_host_limiters_configure():
+    host_limiters = HostLimiters()
+    limiter = host_limiters.get("https://fdp.example.com")
+
+    host_limiters.configure()
+    assert host_limiters.get("https://fdp.example.com") is limiter
+
+    host_limiters.configure(max_concurrency=2)
+    assert host_limiters.get("https://fdp.example.com") is not limiter
+    assert host_limiters.get("https://fdp.example.com").max_concurrency == 2
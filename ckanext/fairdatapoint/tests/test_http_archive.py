@@ -0,0 +1,196 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import base64
+import gzip
+import io
+import json
+from unittest.mock import patch
+
+import pytest
+import requests
+from rdflib.compare import isomorphic
+from requests.exceptions import ConnectionError, ConnectTimeout
+
+from ckanext.fairdatapoint.harvesters.domain import transport
+from ckanext.fairdatapoint.harvesters.domain.document_limits import (
+    DocumentTooLargeException,
+    check_content_length,
+)
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider import (
+    FairDataPointRecordProvider,
+)
+from ckanext.fairdatapoint.harvesters.domain.http_archive import (
+    BODY_CHUNK_SIZE,
+    HttpArchiveException,
+    NotInArchiveException,
+    RecordingTransport,
+    ReplayTransport,
+    read_archive,
+)
+from ckanext.fairdatapoint.harvesters.domain.transport import use_transport
+from ckanext.fairdatapoint.tests.benchmarks.synthetic_fdp import SyntheticFdp, SyntheticFdpServer
+
+
+class BytesIOCountingReads(io.BytesIO):
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def crawl(url: str) -> dict:
+    provider = FairDataPointRecordProvider(url, fetch_concurrency=2, request_retries=5)
+    return {guid: fetched[1] for guid, fetched in provider.get_records()}
+
+
+def exchange(url, status=200, body=b"", headers=None, **kwargs) -> dict:
+    recorded = {
+        "method": "GET",
+        "url": url,
+        "status": status,
+        "headers": headers or {"Content-Type": "text/turtle"},
+        "body": base64.b64encode(body).decode("ascii"),
+        "elapsed": 0.5,
+    }
+    recorded.update(kwargs)
+    return recorded
+
+
+class TestHttpArchive:
+    @patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point.RETRY_BACKOFF", 0)
+    def test_replay_of_recorded_crawl(self, tmp_path):
+        archive = tmp_path / "crawl.jsonl.gz"
+        fdp = SyntheticFdp(datasets=12, distributions=1, series=2, orcid_contacts=2)
+        with SyntheticFdpServer(fdp, error_rate=0.1) as server:
+            with RecordingTransport(archive) as recording, use_transport(recording):
+                recorded = crawl(server.root_url)
+            requests_made = server.requests
+        assert recording.exchanges == requests_made
+
+        # The server is gone, every response comes from the archive
+        replay = ReplayTransport(archive)
+        with use_transport(replay):
+            replayed = crawl(server.root_url)
+
+        assert replay.misses == []
+        assert replay.replayed == requests_made
+        assert recorded.keys() == replayed.keys()
+        assert len(replayed) == fdp.records
+        for guid, graph in recorded.items():
+            assert isomorphic(graph, replayed[guid])
+
+    def test_responses_are_replayed_in_order(self):
+        replay = ReplayTransport(
+            [
+                exchange("https://fdp.example.org/", status=503),
+                exchange("https://fdp.example.org/", body=b"first"),
+                exchange("https://fdp.example.org/", body=b"last"),
+            ]
+        )
+        with use_transport(replay):
+            assert transport.get("https://fdp.example.org/").status_code == 503
+            assert transport.get("https://fdp.example.org/").content == b"first"
+            assert transport.get("https://fdp.example.org/").content == b"last"
+            assert transport.get("https://fdp.example.org/").content == b"last"
+
+    def test_replayed_response_is_streamed(self):
+        replay = ReplayTransport(
+            [exchange("https://fdp.example.org/", body=b"<a> <b> <c> .", headers={"Content-Type": "text/turtle"})]
+        )
+        response = replay.request("GET", "https://fdp.example.org/", stream=True)
+        response.raw.decode_content = True
+
+        assert response.headers["Content-Length"] == "13"
+        assert response.raw.read() == b"<a> <b> <c> ."
+
+    def test_errors_are_replayed(self):
+        replay = ReplayTransport(
+            [exchange("https://fdp.example.org/", error="ConnectTimeout", message="timed out")]
+        )
+        with pytest.raises(ConnectTimeout, match="timed out"):
+            replay.request("GET", "https://fdp.example.org/")
+
+    def test_request_not_in_archive(self):
+        replay = ReplayTransport([])
+
+        with pytest.raises(ConnectionError):
+            replay.request("GET", "https://fdp.example.org/")
+        with pytest.raises(NotInArchiveException):
+            replay.request("GET", "https://fdp.example.org/")
+        assert replay.misses == [("GET", "https://fdp.example.org/")] * 2
+
+    @patch("ckanext.fairdatapoint.harvesters.domain.http_archive.time.sleep")
+    def test_replay_with_timings(self, sleep):
+        exchanges = [exchange("https://fdp.example.org/", elapsed=1.5)]
+
+        ReplayTransport(exchanges).request("GET", "https://fdp.example.org/")
+        sleep.assert_not_called()
+
+        ReplayTransport(exchanges, timings=True).request("GET", "https://fdp.example.org/")
+        sleep.assert_called_once_with(1.5)
+
+    @patch("ckanext.fairdatapoint.harvesters.domain.transport.requests.request")
+    def test_recording(self, request, tmp_path):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = "https://fdp.example.org/"
+        response.headers["Content-Type"] = "text/turtle"
+        response.headers["Content-Encoding"] = "gzip"
+        response.raw = io.BytesIO(b"<a> <b> <c> .")
+        request.side_effect = [response, ConnectTimeout("timed out")]
+        archive = tmp_path / "archive.jsonl.gz"
+
+        with RecordingTransport(archive) as recording:
+            recorded = recording.request("GET", "https://fdp.example.org/", headers={"Accept": "text/turtle"})
+            with pytest.raises(ConnectTimeout):
+                recording.request("GET", "https://fdp.example.org/x")
+
+        assert recorded.content == b"<a> <b> <c> ."
+        first, second = read_archive(archive)
+        assert first["request_headers"] == {"Accept": "text/turtle"}
+        # The body is stored decompressed
+        assert first["headers"] == {"Content-Type": "text/turtle"}
+        assert second["error"] == "ConnectTimeout"
+        assert request.call_args.kwargs["stream"] is True
+
+    @patch("ckanext.fairdatapoint.harvesters.domain.transport.requests.request")
+    def test_recording_truncates_large_body(self, request, tmp_path):
+        body = BytesIOCountingReads(b"<a> <b> <c> .\n" * 100000)
+        response = requests.Response()
+        response.status_code = 200
+        response.url = "https://fdp.example.org/"
+        response.headers["Content-Type"] = "application/n-triples"
+        response.raw = body
+        request.return_value = response
+        archive = tmp_path / "archive.jsonl.gz"
+
+        with RecordingTransport(archive, max_body_size=100) as recording:
+            recorded = recording.request("GET", "https://fdp.example.org/")
+
+        # The body is read no further than needed to tell it is too large, which it still is when replayed
+        assert body.bytes_read <= BODY_CHUNK_SIZE
+        (first,) = read_archive(archive)
+        assert first["truncated"] is True
+        assert len(base64.b64decode(first["body"])) == 101
+        with pytest.raises(DocumentTooLargeException):
+            check_content_length(recorded.headers["Content-Length"], 100, "https://fdp.example.org/")
+
+    def test_invalid_archive(self, tmp_path):
+        archive = tmp_path / "archive.jsonl.gz"
+        with gzip.open(archive, "wt") as file:
+            file.write(json.dumps(exchange("https://fdp.example.org/")) + "\n{invalid\n")
+
+        with pytest.raises(HttpArchiveException):
+            ReplayTransport(archive)
+
+    @patch("ckanext.fairdatapoint.harvesters.domain.transport.requests.get")
+    def test_requests_are_sent_without_transport(self, get):
+        transport.get("https://fdp.example.org/", timeout=1)
+
+        get.assert_called_once_with("https://fdp.example.org/", timeout=1)
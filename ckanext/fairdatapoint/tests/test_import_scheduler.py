@@ -0,0 +1,38 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from ckanext.fairdatapoint.harvesters.domain.import_scheduler import ImportScheduler
+
+
+class TestImportScheduler:
+    def test_independent_keys_are_released_at_once(self):
+        scheduler = ImportScheduler({"series": [], "dataset-1": ["series"], "dataset-2": [], "catalog": []})
+
+        assert scheduler.pop_ready() == ["series", "dataset-2", "catalog"]
+        assert scheduler.pop_ready() == []
+        assert scheduler.in_progress == 3
+
+    def test_dependents_are_held_until_done(self):
+        scheduler = ImportScheduler({"series-1": [], "series-2": [], "dataset": ["series-1", "series-2"]})
+        scheduler.pop_ready()
+
+        scheduler.done("series-1")
+        assert scheduler.pop_ready() == []
+
+        scheduler.done("series-2")
+        assert scheduler.pop_ready() == ["dataset"]
+
+        assert not scheduler.finished
+        scheduler.done("dataset")
+        assert scheduler.finished
+
+    def test_unscheduled_dependencies_are_done(self):
+        scheduler = ImportScheduler({"dataset": ["series-of-earlier-job"]})
+
+        assert scheduler.pop_ready() == ["dataset"]
+
+    def test_circular_dependencies_are_released(self):
+        scheduler = ImportScheduler({"a": ["b"], "b": ["a"]})
+
+        assert sorted(scheduler.pop_ready()) == ["a", "b"]
@@ -4,12 +4,15 @@
 
 import json
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
 from rdflib import Graph
+from ckanext.dcat.exceptions import RDFProfileException
 from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_to_package_converter import (
     FairDataPointRecordToPackageConverter)
+from ckanext.fairdatapoint.processors import FairDataPointRDFParser
+from ckanext.fairdatapoint.profiles import FAIRDataPointDCATAPProfile
 
 TEST_DATA_DIRECTORY = Path(Path(__file__).parent.resolve(), "test_data")
 
@@ -152,3 +155,57 @@ class TestProcessors:
         ]
         assert extras_dict["publisher_name"] == "Automatic"
         assert extras_dict["homepage"] == "http://localhost:5000"
+
+    def test_fdp_record_converter_reuses_parser(self):
+        fdp_record_to_package = FairDataPointRecordToPackageConverter(profile="fairdatapoint_dcat_ap")
+        catalog_guid = "catalog=https://fair.healthinformationportal.eu/catalog/1c75c2c9-d2cc-44cb-aaa8-cf8c11515c8d"
+        data = Graph().parse(Path(TEST_DATA_DIRECTORY, "fdp_catalog.ttl")).serialize()
+
+        first = fdp_record_to_package.record_to_package(guid=catalog_guid, record=data)
+        parser = fdp_record_to_package._parser
+        second = fdp_record_to_package.record_to_package(guid=catalog_guid, record=data)
+
+        assert fdp_record_to_package._parser is parser
+        # The graph is replaced for each record, so records do not accumulate in the parser
+        assert len(parser.g) == len(Graph().parse(data=data))
+        assert first == second
+
+    def test_fdp_record_converter_uses_given_graph(self):
+        fdp_record_to_package = FairDataPointRecordToPackageConverter(profile="fairdatapoint_dcat_ap")
+        catalog_guid = "catalog=https://fair.healthinformationportal.eu/catalog/1c75c2c9-d2cc-44cb-aaa8-cf8c11515c8d"
+        graph = Graph().parse(Path(TEST_DATA_DIRECTORY, "fdp_catalog.ttl"))
+
+        from_record = fdp_record_to_package.record_to_package(guid=catalog_guid, record=graph.serialize())
+        from_graph = fdp_record_to_package.record_to_package(guid=catalog_guid, record=None, graph=graph)
+
+        assert fdp_record_to_package._parser.g is graph
+        assert from_graph == from_record
+
+    def test_profile_classes_are_loaded_once(self):
+        FairDataPointRDFParser(profiles=["fairdatapoint_dcat_ap"])
+
+        with patch("ckanext.fairdatapoint.processors.entry_points") as entry_points:
+            parser = FairDataPointRDFParser(profiles=["fairdatapoint_dcat_ap"])
+
+        entry_points.assert_not_called()
+        assert [profile.name for profile in parser._profiles] == ["fairdatapoint_dcat_ap"]
+        assert parser._profiles[0] is FAIRDataPointDCATAPProfile
+
+    def test_unknown_profile(self):
+        with pytest.raises(RDFProfileException, match="Unknown RDF profiles: not_a_profile"):
+            FairDataPointRDFParser(profiles=["fairdatapoint_dcat_ap", "not_a_profile"])
+
+    @patch("ckanext.fairdatapoint.processors.FairDataPointRDFParser._catalogs")
+    def test_catalog_profiles_are_created_once_per_graph(self, parser_catalogs):
+        parser_catalogs.return_value = ["https://example.org/catalog/1", "https://example.org/catalog/2"]
+        profile_class = MagicMock()
+        parser = FairDataPointRDFParser(profiles=["fairdatapoint_dcat_ap"])
+        parser._profiles = [profile_class]
+
+        assert len(list(parser.catalogs())) == 2
+        assert profile_class.call_count == 1
+        assert profile_class.return_value.parse_dataset.call_count == 2
+
+        parser.reset()
+        list(parser.catalogs())
+        assert profile_class.call_count == 2
@@ -0,0 +1,47 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import pytest
+
+from ckanext.fairdatapoint.harvesters.domain.rdf_formats import (
+    HostFormats,
+    rdf_format_from_content_type,
+)
+
+
+@pytest.mark.parametrize(
+    "content_type, expected",
+    [
+        ("text/turtle", "turtle"),
+        ("text/turtle;charset=UTF-8", "turtle"),
+        ("Application/N-Triples", "nt"),
+        ("application/ld+json; charset=utf-8", "json-ld"),
+        ("application/rdf+xml", "xml"),
+        ("text/html", None),
+        (None, None),
+    ],
+)
+def test_rdf_format_from_content_type(content_type, expected):
+    assert rdf_format_from_content_type(content_type) == expected
+
+
+def test_accept_header_prefers_cheapest_format():
+    host_formats = HostFormats()
+
+    assert host_formats.accept_header("https://fdp.example.com/catalog") == (
+        "application/n-triples, text/turtle;q=0.9, application/rdf+xml;q=0.8, application/ld+json;q=0.7"
+    )
+
+
+def test_accept_header_prefers_cheapest_served_format():
+    host_formats = HostFormats()
+    host_formats.record("https://fdp.example.com/catalog", "json-ld")
+    host_formats.record("https://fdp.example.com/dataset", "turtle")
+
+    assert host_formats.supported_formats("https://FDP.example.com") == {"json-ld", "turtle"}
+    assert host_formats.accept_header("https://fdp.example.com/distribution") == (
+        "text/turtle, application/n-triples;q=0.9, application/rdf+xml;q=0.8, application/ld+json;q=0.7"
+    )
+    # Other hosts are not affected
+    assert host_formats.accept_header("https://other.example.com").startswith("application/n-triples,")
@@ -0,0 +1,90 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from pathlib import Path
+
+import pytest
+from rdflib import BNode, Graph, Literal, URIRef, XSD
+from rdflib.compare import isomorphic
+
+from ckanext.fairdatapoint.harvesters.domain.record_content import (
+    CONTENT_FORMAT_COMPACT,
+    CONTENT_FORMAT_NTRIPLES,
+    CONTENT_FORMAT_TURTLE,
+    CONTENT_FORMATS,
+    RecordContentException,
+    detect_content_format,
+    parse_content,
+    serialize_graph,
+)
+
+TEST_DATA_DIRECTORY = Path(Path(__file__).parent.resolve(), "test_data")
+
+
+class TestRecordContent:
+    @pytest.mark.parametrize("content_format", CONTENT_FORMATS)
+    @pytest.mark.parametrize(
+        "file_name",
+        [
+            "dataset_d7129d28-b72a-437f-8db0-4f0258dd3c25_out.ttl",
+            "dataset-distribution_with_accessservice_out.ttl",
+            "Project_27866022694497978_out.ttl",
+        ],
+    )
+    def test_round_trip(self, content_format, file_name):
+        graph = Graph().parse(Path(TEST_DATA_DIRECTORY, file_name))
+
+        content = serialize_graph(graph, content_format)
+
+        assert detect_content_format(content) == content_format
+        assert isomorphic(parse_content(content), graph)
+
+    def test_turtle_content_is_unchanged(self):
+        graph = Graph().parse(Path(TEST_DATA_DIRECTORY, "fdp_catalog.ttl"))
+
+        assert serialize_graph(graph, CONTENT_FORMAT_TURTLE) == graph.serialize(format="ttl")
+
+    def test_legacy_turtle_content_is_readable(self):
+        content = Path(TEST_DATA_DIRECTORY, "fdp_catalog.ttl").read_text()
+
+        assert detect_content_format(content) == CONTENT_FORMAT_TURTLE
+        assert isomorphic(parse_content(content), Graph().parse(data=content))
+
+    def test_ntriples_content_is_valid_turtle(self):
+        graph = Graph().parse(Path(TEST_DATA_DIRECTORY, "fdp_catalog.ttl"))
+
+        content = serialize_graph(graph, CONTENT_FORMAT_NTRIPLES)
+
+        assert isomorphic(Graph().parse(data=content, format="turtle"), graph)
+
+    def test_compact_escapes_special_characters(self):
+        subject = URIRef("http://example.org/dataset")
+        graph = Graph()
+        graph.add((subject, URIRef("http://example.org/text"), Literal("line\nbreak\ttab \\n", lang="en")))
+        graph.add((subject, URIRef("http://example.org/date"), Literal("2024-01-01", datatype=XSD.date)))
+        graph.add((subject, URIRef("http://example.org/node"), BNode()))
+
+        content = serialize_graph(graph, CONTENT_FORMAT_COMPACT)
+
+        assert isomorphic(parse_content(content), graph)
+
+    def test_compact_is_smaller_than_turtle(self):
+        graph = Graph().parse(
+            Path(TEST_DATA_DIRECTORY, "dataset_d7129d28-b72a-437f-8db0-4f0258dd3c25_out.ttl")
+        )
+
+        assert len(serialize_graph(graph, CONTENT_FORMAT_COMPACT)) < len(
+            serialize_graph(graph, CONTENT_FORMAT_TURTLE)
+        )
+
+    def test_unknown_content_format(self):
+        with pytest.raises(RecordContentException, match="Unknown content format"):
+            serialize_graph(Graph(), "xml")
+
+        with pytest.raises(RecordContentException, match="Unknown content format"):
+            detect_content_format("#fdp-content: xml\n")
+
+    def test_malformed_compact_content(self):
+        with pytest.raises(RecordContentException, match="Malformed triple"):
+            parse_content("#fdp-content: compact\nUhttp://example.org/a\n\n0 0 1\n")
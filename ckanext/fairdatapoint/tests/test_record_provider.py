@@ -8,10 +8,18 @@ import pytest
 import requests_mock
 from pytest_mock import class_mocker, mocker
 from rdflib import DCAT, DCTERMS, Graph, URIRef
+from rdflib.compare import isomorphic
 
+from ckanext.fairdatapoint.harvesters.domain.document_limits import DocumentTooLargeException
 from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider import (
     FairDataPointRecordProvider,
 )
+from ckanext.fairdatapoint.harvesters.domain.fdp_record import FdpRecord
+from ckanext.fairdatapoint.harvesters.domain.time_budget import TimeBudgetExceededException
+from ckanext.fairdatapoint.harvesters.domain.record_content import (
+    RecordContentException,
+    parse_content,
+)
 
 TEST_DATA_DIRECTORY = Path(Path(__file__).parent.resolve(), "test_data")
 
@@ -236,18 +244,18 @@ class TestRecordProvider:
         response = mocker.MagicMock()
         response.json.return_value = {"displayName": "N.K. De Vries"}
         orcid_get = mocker.patch(
-            "ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider.requests.get",
+            "ckanext.fairdatapoint.harvesters.domain.transport.requests.get",
             return_value=response,
         )
 
         provider = FairDataPointRecordProvider(
-            "http://test_end_point.com", request_timeout=99
+            "http://test_end_point.com", request_timeout=99, connect_timeout=5
         )
         provider._parse_contact_point(g, subject, contact_point)
 
         orcid_get.assert_called_once_with(
             "https://orcid.org/0000-0002-4348-707X/public-record.json",
-            timeout=99,
+            timeout=(5, 99),
         )
 
     def test_filter_conforms_to_removes_profile_links(self):
@@ -282,3 +290,181 @@ class TestRecordProvider:
         self.fdp_record_provider._remove_fdp_defaults(g, subject)
 
         assert list(g.objects(subject=subject, predicate=DCTERMS.conformsTo)) == []
+
+    def test_get_record_by_id_ntriples_content_format(self, mocker):
+        """The record is serialized in the configured content format"""
+        fdp_get_graph = mocker.MagicMock(name="get_data")
+        mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.fair_data_point.FairDataPoint.get_graph",
+            new=fdp_get_graph,
+        )
+        guid = "dataset=https://example.org/dataset/with-accessservice"
+        fdp_get_graph.side_effect = get_graph_by_id
+        provider = FairDataPointRecordProvider(
+            "http://test_end_point.com", content_format="ntriples"
+        )
+        actual = provider.get_record_by_id(guid)
+        expected = Graph().parse(
+            Path(TEST_DATA_DIRECTORY, "dataset-distribution_with_accessservice_out.ttl")
+        )
+        assert actual.startswith("#fdp-content: ntriples\n")
+        assert isomorphic(parse_content(actual), expected)
+
+    def test_get_record_with_graph_by_id(self, mocker):
+        """The record is returned together with the graph it was serialized from"""
+        fdp_get_graph = mocker.MagicMock(name="get_data")
+        mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.fair_data_point.FairDataPoint.get_graph",
+            new=fdp_get_graph,
+        )
+        guid = "dataset=https://example.org/dataset/with-accessservice"
+        fdp_get_graph.side_effect = get_graph_by_id
+
+        record, graph = self.fdp_record_provider.get_record_with_graph_by_id(guid)
+
+        assert isomorphic(parse_content(record), graph)
+        assert isomorphic(
+            graph,
+            Graph().parse(Path(TEST_DATA_DIRECTORY, "dataset-distribution_with_accessservice_out.ttl")),
+        )
+
+    def test_get_records_by_ids(self, mocker):
+        """Records are fetched concurrently, errors are yielded instead of raised"""
+        guids = [f"dataset=https://example.org/dataset/{i}" for i in range(20)]
+
+        def get_record_by_id(guid):
+            if guid.endswith("/13"):
+                raise ValueError("unreachable")
+            return f"record of {guid}"
+
+        provider = FairDataPointRecordProvider("http://test_end_point.com", fetch_concurrency=4)
+        mocker.patch.object(provider, "get_record_by_id", side_effect=get_record_by_id)
+
+        actual = dict(provider.get_records_by_ids(guids))
+
+        assert set(actual) == set(guids)
+        assert isinstance(actual["dataset=https://example.org/dataset/13"], ValueError)
+        assert actual["dataset=https://example.org/dataset/0"] == "record of dataset=https://example.org/dataset/0"
+
+    def test_get_records(self, mocker):
+        """The crawl returns the content of every record, fetching each record once"""
+        root = Graph().parse(Path(TEST_DATA_DIRECTORY, "root_fdp_response.ttl"))
+        record_graphs = {
+            "http://test_end_point.com": root,
+            "http://example.org/Dataset1": Graph().parse(Path(TEST_DATA_DIRECTORY, "fdp_catalog.ttl")),
+        }
+        fdp_get_graph = mocker.MagicMock(name="get_data")
+        mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.fair_data_point.FairDataPoint.get_graph",
+            new=fdp_get_graph,
+        )
+        fdp_get_graph.side_effect = lambda url: record_graphs.get(str(url), Graph())
+        mapper_records = {
+            "http://test_end_point.com": FdpRecord(
+                "http://test_end_point.com", children=["http://example.org/Dataset1", "http://example.org/Catalog1"]
+            ),
+            "http://example.org/Dataset1": FdpRecord("http://example.org/Dataset1", types=[DCAT.Dataset]),
+            "http://example.org/Catalog1": FdpRecord("http://example.org/Catalog1", types=[DCAT.Catalog]),
+        }
+        mocker.patch(
+            "ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider.GraphToFdpRecordMapper.map",
+            autospec=True,
+            side_effect=lambda mapper, graph: mapper_records[mapper.url],
+        )
+
+        actual = dict(FairDataPointRecordProvider("http://test_end_point.com").get_records())
+
+        assert list(actual) == ["dataset=http://example.org/Dataset1"]
+        record, graph = actual["dataset=http://example.org/Dataset1"]
+        assert graph is record_graphs["http://example.org/Dataset1"]
+        assert isomorphic(parse_content(record), graph)
+        requested = [str(call.args[0]) for call in fdp_get_graph.call_args_list]
+        assert sorted(requested) == [
+            "http://example.org/Catalog1", "http://example.org/Dataset1", "http://test_end_point.com"
+        ]
+
+    def test_crawl_order_matches_breadth_first_search(self):
+        children = {"root": ["a", "b"], "a": ["c", "b"], "b": ["d"], "c": [], "d": ["a"]}
+        provider = FairDataPointRecordProvider("root", fetch_concurrency=3)
+
+        def visit(url):
+            return FdpRecord(url, children=children[url]), None
+
+        visited = [record.url for record, _ in provider._crawl("root", visit)]
+
+        # Every URL is visited once, level by level
+        assert visited[0] == "root"
+        assert set(visited[1:3]) == {"a", "b"}
+        assert set(visited[3:]) == {"c", "d"}
+
+    def test_crawl_stops_when_time_budget_is_exceeded(self):
+        children = {"root": ["a", "b"], "a": ["c"], "b": ["d"]}
+        provider = FairDataPointRecordProvider("root", fetch_concurrency=2)
+
+        def visit(url):
+            if url in ("c", "d"):
+                raise TimeBudgetExceededException("Time budget exceeded")
+            return FdpRecord(url, children=children[url]), None
+
+        visited = [record.url for record, _ in provider._crawl("root", visit)]
+
+        assert visited[0] == "root"
+        assert set(visited[1:]) == {"a", "b"}
+
+    def test_crawl_skips_documents_which_are_too_large(self):
+        children = {"root": ["a", "b"], "a": ["c"], "b": ["d"], "c": [], "d": []}
+        provider = FairDataPointRecordProvider("root", fetch_concurrency=2)
+
+        def visit(url):
+            if url == "a":
+                raise DocumentTooLargeException("Document a exceeds the maximum body size")
+            return FdpRecord(url, children=children[url]), None
+
+        visited = [record.url for record, _ in provider._crawl("root", visit)]
+
+        # The records below the skipped document are not reached
+        assert visited == ["root", "b", "d"]
+        assert [url for url, _ in provider.crawl_errors] == ["a"]
+
+    def test_crawl_drops_absent_child(self):
+        """A child which is contained in its catalog but no longer exists is not harvested, nor a crawl error"""
+        catalog = """
+            @prefix dcat: <http://www.w3.org/ns/dcat#> .
+            @prefix ldp: <http://www.w3.org/ns/ldp#> .
+            <https://absent.example.com/catalog> a dcat:Catalog ;
+                ldp:contains <https://absent.example.com/dataset/1>, <https://absent.example.com/dataset/2> .
+        """
+        dataset = """
+            @prefix dcat: <http://www.w3.org/ns/dcat#> .
+            <https://absent.example.com/dataset/1> a dcat:Dataset .
+        """
+        with requests_mock.Mocker() as mock:
+            mock.get("https://absent.example.com/catalog", text=catalog, headers={"Content-Type": "text/turtle"})
+            mock.get("https://absent.example.com/dataset/1", text=dataset, headers={"Content-Type": "text/turtle"})
+            mock.get("https://absent.example.com/dataset/2", status_code=404)
+            provider = FairDataPointRecordProvider("https://absent.example.com/catalog")
+
+            actual = set(provider.get_record_ids())
+
+        assert actual == {"dataset=https://absent.example.com/dataset/1"}
+        assert provider.crawl_errors == []
+
+    def test_get_record_by_id_without_absent_distribution(self):
+        """A dataset whose distribution no longer exists is harvested without the distribution"""
+        dataset_url = "https://health-ri.sandbox.semlab-leiden.nl/dataset/d7129d28-b72a-437f-8db0-4f0258dd3c25"
+        distribution_url = (
+            "https://health-ri.sandbox.semlab-leiden.nl/distribution/f9b9dff8-a039-4ca2-be9b-da72a61e3bac"
+        )
+        dataset = Path(TEST_DATA_DIRECTORY, "dataset_d7129d28-b72a-437f-8db0-4f0258dd3c25.ttl").read_text()
+        with requests_mock.Mocker() as mock:
+            mock.get(dataset_url, text=dataset, headers={"Content-Type": "text/turtle"})
+            mock.get(distribution_url, status_code=404)
+
+            actual = parse_content(self.fdp_record_provider.get_record_by_id(f"dataset={dataset_url}"))
+
+        assert (URIRef(dataset_url), DCAT.distribution, URIRef(distribution_url)) in actual
+        assert list(actual.predicate_objects(URIRef(distribution_url))) == []
+
+    def test_unknown_content_format(self):
+        with pytest.raises(RecordContentException, match="Unknown content format"):
+            FairDataPointRecordProvider("http://test_end_point.com", content_format="xml")
@@ -0,0 +1,61 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import os
+from unittest.mock import patch
+
+from ckanext.fairdatapoint.harvesters.domain.record_to_package_pool import (
+    ConversionRequest,
+    RecordToPackagePool,
+)
+from ckanext.fairdatapoint.labels import is_label_resolution_skipped
+
+
+class EchoConverter:
+    """Picklable converter returning what the worker process received"""
+
+    def record_to_package(self, guid, record, series_mapping=None):
+        if record == "invalid":
+            raise ValueError(f"Invalid record {guid}")
+        return {
+            "title": record,
+            "series_mapping": series_mapping,
+            "pid": os.getpid(),
+            "labels_skipped": is_label_resolution_skipped(),
+        }
+
+
+@patch("ckanext.fairdatapoint.harvesters.domain.record_to_package_pool.resolve_labels")
+def test_convert_in_worker_processes(resolve_labels):
+    requests = [ConversionRequest(i, f"dataset={i}", f"record {i}", {"series": {"id": "1"}}) for i in range(10)]
+
+    with RecordToPackagePool(EchoConverter(), max_workers=2, max_pending=3) as pool:
+        results = {result.key: result for result in pool.convert(requests)}
+
+    assert sorted(results) == list(range(10))
+    for key, result in results.items():
+        assert result.error is None
+        assert result.package_dict["title"] == f"record {key}"
+        assert result.package_dict["series_mapping"] == {"series": {"id": "1"}}
+        assert result.package_dict["pid"] != os.getpid()
+        assert result.package_dict["labels_skipped"] is True
+    # Labels are resolved in the calling process
+    assert resolve_labels.call_count == 10
+
+
+@patch("ckanext.fairdatapoint.harvesters.domain.record_to_package_pool.resolve_labels")
+def test_conversion_errors_are_returned(resolve_labels):
+    requests = [ConversionRequest("ok", "dataset=1", "valid"), ConversionRequest("fail", "dataset=2", "invalid")]
+
+    with RecordToPackagePool(EchoConverter(), max_workers=1) as pool:
+        results = {result.key: result for result in pool.convert(requests)}
+
+    assert results["ok"].error is None
+    assert results["fail"].package_dict is None
+    assert isinstance(results["fail"].error, ValueError)
+    resolve_labels.assert_called_once()
+
+
+def test_label_resolution_is_not_skipped_by_default():
+    assert is_label_resolution_skipped() is False
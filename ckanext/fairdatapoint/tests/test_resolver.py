@@ -602,3 +602,19 @@ class TestWikidataURIHandling:
         ]
         
         assert ckan_translation_list == expected
+
+    @pytest.mark.ckan_config("ckanext.fairdatapoint.connect_timeout", "3")
+    @pytest.mark.ckan_config("ckanext.fairdatapoint.request_timeout", "7")
+    @pytest.mark.usefixtures("ckan_config")
+    @patch("ckanext.fairdatapoint.resolver.requests.get")
+    def test_load_graph_uses_configured_timeouts(self, mock_requests_get):
+        from ckanext.fairdatapoint.resolver import SKIP_URIS
+        SKIP_URIS.clear()
+
+        resolver = resolvable_label_resolver()
+        resolver.label_graph = Graph()
+        mock_requests_get.return_value = MagicMock(text="")
+
+        resolver.load_graph("http://publications.europa.eu/resource/authority/language/ENG")
+
+        assert mock_requests_get.call_args.kwargs["timeout"] == (3, 7)
@@ -0,0 +1,69 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ckanext.fairdatapoint.harvesters.domain.single_flight import SingleFlight
+
+
+def _run_concurrently(single_flight, function, callers=4):
+    """Starts the callers, releasing the first call only once all others wait for it"""
+    release = threading.Event()
+
+    def leader_function():
+        release.wait(5)
+        return function()
+
+    def call(_):
+        return single_flight.do("key", leader_function)
+
+    with ThreadPoolExecutor(max_workers=callers) as executor:
+        futures = [executor.submit(call, number) for number in range(callers)]
+        while "key" not in single_flight._calls or single_flight._calls["key"].participants < callers:
+            pass
+        release.set()
+    return futures
+
+
+def test_concurrent_calls_share_one_call():
+    single_flight = SingleFlight()
+    calls = []
+
+    def function():
+        calls.append(1)
+        return "result"
+
+    futures = _run_concurrently(single_flight, function)
+
+    assert len(calls) == 1
+    assert [future.result() for future in futures] == [("result", True)] * 4
+    assert single_flight.in_flight() == 0
+
+
+def test_concurrent_calls_share_the_exception():
+    single_flight = SingleFlight()
+
+    def function():
+        raise ValueError("unreachable")
+
+    futures = _run_concurrently(single_flight, function)
+
+    for future in futures:
+        with pytest.raises(ValueError, match="unreachable"):
+            future.result()
+
+
+def test_sequential_calls_are_not_shared():
+    single_flight = SingleFlight()
+    calls = []
+
+    def function():
+        calls.append(1)
+        return len(calls)
+
+    assert single_flight.do("key", function) == (1, False)
+    assert single_flight.do("key", function) == (2, False)
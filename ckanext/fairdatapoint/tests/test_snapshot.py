@@ -0,0 +1,79 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import gzip
+from pathlib import Path
+
+import requests_mock
+from rdflib import Dataset, Graph, Namespace, URIRef
+from rdflib.compare import to_isomorphic
+
+from ckanext.fairdatapoint.harvesters.domain.file_record_provider import FileRecordProvider
+from ckanext.fairdatapoint.harvesters.domain.snapshot import SnapshotWriter, crawl_snapshot
+
+TEST_DATA_DIRECTORY = Path(Path(__file__).parent.resolve(), "test_data")
+LDP = Namespace("http://www.w3.org/ns/ldp#")
+ROOT_URL = "http://test_end_point.com"
+DATASET_URL = "https://health-ri.sandbox.semlab-leiden.nl/dataset/d7129d28-b72a-437f-8db0-4f0258dd3c25"
+DISTRIBUTION_URL = "https://health-ri.sandbox.semlab-leiden.nl/distribution/f9b9dff8-a039-4ca2-be9b-da72a61e3bac"
+PROJECT_URL = "https://covid19initiatives.health-ri.nl/p/Project/27866022694497978"
+ORCID_URL = "https://orcid.org/0000-0002-4348-707X"
+
+
+def fdp_documents():
+    root = Graph()
+    root.add((URIRef(ROOT_URL), LDP.contains, URIRef(DATASET_URL)))
+    root.add((URIRef(ROOT_URL), LDP.contains, URIRef(PROJECT_URL)))
+    return {
+        ROOT_URL: root.serialize(format="turtle"),
+        DATASET_URL: Path(TEST_DATA_DIRECTORY, "dataset_d7129d28-b72a-437f-8db0-4f0258dd3c25.ttl").read_text(),
+        DISTRIBUTION_URL: Path(
+            TEST_DATA_DIRECTORY, "distribution_f9b9dff8-a039-4ca2-be9b-da72a61e3bac.ttl"
+        ).read_text(),
+        PROJECT_URL: Path(TEST_DATA_DIRECTORY, "Project_27866022694497978.ttl").read_text(),
+    }
+
+
+def test_snapshot_writer_writes_named_graphs_once(tmp_path):
+    graph = Graph().parse(Path(TEST_DATA_DIRECTORY, "example_graph.ttl"))
+    path = tmp_path / "snapshot.nq.gz"
+
+    with SnapshotWriter(path) as writer:
+        assert writer.write("http://example.org/document", graph)
+        assert not writer.write("http://example.org/document", graph)
+
+    dataset = Dataset()
+    with gzip.open(path, "rb") as snapshot:
+        dataset.parse(source=snapshot, format="nquads")
+    assert to_isomorphic(dataset.graph(URIRef("http://example.org/document"))) == to_isomorphic(graph)
+    assert writer.documents == 1
+    assert writer.triples == len(graph)
+
+
+def test_crawl_snapshot_can_be_harvested_offline(mocker, tmp_path):
+    documents = fdp_documents()
+    mocker.patch(
+        "ckanext.fairdatapoint.harvesters.domain.fair_data_point.FairDataPoint.get_graph",
+        autospec=True,
+        side_effect=lambda fdp, url: Graph().parse(data=documents.get(str(url), ""), format="turtle"),
+    )
+    path = tmp_path / "snapshot.nq.gz"
+
+    with requests_mock.Mocker() as mock:
+        mock.get(f"{ORCID_URL}/public-record.json", json={"displayName": "N.K. De Vries"})
+        statistics = crawl_snapshot(ROOT_URL, path, fetch_concurrency=2)
+
+    assert statistics.records == 2
+    assert statistics.failed_records == 0
+    # The four documents, two distributions the FDP serves no triples for and the contact point name
+    assert statistics.documents == 7
+    assert statistics.size == path.stat().st_size
+    provider = FileRecordProvider(path)
+    assert set(provider.get_record_ids()) == {f"dataset={DATASET_URL}", f"dataset={PROJECT_URL}"}
+    for url, expected in [
+        (DATASET_URL, "dataset_d7129d28-b72a-437f-8db0-4f0258dd3c25_out.ttl"),
+        (PROJECT_URL, "Project_27866022694497978_out.ttl"),
+    ]:
+        actual = Graph().parse(data=provider.get_record_by_id(f"dataset={url}"))
+        assert to_isomorphic(actual) == to_isomorphic(Graph().parse(Path(TEST_DATA_DIRECTORY, expected)))
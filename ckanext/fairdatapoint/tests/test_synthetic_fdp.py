@@ -0,0 +1,106 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+from unittest.mock import patch
+
+from rdflib import DCAT, RDF, Graph, URIRef
+
+from ckanext.fairdatapoint.harvesters.domain.fair_data_point_record_provider import (
+    VCARD,
+    FairDataPointRecordProvider,
+)
+from ckanext.fairdatapoint.harvesters.domain.identifier import Identifier
+from ckanext.fairdatapoint.tests.benchmarks.synthetic_fdp import SyntheticFdp, SyntheticFdpServer
+
+
+def record_urls(guids) -> set:
+    return {Identifier(guid).get_id_value() for guid in guids}
+
+
+class TestSyntheticFdp:
+    def test_documents_are_deterministic(self):
+        base_url = "http://fdp.example"
+        fdp = SyntheticFdp(datasets=10, distributions=2, series=2, orcid_contacts=3, seed=7)
+        for path in ["/", "/catalog/0", "/series/1", "/dataset/5", "/distribution/5-1"]:
+            assert fdp.document(base_url, path) == SyntheticFdp(
+                datasets=10, distributions=2, series=2, orcid_contacts=3, seed=7
+            ).document(base_url, path)
+        assert fdp.document(base_url, "/dataset/5") != SyntheticFdp(
+            datasets=10, distributions=2, series=2, orcid_contacts=3, seed=8
+        ).document(base_url, "/dataset/5")
+
+    def test_documents_are_valid_turtle(self):
+        base_url = "http://fdp.example"
+        fdp = SyntheticFdp(datasets=4, catalogs=2, distributions=1, series=2)
+        graph = Graph().parse(data=fdp.document(base_url, "/dataset/3")[1], format="turtle")
+        dataset = URIRef(f"{base_url}/dataset/3")
+        assert (dataset, RDF.type, DCAT.Dataset) in graph
+        assert (dataset, DCAT.inSeries, URIRef(f"{base_url}/series/1")) in graph
+        assert (dataset, DCAT.distribution, URIRef(f"{base_url}/distribution/3-0")) in graph
+
+    def test_unknown_documents(self):
+        fdp = SyntheticFdp(datasets=4, distributions=1)
+        for path in ["/dataset/4", "/catalog/1", "/series/0", "/distribution/0-1", "/orcid/x/public-record.json", "/x"]:
+            assert fdp.document("http://fdp.example", path) is None
+
+    def test_vocabulary_terms(self):
+        base_url = "http://fdp.example"
+        fdp = SyntheticFdp(datasets=20, vocabulary_terms=5, missing_vocabulary_terms=1)
+        graph = Graph().parse(data=fdp.document(base_url, "/dataset/0")[1], format="turtle")
+        assert str(graph.value(URIRef(f"{base_url}/dataset/0"), DCAT.theme)).startswith(f"{base_url}/vocabulary/")
+
+        term = Graph().parse(data=fdp.document(base_url, "/vocabulary/3")[1], format="turtle")
+        assert len(term) == 3
+        assert fdp.document(base_url, "/vocabulary/4") is None
+
+    def test_vocabulary_offset(self):
+        base_url = "http://fdp.example"
+        fdp = SyntheticFdp(datasets=20, vocabulary_terms=5, missing_vocabulary_terms=1, vocabulary_offset=5)
+        themes = {
+            str(Graph().parse(data=fdp.document(base_url, f"/dataset/{index}")[1], format="turtle").value(
+                URIRef(f"{base_url}/dataset/{index}"), DCAT.theme
+            ))
+            for index in range(20)
+        }
+        assert themes <= {f"{base_url}/vocabulary/{index}" for index in range(5, 10)}
+
+        assert fdp.document(base_url, "/vocabulary/0") is None
+        assert fdp.document(base_url, "/vocabulary/8") is not None
+        assert fdp.document(base_url, "/vocabulary/9") is None
+
+    def test_crawl_finds_every_record(self):
+        fdp = SyntheticFdp(datasets=30, catalogs=3, distributions=2, series=4, orcid_contacts=5)
+        with SyntheticFdpServer(fdp) as server:
+            provider = FairDataPointRecordProvider(server.root_url, fetch_concurrency=4)
+            guids = list(provider.get_record_ids())
+
+        assert len(guids) == fdp.records
+        assert record_urls(guids) == set(fdp.record_urls(server.url))
+
+    def test_records_are_completed(self):
+        fdp = SyntheticFdp(datasets=6, distributions=2, orcid_contacts=2)
+        with SyntheticFdpServer(fdp) as server:
+            provider = FairDataPointRecordProvider(server.root_url, fetch_concurrency=2)
+            records = dict(provider.get_records())
+
+        assert len(records) == 6
+        _, graph = records[f"dataset={server.url}/dataset/3"]
+        dataset = URIRef(f"{server.url}/dataset/3")
+        assert (URIRef(f"{server.url}/distribution/3-1"), RDF.type, DCAT.Distribution) in graph
+        contact_point = graph.value(dataset, DCAT.contactPoint)
+        assert str(graph.value(contact_point, VCARD.fn)) == fdp.orcid_name(1)
+        # The defaults the FDP adds are removed
+        assert graph.value(dataset, URIRef("http://purl.org/dc/terms/accessRights")) is None
+
+    @patch("ckanext.fairdatapoint.harvesters.domain.fair_data_point.RETRY_BACKOFF", 0)
+    def test_injected_errors_are_retried(self):
+        fdp = SyntheticFdp(datasets=20, distributions=1)
+        with SyntheticFdpServer(fdp, latency=0.001, error_rate=0.2) as server:
+            provider = FairDataPointRecordProvider(server.root_url, fetch_concurrency=1, request_retries=5)
+            records = dict(provider.get_records())
+
+            assert server.errors > 0
+            assert server.requests == 1 + 1 + 2 * 20 + server.errors
+        assert len(records) == 20
+        assert not any(isinstance(fetched, Exception) for fetched in records.values())
@@ -0,0 +1,59 @@
+# SPDX-FileCopyrightText: 2024 Stichting Health-RI
+#
+# SPDX-License-Identifier: AGPL-3.0-only
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ckanext.fairdatapoint.harvesters.domain.time_budget import (
+    TimeBudgetExceededException,
+    check_time_budget,
+    limit_timeout,
+    remaining_time,
+    run_in_context,
+    time_budget,
+    time_budget_exceeded,
+)
+
+
+def test_no_budget():
+    with time_budget(0):
+        assert remaining_time() is None
+        assert limit_timeout((10, 100)) == (10, 100)
+        check_time_budget()
+
+
+def test_limit_timeout():
+    with time_budget(30):
+        connect_timeout, read_timeout = limit_timeout((10, 100))
+        assert connect_timeout == 10
+        assert 29 < read_timeout <= 30
+        assert limit_timeout(100) <= 30
+    assert remaining_time() is None
+
+
+def test_nested_budget_only_shortens():
+    with time_budget(5):
+        with time_budget(60):
+            assert remaining_time() <= 5
+        with time_budget(1):
+            assert remaining_time() <= 1
+
+
+def test_exceeded_budget():
+    with time_budget(0.001):
+        time.sleep(0.01)
+        assert time_budget_exceeded()
+        with pytest.raises(TimeBudgetExceededException):
+            limit_timeout((10, 100))
+
+
+def test_run_in_context_passes_budget_to_threads():
+    with time_budget(30):
+        remaining = run_in_context(remaining_time)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(lambda _: remaining(), range(4)))
+
+    assert all(result is not None and result <= 30 for result in results)